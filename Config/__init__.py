@@ -1 +1,2 @@
-from camera import CameraConfig
\ No newline at end of file
+from Config.camera import CameraConfig
+from Config.randomization import RandomizationConfig
\ No newline at end of file
@@ -0,0 +1,34 @@
+from typing import Optional, Sequence, Tuple
+from dataclasses import dataclass
+
+@dataclass
+class RandomizationConfig:
+    """
+    Per-env domain randomization, resampled at every reset. Every range is
+    (low, high) of a uniform draw; None leaves the quantity alone.
+
+    Gains and force limits are scale factors on the nominal values (kp, kv,
+    force_limit, or what the robot has after build when those are None),
+    friction is the friction ratio of every link, mass_shift the kg added to every
+    link. Object poses get a uniform offset within +-object_pos_noise and a yaw
+    within +-object_yaw_noise (radians), camera poses offsets within
+    +-camera_pos_noise / +-camera_lookat_noise around the CameraConfig.
+    """
+    kp: Optional[Sequence[float]] = None
+    kv: Optional[Sequence[float]] = None
+    force_limit: Optional[Sequence[float]] = None
+
+    kp_scale: Optional[Tuple[float, float]] = None
+    kv_scale: Optional[Tuple[float, float]] = None
+    force_scale: Optional[Tuple[float, float]] = None
+    friction: Optional[Tuple[float, float]] = None
+    mass_shift: Optional[Tuple[float, float]] = None
+
+    object_pos_noise: Optional[Tuple[float, float, float]] = None
+    object_yaw_noise: Optional[float] = None
+    camera_pos_noise: Optional[Tuple[float, float, float]] = None
+    camera_lookat_noise: Optional[Tuple[float, float, float]] = None
+
+    @property
+    def randomizes_gains(self) -> bool:
+        return any(r is not None for r in (self.kp_scale, self.kv_scale, self.force_scale))
@@ -0,0 +1,200 @@
+import multiprocessing
+import traceback
+from multiprocessing import shared_memory
+from typing import Callable, Dict, Sequence, Tuple, Union
+
+import numpy as np
+from gymnasium.vector import AutoresetMode, VectorEnv
+from gymnasium.vector.utils import batch_space
+
+
+def _numpy(x) -> np.ndarray:
+    return x.cpu().numpy() if hasattr(x, "cpu") else np.asarray(x)
+
+
+def _shared_array(shape, dtype, name=None) -> Tuple[shared_memory.SharedMemory, np.ndarray]:
+    dtype = np.dtype(dtype)
+    if name is None:
+        shm = shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(shape)) * dtype.itemsize))
+    else:
+        shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def _buffer_specs(ring: int, num_envs: int, obs_shape, act_shape) -> Dict[str, tuple]:
+    """name -> (shape, dtype) of every shared ring buffer"""
+    return dict(
+        actions=((ring, num_envs, *act_shape), np.float32),
+        obs=((ring, num_envs, *obs_shape), np.float32),
+        rewards=((ring, num_envs), np.float32),
+        terminated=((ring, num_envs), np.bool_),
+        truncated=((ring, num_envs), np.bool_),
+        final_obs=((ring, num_envs, *obs_shape), np.float32),
+        final_mask=((ring, num_envs), np.bool_),
+    )
+
+
+def _worker(env_fn, conn):
+    """Own one env and step it on command, exchanging data through shared memory"""
+    shms = []
+    env = None
+    try:
+        env = env_fn()
+        conn.send(("spaces", (env.single_observation_space, env.single_action_space, env.num_envs, env.metadata)))
+        names, specs, envs = conn.recv()    # envs: this worker's slice of the pool
+        arrays = {}
+        for key, (shape, dtype) in specs.items():
+            shm, arrays[key] = _shared_array(shape, dtype, names[key])
+            shms.append(shm)
+
+        while True:
+            cmd, slot, arg = conn.recv()
+            if cmd == "close":
+                break
+            if cmd == "reset":
+                obs, _ = env.reset(seed=arg)
+                arrays["obs"][slot, envs] = _numpy(obs)
+                arrays["final_mask"][slot, envs] = False
+            elif cmd == "step":
+                obs, rewards, terminated, truncated, infos = env.step(arrays["actions"][slot, envs])
+                arrays["obs"][slot, envs] = _numpy(obs)
+                arrays["rewards"][slot, envs] = _numpy(rewards)
+                arrays["terminated"][slot, envs] = _numpy(terminated)
+                arrays["truncated"][slot, envs] = _numpy(truncated)
+                if "_final_obs" in infos:
+                    mask = _numpy(infos["_final_obs"])
+                    arrays["final_mask"][slot, envs] = mask
+                    arrays["final_obs"][slot, envs][mask] = _numpy(infos["final_obs"])[mask]
+                else:
+                    arrays["final_mask"][slot, envs] = False
+            conn.send(("ok", None))
+    except Exception:
+        conn.send(("error", traceback.format_exc()))
+    finally:
+        if env is not None:
+            env.close()
+        for shm in shms:
+            shm.close()
+        conn.close()
+
+
+class GenesisEnvPool(VectorEnv):
+    """
+    K worker processes, each owning its own env (a built GenesisGym with its own
+    gs.Scene) made by `env_fn`, presented as one vector env of K * n_envs envs.
+    `env_fn` can also be a list of K env_fns, one per worker, e.g. to give every
+    worker its own ReplicaCAD scene config instead of building them all into one
+    scene (GenesisReplicaCADScene.build).
+
+    Actions, observations, rewards and done flags live in shared-memory ring
+    buffers of `ring` slots; the pipes only carry (command, slot) tuples. step_async
+    writes the actions into the next slot and wakes the workers, step_wait collects
+    their acknowledgements and returns NumPy views into that slot, so the caller
+    can work on one step's results while the next is in flight. A returned view
+    stays valid for `ring - 1` further steps.
+
+    env_fn must be picklable (a module-level function or functools.partial) and
+    call gs.init itself: workers are spawned, not forked.
+    """
+
+    def __init__(self, env_fn: Union[Callable, Sequence[Callable]], num_workers: int = None, ring: int = 2):
+        assert ring >= 2, "the ring needs a slot in flight and a slot being read"
+        env_fns = list(env_fn) if isinstance(env_fn, (list, tuple)) else [env_fn] * num_workers
+        assert num_workers in (None, len(env_fns)), "one env_fn per worker"
+        num_workers = len(env_fns)
+        ctx = multiprocessing.get_context("spawn")
+        self.num_workers = num_workers
+        self.ring = ring
+        self._t = 0
+        self._waiting = False
+        self._shms = []
+        self.closed = False
+
+        self._conns, self._procs = [], []
+        for env_fn in env_fns:
+            parent, child = ctx.Pipe()
+            proc = ctx.Process(target=_worker, args=(env_fn, child), daemon=True)
+            proc.start()
+            child.close()
+            self._conns.append(parent)
+            self._procs.append(proc)
+
+        # workers report their spaces first; only then are the buffer sizes known
+        reports = [self._recv(conn) for conn in self._conns]
+        single_obs, single_act, n_envs, metadata = reports[0]
+        assert all(r[2] == n_envs for r in reports), "every worker env must have the same num_envs"
+
+        self.envs_per_worker = n_envs
+        self.num_envs = n_envs * num_workers
+        self.single_observation_space = single_obs
+        self.single_action_space = single_act
+        self.observation_space = batch_space(single_obs, self.num_envs)
+        self.action_space = batch_space(single_act, self.num_envs)
+        self.metadata = {**metadata, "autoreset_mode": metadata.get("autoreset_mode", AutoresetMode.DISABLED)}
+
+        specs = _buffer_specs(ring, self.num_envs, single_obs.shape, single_act.shape)
+        self._arrays, names = {}, {}
+        for key, (shape, dtype) in specs.items():
+            shm, self._arrays[key] = _shared_array(shape, dtype)
+            self._shms.append(shm)
+            names[key] = shm.name
+        for k, conn in enumerate(self._conns):
+            conn.send((names, specs, self._slice(k)))
+
+    def _recv(self, conn):
+        status, payload = conn.recv()
+        if status == "error":
+            self.close()
+            raise RuntimeError(f"Env pool worker failed:\n{payload}")
+        return payload
+
+    def _slice(self, k: int) -> slice:
+        return slice(k * self.envs_per_worker, (k + 1) * self.envs_per_worker)
+
+    def reset(self, *, seed=None, options=None):
+        slot = self._t % self.ring
+        for k, conn in enumerate(self._conns):
+            conn.send(("reset", slot, None if seed is None else seed + k))
+        for conn in self._conns:
+            self._recv(conn)
+        return self._arrays["obs"][slot], {}
+
+    def step_async(self, actions):
+        assert not self._waiting, "step_wait() the previous step first"
+        self._t += 1
+        slot = self._t % self.ring
+        self._arrays["actions"][slot] = actions
+        for conn in self._conns:
+            conn.send(("step", slot, None))
+        self._waiting = True
+
+    def step_wait(self):
+        assert self._waiting, "step_async() first"
+        for conn in self._conns:
+            self._recv(conn)
+        self._waiting = False
+        slot = self._t % self.ring
+        a = self._arrays
+        infos = {}
+        if a["final_mask"][slot].any():
+            infos = {"final_obs": a["final_obs"][slot], "_final_obs": a["final_mask"][slot]}
+        return a["obs"][slot], a["rewards"][slot], a["terminated"][slot], a["truncated"][slot], infos
+
+    def step(self, actions):
+        self.step_async(actions)
+        return self.step_wait()
+
+    def close_extras(self, **kwargs):
+        for conn in self._conns:
+            try:
+                conn.send(("close", 0, None))
+            except (BrokenPipeError, OSError):
+                pass
+        for proc in self._procs:
+            proc.join(timeout=10)
+            if proc.is_alive():
+                proc.terminate()
+        for shm in self._shms:
+            shm.close()
+            shm.unlink()
+        self._shms = []
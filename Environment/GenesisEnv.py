@@ -1,36 +1,266 @@
+from copy import copy
 from typing import Dict, Union
 import gymnasium as gym
+import numpy as np
+import torch
+from torch.utils.dlpack import to_dlpack
+from gymnasium.vector import AutoresetMode, VectorEnv
+from gymnasium.vector.utils import batch_space
 import genesis as gs
 
 from Config import *
+from Environment.Randomization import DomainRandomizer
+
+class GenesisGym(VectorEnv):
+    """
+    A batched Genesis environment: one gs.Scene built with n_envs parallel envs,
+    behind the gymnasium.vector API.
+
+    The robot's DOF position targets are the actions and its DOF state (`obs_fields`
+    of OBS_FIELDS, positions and velocities by default) the observations. Both move
+    as (n_envs, ...) tensors on gs.device, with no per-env Python loop; rewards and
+    terminations are (n_envs,) tensors. Tasks subclass this and override
+    compute_reward / compute_terminated.
+
+    Observations, rewards and done flags live in buffers allocated once at build and
+    overwritten in place every step: reset() and step() always return the same
+    tensors, so copy them if they have to outlive the step. observation_views()
+    hands out the per-field torch views and DLPack capsules without copying, and
+    with host_mirror=True a pinned host copy is refreshed asynchronously after each
+    step (host_observation()).
+
+    The scene is either a plain gs.Scene (entities added with add_entity) or, via
+    `world`, a GenesisReplicaCADScene, which then builds the apartments. With a
+    world, every reset puts the robot base on a free floor cell of the env's own
+    apartment (world.sample_start_positions, shifted into the env's slot), at the
+    height above the floor its morph was given.
+
+    reset(env_ids=...) reinitialises only the selected envs (robot DOFs, object
+    poses, controller targets) in one batched write, and step() does so itself for
+    envs that terminated or truncated (same-step autoreset): the returned
+    observation is then already the new episode's, and the last one of the old
+    episode is in infos["final_obs"] where infos["_final_obs"] is set.
+
+    With `randomization`, every reset also resamples the RandomizationConfig
+    parameters of the reset envs (gains, friction, masses, the poses of entities
+    added with randomize_pose=True, camera poses) in one draw; see DomainRandomizer.
+    Randomized gains need per-env dof info, which a world must be created with
+    (rigid_options=gs.options.RigidOptions(batch_dofs_info=True)).
+    """
+
+    metadata = {"render_modes": [], "autoreset_mode": AutoresetMode.SAME_STEP}
+
+    OBS_FIELDS = {
+        "dof_pos": lambda robot: robot.get_dofs_position(),
+        "dof_vel": lambda robot: robot.get_dofs_velocity(),
+        "dof_force": lambda robot: robot.get_dofs_force(),
+    }
 
-class GenesisGym(gym.Env):
-    
     scene: gs.Scene
     action_space: gym.Space
     state_space: gym.Space
-    
+
     _sensor_configs: CameraConfig
-    
-    def __init__(self, n_envs):
+
+    def __init__(self, n_envs, robot: gs.morphs.Morph = None, world=None, max_episode_steps: int = 1000,
+                 sim_options: gs.options.SimOptions = None, show_viewer: bool = False, sensor_configs: CameraConfig = None,
+                 obs_fields=("dof_pos", "dof_vel"), host_mirror: bool = False, autoreset: bool = True,
+                 randomization: RandomizationConfig = None):
         super(GenesisGym, self).__init__()
-        
-
-    def reset(self,):
-        pass
-    
-    def add_entity(self, entity: Union[gs.morphs.Morph, gs.morphs.Drone, gs.morphs.Mesh]):
-        self.scene.add_entity(entity)
-    
-    def build_scene(self):
-        
-        pass
-    
+        self.autoreset = autoreset
+        if not autoreset:
+            self.metadata = {**self.metadata, "autoreset_mode": AutoresetMode.DISABLED}
+        self.num_envs = n_envs
+        self.obs_fields = tuple(obs_fields)
+        self.host_mirror = host_mirror
+        self.world = world
+        self.max_episode_steps = max_episode_steps
+        self._sensor_configs = sensor_configs
+        self.randomization = randomization
+        self.randomizer = None
+        self.randomized_objects = []
+        if world is not None:
+            assert world.num_envs == n_envs, "world must be created with the same num_envs"
+            self.scene = world.scene
+        else:
+            self.scene = gs.Scene(
+                sim_options=sim_options or gs.options.SimOptions(dt=0.01),
+                rigid_options=gs.options.RigidOptions(
+                    batch_dofs_info=randomization is not None and randomization.randomizes_gains,
+                ),
+                show_viewer=show_viewer,
+            )
+        if world is not None and robot is not None and hasattr(robot, "batch_fixed_verts"):
+            # the base is moved into each env's own slot at reset, fixed bases too
+            robot = copy(robot)
+            robot.batch_fixed_verts = True
+        self.robot = None if robot is None else self.scene.add_entity(robot)
+
+    def add_entity(self, entity: Union[gs.morphs.Morph, gs.morphs.Drone, gs.morphs.Mesh], randomize_pose: bool = False,
+                   **kwargs):
+        entity = self.scene.add_entity(entity, **kwargs)
+        if randomize_pose:
+            self.randomized_objects.append(entity)
+        return entity
+
+    def build_scene(self, build_config_idxs=0):
+        """Build the scene for all envs (build_config_idxs: the world's scene config per env)"""
+        if self.world is not None:
+            self.world.build(build_config_idxs)
+        else:
+            self.scene.build(n_envs=self.num_envs)
+        assert self.robot is not None, "GenesisGym needs a robot to act and observe through"
+
+        n_dofs = self.robot.n_dofs
+        # (n_dofs,), or (n_envs, n_dofs) with batch_dofs_info; all envs start with the same limits
+        lower, upper = (t.cpu().numpy().astype(np.float32).reshape(-1, n_dofs)[0] for t in self.robot.get_dofs_limit())
+        self.single_action_space = gym.spaces.Box(np.maximum(lower, -1e6), np.minimum(upper, 1e6), dtype=np.float32)
+        self.single_observation_space = gym.spaces.Box(-np.inf, np.inf, (len(self.obs_fields) * n_dofs,), dtype=np.float32)
+        self.action_space = batch_space(self.single_action_space, self.num_envs)
+        self.observation_space = batch_space(self.single_observation_space, self.num_envs)
+        self.state_space = self.observation_space
+
+        self.all_envs = torch.arange(self.num_envs, device=gs.device)
+        self.episode_steps = torch.zeros(self.num_envs, dtype=torch.int64, device=gs.device)
+        # what a reset puts the robot (and, without a world, the whole scene) back to
+        self._initial_qpos = self.scene.rigid_solver.get_qpos().clone()
+        self._initial_targets = self.robot.get_dofs_position().clone()
+        if self.world is not None:
+            # every env's apartment sits in the slot of its scene config
+            offsets = np.stack([self.world.config_offsets[bci] for bci in self.world.build_config_idxs])
+            self._env_offsets = torch.as_tensor(offsets, dtype=gs.tc_float, device=gs.device)
+            self._robot_base_height = float(self.robot.get_pos().reshape(-1, 3)[0, 2])
+            self._start_rng = np.random.default_rng()
+        self._alloc_buffers(n_dofs)
+        if self.randomization is not None:
+            self.randomizer = DomainRandomizer(
+                self.randomization, self.robot, self.randomized_objects, self._sensor_configs, self.num_envs,
+            )
+
+    def _alloc_buffers(self, n_dofs: int):
+        n, device = self.num_envs, gs.device
+        self.obs_buf = torch.zeros((n, len(self.obs_fields) * n_dofs), dtype=gs.tc_float, device=device)
+        self._obs_views = {
+            field: self.obs_buf[:, k * n_dofs:(k + 1) * n_dofs] for k, field in enumerate(self.obs_fields)
+        }
+        self.action_buf = torch.zeros((n, n_dofs), dtype=gs.tc_float, device=device)
+        self.rew_buf = torch.zeros(n, dtype=gs.tc_float, device=device)
+        self.terminated_buf = torch.zeros(n, dtype=torch.bool, device=device)
+        self.truncated_buf = torch.zeros(n, dtype=torch.bool, device=device)
+        self.done_buf = torch.zeros(n, dtype=torch.bool, device=device)
+        self.final_obs_buf = torch.zeros_like(self.obs_buf)
+        self._zero_rew = torch.zeros_like(self.rew_buf)
+        self._no_termination = torch.zeros_like(self.terminated_buf)
+        self._zero_dofs_vel = torch.zeros((n, self.scene.rigid_solver.n_dofs), dtype=gs.tc_float, device=device)
+
+        self.obs_host = None
+        if self.host_mirror:
+            if self.obs_buf.is_cuda:
+                self.obs_host = torch.empty(self.obs_buf.shape, dtype=self.obs_buf.dtype, pin_memory=True)
+                self._host_ready = torch.cuda.Event()
+            else:
+                self.obs_host = self.obs_buf    # already host memory
+
+    def _reset_idx(self, envs_idx: torch.Tensor):
+        """Reinitialise the rigid state and controller targets of envs_idx in batched writes"""
+        if self.world is not None:
+            self.world.restore(envs_idx=envs_idx)
+            self._place_robot(envs_idx)
+        else:
+            solver = self.scene.rigid_solver
+            solver.set_qpos(self._initial_qpos[envs_idx], envs_idx=envs_idx)
+            solver.set_dofs_velocity(self._zero_dofs_vel[:len(envs_idx)], envs_idx=envs_idx)
+        if self.randomizer is not None:
+            self.randomizer.apply(envs_idx)
+        self.robot.control_dofs_position(self._initial_targets[envs_idx], envs_idx=envs_idx)
+        self.episode_steps[envs_idx] = 0
+
+    def _place_robot(self, envs_idx: torch.Tensor):
+        """Put the robot base of envs_idx on a free floor cell of each env's apartment"""
+        start = self.world.sample_start_positions(1, envs_idx.cpu().numpy(), self._start_rng)[:, 0]
+        pos = torch.as_tensor(start, dtype=gs.tc_float, device=gs.device) + self._env_offsets[envs_idx]
+        pos[:, 2] += self._robot_base_height
+        self.robot.set_pos(pos, envs_idx=envs_idx)
+
+    def _envs_idx(self, env_ids) -> torch.Tensor:
+        """env indices from None (all envs), a sequence/tensor of indices or a boolean mask"""
+        if env_ids is None:
+            return self.all_envs
+        env_ids = torch.as_tensor(env_ids, device=gs.device)
+        if env_ids.dtype == torch.bool:
+            return env_ids.nonzero().flatten()
+        return env_ids.flatten()
+
+    def reset(self, *, seed=None, options=None, env_ids=None):
+        """Reset all envs, or only env_ids (indices or a boolean (n_envs,) mask); others keep running"""
+        super().reset(seed=seed)
+        if seed is not None:
+            torch.manual_seed(seed)
+            if self.world is not None:
+                self._start_rng = np.random.default_rng(seed)
+            if self.randomizer is not None:
+                self.randomizer.seed(seed)
+        envs_idx = self._envs_idx(env_ids)
+        if len(envs_idx):
+            self._reset_idx(envs_idx)
+        self.get_agent_state()
+        return self.obs_buf, {}
+
     def step(self, action):
-        return super().step(action)
-    
-    def close(self):
-        return super().close()
-    
-    def get_agent_state(self):
-        pass
\ No newline at end of file
+        if action is not self.action_buf:
+            self.action_buf.copy_(torch.as_tensor(action), non_blocking=True)
+        self.robot.control_dofs_position(self.action_buf)
+        self.scene.step()
+        self.episode_steps += 1
+
+        obs = self.get_agent_state()
+        self.rew_buf.copy_(self.compute_reward(obs, self.action_buf))
+        self.terminated_buf.copy_(self.compute_terminated(obs))
+        torch.ge(self.episode_steps, self.max_episode_steps, out=self.truncated_buf)
+        infos = {}
+        if self.autoreset:
+            torch.logical_or(self.terminated_buf, self.truncated_buf, out=self.done_buf)
+            # one scalar sync per step; everything else stays on the device
+            if self.done_buf.any():
+                self.final_obs_buf.copy_(obs)
+                self._reset_idx(self.done_buf.nonzero().flatten())
+                obs = self.get_agent_state()
+                infos = {"final_obs": self.final_obs_buf, "_final_obs": self.done_buf}
+        return obs, self.rew_buf, self.terminated_buf, self.truncated_buf, infos
+
+    def compute_reward(self, obs: torch.Tensor, actions: torch.Tensor) -> torch.Tensor:
+        """(n_envs,) rewards; override per task"""
+        return self._zero_rew
+
+    def compute_terminated(self, obs: torch.Tensor) -> torch.Tensor:
+        """(n_envs,) episode-end flags; override per task"""
+        return self._no_termination
+
+    def close_extras(self, **kwargs):
+        # tear down the viewer and the simulator of the (possibly shared world's) scene
+        self.scene.destroy()
+
+    def get_agent_state(self) -> torch.Tensor:
+        """Refill obs_buf in place, (n_envs, len(obs_fields) * n_dofs), and start the host mirror copy"""
+        for field, view in self._obs_views.items():
+            view.copy_(self.OBS_FIELDS[field](self.robot))
+        if self.obs_host is not None and self.obs_host is not self.obs_buf:
+            self.obs_host.copy_(self.obs_buf, non_blocking=True)
+            self._host_ready.record()
+        return self.obs_buf
+
+    def observation_views(self, dlpack: bool = False) -> Dict[str, torch.Tensor]:
+        """
+        The per-field views into obs_buf ({"dof_pos": (n_envs, n_dofs), ...}), or their
+        DLPack capsules for other frameworks; neither copies, both see every later step
+        """
+        if dlpack:
+            return {field: to_dlpack(view) for field, view in self._obs_views.items()}
+        return dict(self._obs_views)
+
+    def host_observation(self) -> np.ndarray:
+        """The pinned host mirror of obs_buf as a NumPy view, once the last step's copy has landed"""
+        assert self.obs_host is not None, "create the env with host_mirror=True"
+        if self.obs_host is not self.obs_buf:
+            self._host_ready.synchronize()
+        return self.obs_host.numpy()
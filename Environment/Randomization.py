@@ -0,0 +1,152 @@
+from typing import Dict, Sequence
+
+import torch
+import genesis as gs
+
+from Config import CameraConfig, RandomizationConfig
+
+
+def _yaw_mul(yaw: torch.Tensor, quat: torch.Tensor) -> torch.Tensor:
+    """quat (m, 4, wxyz) rotated by yaw (m,) about the world z axis"""
+    c, s = torch.cos(yaw / 2), torch.sin(yaw / 2)
+    w, x, y, z = quat.unbind(-1)
+    return torch.stack((c * w - s * z, c * x - s * y, c * y + s * x, c * z + s * w), dim=-1)
+
+
+class DomainRandomizer:
+    """
+    Samples the RandomizationConfig parameters of a batch of envs and writes them
+    into the built scene.
+
+    Every randomized quantity is a column of one (n_envs, n_params) table: a reset
+    draws the rows of the reset envs with a single torch.rand, maps them onto the
+    configured ranges in one fused op, and hands each quantity to Genesis as an
+    (len(envs_idx), ...) tensor through the batched setters (set_dofs_kp,
+    set_friction_ratio, set_mass_shift, set_pos, ...). The number of kernels and
+    setter calls depends on the config and the number of randomized entities, not
+    on how many envs are reset.
+
+    `params` holds the current values of every env (columns in `columns`), e.g. for
+    privileged observations. Genesis cameras have a single pose, so the sampled
+    camera poses are kept in `camera_pos` / `camera_lookat` and applied per rendered
+    env by apply_camera().
+    """
+
+    def __init__(self, config: RandomizationConfig, robot, objects: Sequence = (), camera: CameraConfig = None,
+                 n_envs: int = 1):
+        self.config = config
+        self.robot = robot
+        self.objects = list(objects)
+        self.bodies = [robot] + self.objects
+        self.n_envs = n_envs
+        self.generator = torch.Generator(device=gs.device)
+        self.generator.seed()
+
+        n_dofs = robot.n_dofs
+        current_kp = robot.get_dofs_kp()
+        # with batch_dofs_info, dof getters are (n_envs, n_dofs) and setters are per env
+        self._batched_dofs = current_kp.ndim == 2
+        self._all_envs = torch.arange(n_envs, device=gs.device)
+        self.nominal_kp = self._nominal(config.kp, current_kp, n_dofs)
+        self.nominal_kv = self._nominal(config.kv, robot.get_dofs_kv(), n_dofs)
+        lower, upper = robot.get_dofs_force_range()
+        self.nominal_force = self._nominal(config.force_limit, upper, n_dofs)
+        # nominal gains from the config hold in every env, randomized or not
+        if config.kp is not None:
+            self._set_nominal(robot.set_dofs_kp, self.nominal_kp)
+        if config.kv is not None:
+            self._set_nominal(robot.set_dofs_kv, self.nominal_kv)
+        if config.force_limit is not None:
+            self._set_nominal(robot.set_dofs_force_range, -self.nominal_force, self.nominal_force)
+
+        self.object_pos = [obj.get_pos().clone() for obj in self.objects]
+        self.object_quat = [obj.get_quat().clone() for obj in self.objects]
+        self.camera_pos = self.camera_lookat = None
+        if camera is not None:
+            self.camera_pos = torch.tensor(camera.pos, dtype=gs.tc_float, device=gs.device).repeat(n_envs, 1)
+            self.camera_lookat = torch.tensor(camera.lookat, dtype=gs.tc_float, device=gs.device).repeat(n_envs, 1)
+            self._camera_nominal = (self.camera_pos[0].clone(), self.camera_lookat[0].clone())
+
+        ranges = []
+        self.columns: Dict[str, slice] = {}
+
+        def column(name, low, high, width=1):
+            start = len(ranges)
+            ranges.extend(zip(torch.as_tensor(low).expand(width).tolist(), torch.as_tensor(high).expand(width).tolist()))
+            self.columns[name] = slice(start, len(ranges))
+
+        for name, scale in (("kp", config.kp_scale), ("kv", config.kv_scale), ("force", config.force_scale)):
+            if scale is not None:
+                column(name, *scale, width=n_dofs)
+        if config.friction is not None:
+            column("friction", *config.friction, width=len(self.bodies))
+        if config.mass_shift is not None:
+            column("mass_shift", *config.mass_shift, width=len(self.bodies))
+        if self.objects and config.object_pos_noise is not None:
+            noise = torch.tensor(config.object_pos_noise, dtype=torch.float64).repeat(len(self.objects))
+            column("object_pos", -noise, noise, width=3 * len(self.objects))
+        if self.objects and config.object_yaw_noise is not None:
+            column("object_yaw", -config.object_yaw_noise, config.object_yaw_noise, width=len(self.objects))
+        if camera is not None:
+            for name, noise in (("camera_pos", config.camera_pos_noise), ("camera_lookat", config.camera_lookat_noise)):
+                if noise is not None:
+                    noise = torch.tensor(noise, dtype=torch.float64)
+                    column(name, -noise, noise, width=3)
+
+        bounds = torch.tensor(ranges, dtype=gs.tc_float, device=gs.device).reshape(-1, 2)
+        self.low, self.span = bounds[:, 0], bounds[:, 1] - bounds[:, 0]
+        self.params = torch.zeros((n_envs, len(ranges)), dtype=gs.tc_float, device=gs.device)
+        self._draw = torch.empty_like(self.params)
+
+    def _nominal(self, value, current, n_dofs) -> torch.Tensor:
+        if value is None:
+            # per-dof or, with batched dof info, per-env values; all envs start equal
+            return torch.as_tensor(current, dtype=gs.tc_float, device=gs.device).reshape(-1, n_dofs)[0].clone()
+        return torch.as_tensor(value, dtype=gs.tc_float, device=gs.device)
+
+    def _set_nominal(self, setter, *values: torch.Tensor):
+        """Write per-dof values to every env, as (n_envs, n_dofs) rows when dof info is batched"""
+        if self._batched_dofs:
+            setter(*(v.expand(self.n_envs, -1) for v in values), envs_idx=self._all_envs)
+        else:
+            setter(*values)
+
+    def seed(self, seed: int):
+        self.generator.manual_seed(seed)
+
+    def apply(self, envs_idx: torch.Tensor):
+        """Resample and write the randomized parameters of envs_idx"""
+        if not self.columns or len(envs_idx) == 0:
+            return
+        u = self._draw[:len(envs_idx)]
+        torch.rand(u.shape, generator=self.generator, device=gs.device, out=u)
+        values = torch.addcmul(self.low, u, self.span)
+        self.params[envs_idx] = values
+        col = {name: values[:, cols] for name, cols in self.columns.items()}
+        m = len(envs_idx)
+
+        if "kp" in col:
+            self.robot.set_dofs_kp(self.nominal_kp * col["kp"], envs_idx=envs_idx)
+        if "kv" in col:
+            self.robot.set_dofs_kv(self.nominal_kv * col["kv"], envs_idx=envs_idx)
+        if "force" in col:
+            force = self.nominal_force * col["force"]
+            self.robot.set_dofs_force_range(-force, force, envs_idx=envs_idx)
+        for k, body in enumerate(self.bodies):
+            if "friction" in col:
+                body.set_friction_ratio(col["friction"][:, k:k + 1].expand(m, body.n_links).contiguous(), envs_idx=envs_idx)
+            if "mass_shift" in col:
+                body.set_mass_shift(col["mass_shift"][:, k:k + 1].expand(m, body.n_links).contiguous(), envs_idx=envs_idx)
+        for k, obj in enumerate(self.objects):
+            if "object_pos" in col:
+                obj.set_pos(self.object_pos[k][envs_idx] + col["object_pos"][:, 3 * k:3 * k + 3], envs_idx=envs_idx)
+            if "object_yaw" in col:
+                obj.set_quat(_yaw_mul(col["object_yaw"][:, k], self.object_quat[k][envs_idx]), envs_idx=envs_idx)
+        if "camera_pos" in col:
+            self.camera_pos[envs_idx] = self._camera_nominal[0] + col["camera_pos"]
+        if "camera_lookat" in col:
+            self.camera_lookat[envs_idx] = self._camera_nominal[1] + col["camera_lookat"]
+
+    def apply_camera(self, camera, env: int = 0):
+        """Move a Genesis camera to env's sampled pose before rendering it"""
+        camera.set_pose(pos=self.camera_pos[env].cpu().numpy(), lookat=self.camera_lookat[env].cpu().numpy())
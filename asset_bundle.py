@@ -0,0 +1,219 @@
+"""
+Offline asset bundles for nodes without outbound network access.
+
+A bundle is an uncompressed tar holding the original archives of a set of data
+sources, plus an index of where every archive's bytes start inside the tar. On a
+connected machine:
+
+    python download_assets.py partnet_mobility --pack-bundle partnet.tar
+
+Then on any machine of the cluster serve it:
+
+    python download_assets.py --serve-bundle partnet.tar --port 8000
+
+and let the other nodes download through it with their usual checksums:
+
+    python download_assets.py partnet_mobility --mirror http://<peer>:8000 -j 8
+"""
+import http.server
+import io
+import json
+import tarfile
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List, Union
+from urllib.parse import unquote, urlsplit
+
+import asset_sources as assrc
+from asset_manifest import file_sha256
+from download_assets import fetch_url
+
+INDEX_MEMBER = "bundle_index.json"
+
+
+def bundle_member_name(url: str):
+    """Name of the archive of url inside a bundle; also the path the mirror serves it at"""
+    parts = urlsplit(url)
+    return f"{parts.netloc}{parts.path}"
+
+
+def mirror_url(url: str, mirror: str):
+    """Where a mirror serving a bundle provides the file behind url"""
+    return f"{mirror.rstrip('/')}/{bundle_member_name(url)}"
+
+
+def index_path(bundle_path: Union[str, Path]):
+    return Path(f"{bundle_path}.index.json")
+
+
+def pack_bundle(uids: List[str], bundle_path: Union[str, Path], jobs=4, verbose=True):
+    """Download the archives of the given data sources and pack them into one bundle.
+
+    Archives are verified against their recorded checksum while downloading.
+    Hugging Face snapshot sources have no single archive; they are skipped with a
+    notice and are not failures. Returns a dict mapping each uid that could not be
+    packed to the exception.
+    """
+    bundle_path = Path(bundle_path)
+    failures = dict()
+    records = dict()
+    with tempfile.TemporaryDirectory(dir=bundle_path.parent) as tmp_dir:
+
+        def fetch(uid):
+            data_source = assrc.DATA_SOURCES[uid]
+            dst = Path(tmp_dir) / uid.replace("/", "__")
+            digest = fetch_url(data_source.url, dst, checksum=data_source.checksum)
+            return data_source, dst, digest
+
+        with tarfile.open(bundle_path, "w") as tar, ThreadPoolExecutor(
+            max_workers=jobs
+        ) as executor:
+            futures = dict()
+            for uid in uids:
+                if assrc.DATA_SOURCES[uid].url is None:
+                    if verbose:
+                        print(f"Skip {uid}: Hugging Face snapshot, not a single archive")
+                    continue
+                futures[executor.submit(fetch, uid)] = uid
+            for future in as_completed(futures):
+                uid = futures[future]
+                try:
+                    data_source, dst, digest = future.result()
+                except Exception as err:
+                    failures[uid] = err
+                    continue
+                name = bundle_member_name(data_source.url)
+                if name not in records:
+                    tar.add(dst, arcname=name)
+                    records[name] = dict(url=data_source.url, sha256=digest, uids=[])
+                records[name]["uids"].append(uid)
+                dst.unlink()
+                if verbose:
+                    print(f"Packed {uid} ({len(records)}/{len(futures)})")
+
+    write_bundle_index(bundle_path, records)
+    return failures
+
+
+def bundle_archives(archives: Dict[str, Union[str, Path]], bundle_path: Union[str, Path]):
+    """Pack local, already verified archive files into a bundle, keyed by the url
+    each of them is normally downloaded from"""
+    records = dict()
+    with tarfile.open(bundle_path, "w") as tar:
+        for url, filename in archives.items():
+            name = bundle_member_name(url)
+            tar.add(filename, arcname=name)
+            records[name] = dict(url=url, sha256=file_sha256(filename), uids=[])
+    write_bundle_index(bundle_path, records)
+
+
+def write_bundle_index(bundle_path: Union[str, Path], records: Dict[str, dict]):
+    # tarfile only knows where member data starts once it reads the headers back
+    with tarfile.open(bundle_path, "r") as tar:
+        for member in tar.getmembers():
+            records[member.name].update(offset=member.offset_data, size=member.size)
+    index = dict(members=records)
+    with open(index_path(bundle_path), "w") as f:
+        json.dump(index, f)
+    with tarfile.open(bundle_path, "a") as tar:
+        data = json.dumps(index).encode()
+        tarinfo = tarfile.TarInfo(INDEX_MEMBER)
+        tarinfo.size = len(data)
+        tar.addfile(tarinfo, io.BytesIO(data))
+
+
+def load_bundle_index(bundle_path: Union[str, Path]) -> Dict[str, dict]:
+    """member name -> dict(url, sha256, offset, size), from the sidecar or the tar itself"""
+    if index_path(bundle_path).exists():
+        with open(index_path(bundle_path), "r") as f:
+            return json.load(f)["members"]
+    with tarfile.open(bundle_path, "r") as tar:
+        return json.load(tar.extractfile(INDEX_MEMBER))["members"]
+
+
+class BundleRequestHandler(http.server.BaseHTTPRequestHandler):
+    """Serves the archives of a bundle by path, with HEAD and single Range support"""
+
+    bundle_path: str = None
+    members: Dict[str, dict] = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _resolve(self):
+        """The requested member and the byte range to send, or None after an error reply"""
+        record = self.members.get(unquote(urlsplit(self.path).path).lstrip("/"))
+        if record is None:
+            self.send_error(404)
+            return None
+        size = record["size"]
+        start, end = 0, size - 1
+        range_header = self.headers.get("Range")
+        if range_header is None:
+            self.send_response(200)
+        else:
+            try:
+                unit, spec = range_header.split("=", 1)
+                first, last = spec.split(",")[0].split("-")
+                if unit.strip() != "bytes":
+                    raise ValueError
+                if first == "":
+                    start = max(size - int(last), 0)
+                else:
+                    start = int(first)
+                    end = min(int(last), size - 1) if last else size - 1
+            except ValueError:
+                self.send_error(400)
+                return None
+            if start >= size or start > end:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return None
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", f'"{record["sha256"]}"')
+        self.end_headers()
+        return record, start, end
+
+    def do_HEAD(self):
+        self._resolve()
+
+    def do_GET(self):
+        resolved = self._resolve()
+        if resolved is None:
+            return
+        record, start, end = resolved
+        with open(self.bundle_path, "rb") as f:
+            self.connection.sendfile(
+                f, offset=record["offset"] + start, count=end - start + 1
+            )
+
+
+def make_bundle_server(bundle_path: Union[str, Path], host="0.0.0.0", port=8000):
+    """A threading HTTP server for the bundle; call serve_forever() on it"""
+    handler = type(
+        "Handler",
+        (BundleRequestHandler,),
+        dict(bundle_path=str(bundle_path), members=load_bundle_index(bundle_path)),
+    )
+    return http.server.ThreadingHTTPServer((host, port), handler)
+
+
+def serve_bundle(bundle_path: Union[str, Path], host="0.0.0.0", port=8000):
+    server = make_bundle_server(bundle_path, host, port)
+    print(
+        f"Serving {len(server.RequestHandlerClass.members)} archives from {bundle_path} "
+        f"on http://{host}:{server.server_address[1]}"
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,92 @@
+import hashlib
+import json
+import os
+import os.path as osp
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+MANIFEST_FILENAME = ".asset_manifest.json"
+
+
+def file_sha256(filename: Union[str, Path]):
+    with open(filename, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+def manifest_path(output_path: Union[str, Path]):
+    return Path(output_path) / MANIFEST_FILENAME
+
+
+def write_manifest(
+    output_path: Union[str, Path],
+    hashes: Dict[str, Optional[str]],
+    root: str = ".",
+):
+    """Record the files a download produced so they can be verified later.
+
+    hashes maps each file path, relative to output_path / root, to its SHA-256 (or
+    None if it was not computed). Sizes and mtimes are taken from disk now.
+    """
+    output_path = Path(output_path)
+    root_dir = output_path / root
+    files = []
+    for name, digest in sorted(hashes.items()):
+        st = os.stat(root_dir / name)
+        files.append(
+            dict(path=name, size=st.st_size, mtime_ns=st.st_mtime_ns, sha256=digest)
+        )
+    tmp = manifest_path(output_path).with_suffix(".tmp")
+    with open(tmp, "w") as f:
+        json.dump(dict(root=root, files=files), f)
+    os.replace(tmp, manifest_path(output_path))
+
+
+def read_manifest(output_path: Union[str, Path]):
+    path = manifest_path(output_path)
+    if not path.exists():
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def walk_files(root_dir: Union[str, Path]):
+    """All file paths below root_dir, relative to it, except the manifest itself"""
+    names = []
+    for dirpath, _, filenames in os.walk(root_dir):
+        for filename in filenames:
+            name = osp.relpath(osp.join(dirpath, filename), root_dir)
+            if name != MANIFEST_FILENAME:
+                names.append(name)
+    return names
+
+
+def verify_manifest(output_path: Union[str, Path], deep=False) -> List[str]:
+    """Check the files recorded in the manifest of output_path.
+
+    Files whose size and mtime still match the manifest are trusted unless deep is
+    set; otherwise they are hashed and compared with the recorded SHA-256. Returns
+    a list of problems, empty if everything checks out.
+    """
+    output_path = Path(output_path)
+    if not output_path.exists():
+        return [f"{output_path} is missing"]
+    manifest = read_manifest(output_path)
+    if manifest is None:
+        return [f"{manifest_path(output_path)} is missing"]
+    root_dir = output_path / manifest["root"]
+    problems = []
+    for entry in manifest["files"]:
+        path = root_dir / entry["path"]
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            problems.append(f"{path} is missing")
+            continue
+        if st.st_size != entry["size"]:
+            problems.append(f"{path} has size {st.st_size}, expected {entry['size']}")
+            continue
+        if not deep and st.st_mtime_ns == entry["mtime_ns"]:
+            continue
+        if entry["sha256"] is not None and file_sha256(path) != entry["sha256"]:
+            problems.append(f"{path} does not match its recorded SHA-256")
+    return problems
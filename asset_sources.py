@@ -1,12 +1,33 @@
 import os
+from collections.abc import MutableMapping
 from dataclasses import dataclass
-from typing import Dict, List, Optional, Union
+from typing import Callable, Dict, List, Optional, Union
 from pathlib import Path
 import json, gzip
 
-ASSET_DIR = Path(os.environ['DOWNLOAD_PATH']).resolve()
+from asset_manifest import verify_manifest
+
 PACKAGE_DIR = Path(__file__).parent.resolve()
 PACKAGE_ASSET_DIR = PACKAGE_DIR / "assets"
+PARTNET_MOBILITY_CATEGORIES = ["cabinet_drawer", "cabinet_door", "chair", "bucket", "faucet"]
+PARTNET_MOBILITY_INDEX = PACKAGE_ASSET_DIR / "partnet_mobility/meta/index.json"
+
+
+def get_asset_dir() -> Path:
+    """The directory assets are downloaded to, taken from $DOWNLOAD_PATH when first needed"""
+    if "DOWNLOAD_PATH" not in os.environ:
+        raise RuntimeError(
+            "Set the DOWNLOAD_PATH environment variable to the directory assets are downloaded to"
+        )
+    return Path(os.environ["DOWNLOAD_PATH"]).resolve()
+
+
+def __getattr__(name):
+    # ASSET_DIR used to be resolved at import time, which failed without DOWNLOAD_PATH
+    if name == "ASSET_DIR":
+        return get_asset_dir()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 def load_json(filename: Union[str, Path]):
     filename = str(filename)
@@ -20,7 +41,7 @@ def load_json(filename: Union[str, Path]):
     f.close()
     return ret
 
-@dataclass
+@dataclass(slots=True)
 class DataSource:
     source_type: str
     """what kind of data is this"""
@@ -34,43 +55,175 @@ class DataSource:
     """what to rename a zip files generated directory to"""
     filename: Optional[str] = None
     """name to change the downloaded file to. If None, will not change the name"""
-    output_dir: str = ASSET_DIR
-    
-DATA_SOURCES: Dict[str, DataSource] = {}
-DATA_GROUPS: Dict[str, List[str]] = {}
-    
-def is_data_source_downloaded(data_source_id: str):
+    output_dir: Optional[Path] = None
+    """where target_path lives; None means get_asset_dir(), resolved only when used"""
+
+    def get_output_dir(self) -> Path:
+        return get_asset_dir() if self.output_dir is None else Path(self.output_dir)
+
+
+class LazyDataSource:
+    """A DataSource declared up front but only built when it is looked up"""
+
+    __slots__ = ("source_type", "kwargs")
+
+    def __init__(self, source_type: str, **kwargs):
+        self.source_type = source_type
+        self.kwargs = kwargs
+
+    def materialise(self) -> DataSource:
+        return DataSource(source_type=self.source_type, **self.kwargs)
+
+
+class PartNetMobilitySource:
+    """Index record of one PartNet-Mobility model"""
+
+    __slots__ = ("model_id",)
+    source_type = "objects"
+
+    def __init__(self, model_id: str):
+        self.model_id = model_id
+
+    def materialise(self) -> DataSource:
+        return DataSource(
+            source_type=self.source_type,
+            url=f"https://storage1.ucsd.edu/datasets/ManiSkill2022-assets/partnet_mobility/dataset/{self.model_id}.zip",
+            target_path=f"partnet_mobility/dataset/{self.model_id}",
+        )
+
+
+class LazyRegistry(MutableMapping):
+    """A dict whose values may be lazy records that are materialised on first lookup.
+
+    Loaders registered with add_loader fill in whole batches of keys; they run the
+    first time a key is missing or the registry is iterated.
+    """
+
+    def __init__(self):
+        self._entries = dict()
+        self._loaders = []
+        self.version = 0
+        """bumped on every change so derived indices know when to rebuild"""
+
+    def add_loader(self, loader: Callable[[], None]):
+        self._loaders.append(loader)
+        self.version += 1
+
+    def _run_loaders(self):
+        while self._loaders:
+            self._loaders.pop(0)()
+
+    def raw(self, key):
+        """The entry for key without materialising it"""
+        if key not in self._entries:
+            self._run_loaders()
+        return self._entries[key]
+
+    def __getitem__(self, key):
+        entry = self.raw(key)
+        if isinstance(entry, (LazyDataSource, PartNetMobilitySource)):
+            entry = entry.materialise()
+            self._entries[key] = entry
+        return entry
+
+    def __setitem__(self, key, value):
+        self._entries[key] = value
+        self.version += 1
+
+    def __delitem__(self, key):
+        self._run_loaders()
+        del self._entries[key]
+        self.version += 1
+
+    def __contains__(self, key):
+        if key in self._entries:
+            return True
+        self._run_loaders()
+        return key in self._entries
+
+    def __iter__(self):
+        self._run_loaders()
+        return iter(list(self._entries))
+
+    def __len__(self):
+        self._run_loaders()
+        return len(self._entries)
+
+    def clear(self):
+        self._loaders.clear()
+        self._entries.clear()
+        self.version += 1
+
+
+DATA_SOURCES: Dict[str, DataSource] = LazyRegistry()
+DATA_GROUPS: Dict[str, List[str]] = LazyRegistry()
+_EXPANDED_GROUPS: Dict[str, List[str]] = {}
+_EXPANDED_GROUPS_VERSION = None
+
+def is_data_source_downloaded(data_source_id: str, verify: bool = False):
+    """With verify, also check the files against the manifest written at extraction"""
     data_source = DATA_SOURCES[data_source_id]
-    return os.path.exists(data_source.output_dir / data_source.target_path)
+    output_path = data_source.get_output_dir() / data_source.target_path
+    if verify:
+        return len(verify_manifest(output_path)) == 0
+    return os.path.exists(output_path)
+
+
+def data_source_ids_of_type(source_type: str) -> List[str]:
+    """All uids of the given source type, without materialising their data sources"""
+    return [
+        uid for uid in DATA_SOURCES if DATA_SOURCES.raw(uid).source_type == source_type
+    ]
+
+
+def build_partnet_mobility_index():
+    """Collect the model ids of every category from the info_*_train.json files.
+
+    This is what assets/partnet_mobility/meta/index.json stores, so looking up
+    PartNet-Mobility sources does not have to parse the much larger info files.
+    """
+    index = {}
+    for category in PARTNET_MOBILITY_CATEGORIES:
+        model_json = (
+            PACKAGE_ASSET_DIR / f"partnet_mobility/meta/info_{category}_train.json"
+        )
+        index[category] = sorted(load_json(model_json).keys())
+    return index
+
+
+def load_partnet_mobility_index():
+    if PARTNET_MOBILITY_INDEX.exists():
+        return load_json(PARTNET_MOBILITY_INDEX)
+    return build_partnet_mobility_index()
 
 
 def initialize_data_sources():
-    DATA_SOURCES["ycb"] = DataSource(
+    DATA_SOURCES["ycb"] = LazyDataSource(
         source_type="task_assets",
         url="https://huggingface.co/datasets/haosulab/ManiSkill2/resolve/main/data/mani_skill2_ycb.zip",
         target_path="assets/mani_skill2_ycb",
         checksum="1551724fd1ac7bad9807ebcf46dd4a788caed5c9499c1225b9bfa080ffbefcb3",
     )
-    DATA_SOURCES["pick_clutter_ycb_configs"] = DataSource(
+    DATA_SOURCES["pick_clutter_ycb_configs"] = LazyDataSource(
         source_type="task_assets",
         url="https://storage1.ucsd.edu/datasets/ManiSkill2022-assets/pick_clutter/ycb_train_5k.json.gz",
         target_path="tasks/pick_clutter",
         checksum="70ec176c7036f326ea7813b77f8c03bea9db5960198498957a49b2895a9ec338",
     )
-    DATA_SOURCES["assembling_kits"] = DataSource(
+    DATA_SOURCES["assembling_kits"] = LazyDataSource(
         source_type="task_assets",
         url="https://storage1.ucsd.edu/datasets/ManiSkill2022-assets/assembling_kits_v1.zip",
         target_path="tasks/assembling_kits",
         checksum="e3371f17a07a012edaa3a0b3604fb1577f3fb921876c3d5ed59733dd75a6b4a0",
     )
-    DATA_SOURCES["panda_avoid_obstacles"] = DataSource(
+    DATA_SOURCES["panda_avoid_obstacles"] = LazyDataSource(
         source_type="task_assets",
         url="https://storage1.ucsd.edu/datasets/ManiSkill2022-assets/avoid_obstacles/panda_train_2k.json.gz",
         target_path="tasks/avoid_obstacles",
         checksum="44dae9a0804172515c290c1f49a1e7e72d76e40201a2c5c7d4a3ccd43b4d5be4",
     )
 
-    DATA_SOURCES["bridge_v2_real2sim"] = DataSource(
+    DATA_SOURCES["bridge_v2_real2sim"] = LazyDataSource(
         source_type="task_assets",
         url="https://huggingface.co/datasets/haosulab/ManiSkill_bridge_v2_real2sim/resolve/main/bridge_v2_real2sim_dataset.zip",
         target_path="tasks/bridge_v2_real2sim_dataset",
@@ -80,35 +233,31 @@ def initialize_data_sources():
     # ---------------------------------------------------------------------------- #
     # PartNet-mobility
     # ---------------------------------------------------------------------------- #
-    category_uids = {}
-    for category in ["cabinet_drawer", "cabinet_door", "chair", "bucket", "faucet"]:
-        model_json = (
-            PACKAGE_ASSET_DIR / f"partnet_mobility/meta/info_{category}_train.json"
+    # The models are only registered once a PartNet-Mobility uid or group is needed
+    def load_partnet_mobility():
+        for model_ids in load_partnet_mobility_index().values():
+            for model_id in model_ids:
+                DATA_SOURCES[f"partnet_mobility/{model_id}"] = PartNetMobilitySource(
+                    model_id
+                )
+
+    def load_partnet_mobility_groups():
+        category_uids = {
+            category: [f"partnet_mobility/{model_id}" for model_id in model_ids]
+            for category, model_ids in load_partnet_mobility_index().items()
+        }
+        DATA_GROUPS["partnet_mobility_cabinet"] = sorted(
+            set(category_uids["cabinet_drawer"] + category_uids["cabinet_door"])
         )
-        model_ids = set(load_json(model_json).keys())
-        category_uids[category] = []
-        for model_id in model_ids:
-            uid = f"partnet_mobility/{model_id}"
-            DATA_SOURCES[uid] = DataSource(
-                source_type="objects",
-                url=f"https://storage1.ucsd.edu/datasets/ManiSkill2022-assets/partnet_mobility/dataset/{model_id}.zip",
-                target_path=ASSET_DIR / "partnet_mobility" / "dataset" / model_id,
-            )
-            category_uids[category].append(uid)
-
-    DATA_GROUPS["partnet_mobility_cabinet"] = set(
-        category_uids["cabinet_drawer"] + category_uids["cabinet_door"]
-    )
-    DATA_GROUPS["partnet_mobility_chair"] = category_uids["chair"]
-    DATA_GROUPS["partnet_mobility_bucket"] = category_uids["bucket"]
-    DATA_GROUPS["partnet_mobility_faucet"] = category_uids["faucet"]
-    DATA_GROUPS["partnet_mobility"] = set(
-        category_uids["cabinet_drawer"]
-        + category_uids["cabinet_door"]
-        + category_uids["chair"]
-        + category_uids["bucket"]
-        + category_uids["faucet"]
-    )
+        DATA_GROUPS["partnet_mobility_chair"] = category_uids["chair"]
+        DATA_GROUPS["partnet_mobility_bucket"] = category_uids["bucket"]
+        DATA_GROUPS["partnet_mobility_faucet"] = category_uids["faucet"]
+        DATA_GROUPS["partnet_mobility"] = sorted(
+            set(uid for uids in category_uids.values() for uid in uids)
+        )
+
+    DATA_SOURCES.add_loader(load_partnet_mobility)
+    DATA_GROUPS.add_loader(load_partnet_mobility_groups)
 
     # DATA_GROUPS["OpenCabinetDrawer-v1"] = category_uids["cabinet_drawer"]
     # DATA_GROUPS["OpenCabinetDoor-v1"] = category_uids["cabinet_door"]
@@ -119,82 +268,82 @@ def initialize_data_sources():
     # ---------------------------------------------------------------------------- #
     # Interactable Scene Datasets
     # ---------------------------------------------------------------------------- #
-    DATA_SOURCES["ReplicaCAD"] = DataSource(
+    DATA_SOURCES["ReplicaCAD"] = LazyDataSource(
         source_type="scene",
         hf_repo_id="haosulab/ReplicaCAD",
         target_path="scene_datasets/replica_cad_dataset",
     )
 
-    DATA_SOURCES["ReplicaCADRearrange"] = DataSource(
+    DATA_SOURCES["ReplicaCADRearrange"] = LazyDataSource(
         source_type="scene",
         url="https://huggingface.co/datasets/haosulab/ReplicaCADRearrange/resolve/main/rearrange.zip",
         target_path="scene_datasets/replica_cad_dataset/rearrange",
     )
 
-    DATA_SOURCES["AI2THOR"] = DataSource(
+    DATA_SOURCES["AI2THOR"] = LazyDataSource(
         source_type="scene",
         url="https://huggingface.co/datasets/haosulab/AI2THOR/resolve/main/ai2thor.zip",
         target_path="scene_datasets/ai2thor",
     )
 
-    DATA_SOURCES["RoboCasa"] = DataSource(
+    DATA_SOURCES["RoboCasa"] = LazyDataSource(
         source_type="scene",
         url="https://huggingface.co/datasets/haosulab/RoboCasa/resolve/main/robocasa_dataset.zip",
         target_path="scene_datasets/robocasa_dataset",
     )
 
     # Robots
-    DATA_SOURCES["ur10e"] = DataSource(
+    DATA_SOURCES["ur10e"] = LazyDataSource(
         source_type="robot",
         url="https://github.com/haosulab/ManiSkill-UR10e/archive/refs/tags/v0.1.0.zip",
         target_path="robots/ur10e",
     )
-    DATA_SOURCES["anymal_c"] = DataSource(
+    DATA_SOURCES["anymal_c"] = LazyDataSource(
         source_type="robot",
         url="https://github.com/haosulab/ManiSkill-ANYmalC/archive/refs/tags/v0.1.1.zip",
         target_path="robots/anymal_c",
     )
-    DATA_SOURCES["unitree_h1"] = DataSource(
+    DATA_SOURCES["unitree_h1"] = LazyDataSource(
         source_type="robot",
         url="https://github.com/haosulab/ManiSkill-UnitreeH1/archive/refs/tags/v0.1.0.zip",
         target_path="robots/unitree_h1",
     )
-    DATA_SOURCES["unitree_g1"] = DataSource(
+    DATA_SOURCES["unitree_g1"] = LazyDataSource(
         source_type="robot",
         url="https://github.com/haosulab/ManiSkill-UnitreeG1/archive/refs/tags/v0.1.0.zip",
         target_path="robots/unitree_g1",
     )
-    DATA_SOURCES["unitree_go2"] = DataSource(
+    DATA_SOURCES["unitree_go2"] = LazyDataSource(
         source_type="robot",
         url="https://github.com/haosulab/ManiSkill-UnitreeGo2/archive/refs/tags/v0.1.1.zip",
         target_path="robots/unitree_go2",
     )
-    DATA_SOURCES["stompy"] = DataSource(
+    DATA_SOURCES["stompy"] = LazyDataSource(
         source_type="robot",
         url="https://github.com/haosulab/ManiSkill-Stompy/archive/refs/tags/v0.1.0.zip",
         target_path="robots/stompy",
     )
-    DATA_SOURCES["widowx250s"] = DataSource(
+    DATA_SOURCES["widowx250s"] = LazyDataSource(
         source_type="robot",
         url="https://github.com/haosulab/ManiSkill-WidowX250S/archive/refs/tags/v0.2.0.zip",
         target_path="robots/widowx",
     )
-    DATA_SOURCES["googlerobot"] = DataSource(
+    DATA_SOURCES["googlerobot"] = LazyDataSource(
         source_type="robot",
         url="https://github.com/haosulab/ManiSkill-GoogleRobot/archive/refs/tags/v0.1.0.zip",
         target_path="robots/googlerobot",
     )
-    DATA_SOURCES["robotiq_2f"] = DataSource(
+    DATA_SOURCES["robotiq_2f"] = LazyDataSource(
         source_type="robot",
         url="https://github.com/haosulab/ManiSkill-Robotiq_2F/archive/refs/tags/v0.1.0.zip",
         target_path="robots/robotiq_2f",
     )
-    DATA_SOURCES["xarm6"] = DataSource(
+    DATA_SOURCES["xarm6"] = LazyDataSource(
         source_type="robot",
         url="https://github.com/haosulab/ManiSkill-XArm6/archive/refs/tags/v0.1.1.zip",
         target_path="robots/xarm6",
     )
-    DATA_SOURCES["widowxai"] = DataSource(
+    DATA_SOURCES["widowxai"] = LazyDataSource(
         source_type="robot",
         url="https://github.com/TrossenRobotics/ManiSkill-WidowX_AI/archive/refs/tags/v0.1.0.zip",
         target_path="robots/widowxai",
@@ -202,7 +351,18 @@ def initialize_data_sources():
 
 
 def expand_data_group_into_individual_data_source_ids(data_group_id: str):
-    """Expand a data group into a list of individual data source IDs"""
+    """Expand a data group into a list of individual data source IDs
+
+    Expansions are cached until DATA_SOURCES or DATA_GROUPS change.
+    """
+    global _EXPANDED_GROUPS_VERSION
+    version = (DATA_SOURCES.version, DATA_GROUPS.version)
+    if _EXPANDED_GROUPS_VERSION != version:
+        _EXPANDED_GROUPS.clear()
+        _EXPANDED_GROUPS_VERSION = version
+    if data_group_id in _EXPANDED_GROUPS:
+        return list(_EXPANDED_GROUPS[data_group_id])
+
     uids = []
 
     def helper(uid):
@@ -214,8 +374,15 @@ def expand_data_group_into_individual_data_source_ids(data_group_id: str):
 
     for uid in DATA_GROUPS[data_group_id]:
         helper(uid)
-    uids = list(set(uids))
-    return uids
+    uids = list(dict.fromkeys(uids))
+    _EXPANDED_GROUPS[data_group_id] = uids
+    return list(uids)
 
 
 initialize_data_sources()
+
+if __name__ == "__main__":
+    # Rebuild the PartNet-Mobility index after changing the info_*_train.json files
+    with open(PARTNET_MOBILITY_INDEX, "w") as f:
+        json.dump(build_partnet_mobility_index(), f)
+    print(f"Wrote {PARTNET_MOBILITY_INDEX}")
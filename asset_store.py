@@ -0,0 +1,180 @@
+import errno
+import fcntl
+import hashlib
+import json
+import os
+import os.path as osp
+import shutil
+import stat
+import tempfile
+import zipfile
+from pathlib import Path
+from typing import Optional, Union
+
+import asset_sources as assrc
+from asset_manifest import file_sha256, write_manifest
+
+FICLONE = 0x40049409
+"""Linux ioctl that makes dst share the extents of src (btrfs, xfs, ...)"""
+
+
+def shared_base_dir(names):
+    """The single top-level directory all archive members live in, or None"""
+    base = None
+    for name in names:
+        top = name.split("/")[0]
+        if base is None:
+            base = top
+        elif base != top:
+            return None
+    return base
+
+
+def link_or_copy(src: Union[str, Path], dst: Union[str, Path]):
+    """Materialise src at dst as a hardlink, falling back to a reflink and then a copy.
+
+    Returns which of "hardlink", "reflink" or "copy" was used.
+    """
+    try:
+        os.link(src, dst)
+        return "hardlink"
+    except OSError as err:
+        if err.errno not in (errno.EXDEV, errno.EMLINK, errno.EPERM, errno.ENOTSUP):
+            raise
+    try:
+        with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        return "reflink"
+    except OSError:
+        pass
+    shutil.copyfile(src, dst)
+    return "copy"
+
+
+class AssetStore:
+    """Content-addressed cache of extracted data sources.
+
+    Layout under root:
+        objects/<aa>/<sha256>    file contents, read-only, keyed by their own hash
+        trees/<key>.json         the files of one archive, keyed by the archive checksum
+        refs/<sha1(url)>.json    maps a url without a recorded checksum to its tree key
+
+    Checkouts hardlink (or reflink/copy across filesystems) the objects into the
+    output directory, so several output dirs or users on one machine share a single
+    copy of every file. Checked out files are read-only since they are shared.
+    """
+
+    def __init__(self, root: Union[str, Path]):
+        self.root = Path(root)
+        for sub in ["objects", "trees", "refs", "tmp"]:
+            (self.root / sub).mkdir(parents=True, exist_ok=True)
+
+    def _object_path(self, digest: str):
+        return self.root / "objects" / digest[:2] / digest
+
+    def _ref_path(self, url: str):
+        return self.root / "refs" / f"{hashlib.sha1(url.encode()).hexdigest()}.json"
+
+    def _write_json(self, path: Path, data):
+        fd, tmp = tempfile.mkstemp(dir=self.root / "tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+
+    def tree_key(self, data_source: assrc.DataSource) -> Optional[str]:
+        """The key the extracted contents of data_source are stored under, if known"""
+        if data_source.checksum is not None:
+            return data_source.checksum
+        ref_path = self._ref_path(data_source.url)
+        if ref_path.exists():
+            with open(ref_path, "r") as f:
+                return json.load(f)["tree"]
+        return None
+
+    def lookup(self, data_source: assrc.DataSource) -> Optional[dict]:
+        key = self.tree_key(data_source)
+        if key is None:
+            return None
+        tree_path = self.root / "trees" / f"{key}.json"
+        if not tree_path.exists():
+            return None
+        with open(tree_path, "r") as f:
+            return json.load(f)
+
+    def _add_object(self, filename: Path):
+        """Move filename into the object store and return its hash"""
+        digest = file_sha256(filename)
+        object_path = self._object_path(digest)
+        if object_path.exists():
+            filename.unlink()
+        else:
+            object_path.parent.mkdir(exist_ok=True)
+            os.chmod(filename, stat.S_IMODE(os.stat(filename).st_mode) & ~0o222)
+            os.replace(filename, object_path)
+        return digest
+
+    def ingest(
+        self,
+        data_source: assrc.DataSource,
+        archive: Union[str, Path],
+        archive_sha256: Optional[str] = None,
+    ) -> dict:
+        """Add a downloaded (and already verified) archive to the store and return its tree.
+
+        Non-zip archives are moved into the store.
+        """
+        if archive_sha256 is None:
+            archive_sha256 = data_source.checksum or file_sha256(archive)
+        files = []
+        if data_source.url.endswith(".zip"):
+            staging = Path(tempfile.mkdtemp(dir=self.root / "tmp"))
+            try:
+                with zipfile.ZipFile(archive, "r") as zip_ref:
+                    zip_ref.extractall(staging)
+                    names = [
+                        info.filename for info in zip_ref.infolist() if not info.is_dir()
+                    ]
+                for name in names:
+                    files.append([name, self._add_object(staging / name)])
+            finally:
+                shutil.rmtree(staging)
+            tree = dict(kind="zip", files=files)
+        else:
+            base_filename = data_source.filename or data_source.url.split("/")[-1]
+            staged = self.root / "tmp" / archive_sha256
+            shutil.move(archive, staged)
+            tree = dict(kind="file", files=[[base_filename, self._add_object(staged)]])
+
+        self._write_json(self.root / "trees" / f"{archive_sha256}.json", tree)
+        if data_source.checksum is None:
+            self._write_json(self._ref_path(data_source.url), dict(tree=archive_sha256))
+        return tree
+
+    def checkout(self, tree: dict, data_source: assrc.DataSource, output_path: Path):
+        """Materialise a stored tree at output_path the same way download() extracts it"""
+        if tree["kind"] == "zip":
+            # zips are extracted next to the target and a single top-level dir is
+            # renamed to the target's name
+            dst_dir = Path(osp.dirname(output_path))
+            base = shared_base_dir([name for name, _ in tree["files"]])
+            target_name = osp.basename(data_source.target_path)
+        else:
+            dst_dir = output_path
+            base = None
+        hashes = dict()
+        for name, digest in tree["files"]:
+            if base is not None:
+                hashes[name[len(base) + 1 :]] = digest
+                name = target_name + name[len(base) :]
+            else:
+                hashes[name] = digest
+            dst = dst_dir / name
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            if dst.exists() or dst.is_symlink():
+                dst.unlink()
+            link_or_copy(self._object_path(digest), dst)
+        if tree["kind"] == "zip" and base is None:
+            write_manifest(output_path, hashes, root="..")
+        else:
+            write_manifest(output_path, hashes)
+        return output_path
@@ -0,0 +1,147 @@
+"""
+background.py
+-------------
+One merged, fixed collision body per ReplicaCAD scene: the stage plus every
+static object (replicad.static_mask), concatenated into a single mesh.
+
+Loading each static object as its own body costs a broadphase entry (and, with
+fixed=False, six DOFs) per instance although none of them ever moves. The
+merged mesh is built in the world frame, every part where Genesis puts it when
+loaded on its own (replicad.mesh_matrix), and written as OBJ so it is added with
+an identity pose and no axis conversion (add_background). It replaces the stage's
+collision geometry; static objects stay as visual-only entities and only
+genuinely dynamic objects remain free bodies.
+Results are cached under CACHE_DIR/background/ and rebuilt when a source changes.
+
+    python background.py                     # all scenes of scene_metadata.json
+    python background.py --collision-lod 20000
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import pathlib
+
+import numpy as np
+
+import replicad
+
+BACKGROUND_CACHE_DIR = replicad.CACHE_DIR / "background"
+CACHE_VERSION = 2
+
+
+def background_path(scene_json, collision_lod: int | None = None) -> pathlib.Path:
+    name = pathlib.Path(scene_json).name.replace(".scene_instance.json", "")
+    suffix = "" if collision_lod is None else f".lod{collision_lod}"
+    return BACKGROUND_CACHE_DIR / f"{name}{suffix}.obj"
+
+
+def static_collision_meshes(manifest, collision_lod: int | None = None) -> list[tuple[pathlib.Path, np.ndarray]]:
+    """
+    (mesh file, 4x4 world transform) of the stage collision mesh and of every static
+    object's collision asset (its render mesh if it has none)
+    """
+    stage_glb = pathlib.Path(str(manifest["stage_glb"]))
+    if collision_lod is not None:
+        from collision_lod import collision_lod_path
+
+        stage_glb = collision_lod_path(stage_glb, collision_lod)
+    meshes = [(stage_glb, replicad.mesh_matrix(stage_glb, replicad.STAGE_POS, replicad._AX_SWAP))]
+
+    lift = np.array([0.0, 0.0, replicad.REST_Z_SHIFT])
+    for i in np.flatnonzero(replicad.static_mask(manifest)):
+        file = str(manifest["obj_collision_asset"][i]) or str(manifest["obj_render_asset"][i])
+        T = replicad.mesh_matrix(file, manifest["obj_pos"][i] + lift, replicad.quat_matrix(manifest["obj_quat"][i]))
+        meshes.append((pathlib.Path(file), T))
+    return meshes
+
+
+def _read_index(path: pathlib.Path) -> dict | None:
+    index_path = path.with_suffix(".json")
+    if not (path.exists() and index_path.exists()):
+        return None
+    index = json.loads(index_path.read_text())
+    if index["version"] != CACHE_VERSION or replicad.sources_changed(index["sources"]):
+        return None
+    return index
+
+
+def build_background(scene_json, collision_lod: int | None = None) -> pathlib.Path:
+    """The merged background collision mesh of scene_json, (re)building it if needed"""
+    import trimesh
+
+    path = background_path(scene_json, collision_lod)
+    if _read_index(path) is not None:
+        return path
+
+    manifest = replicad.load_scene_manifest(scene_json)
+    meshes = static_collision_meshes(manifest, collision_lod)
+    loaded: dict[pathlib.Path, trimesh.Trimesh] = {}
+    parts = []
+    for file, T in meshes:
+        if file not in loaded:
+            loaded[file] = trimesh.load(file, force="mesh")
+        part = loaded[file].copy()
+        part.apply_transform(T)
+        parts.append(trimesh.Trimesh(part.vertices, part.faces, process=False))
+    merged = trimesh.util.concatenate(parts)
+
+    sources = json.loads(str(manifest["sources"])) + [
+        replicad.file_record(file) for file in sorted(loaded)
+    ]
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.stem}.{os.getpid()}.obj")
+    merged.export(tmp, file_type="obj")
+    os.replace(tmp, path)
+    index = dict(
+        version=CACHE_VERSION,
+        sources=sources,
+        static_objects=len(meshes) - 1,
+        faces=len(merged.faces),
+    )
+    tmp = path.with_name(f".{path.stem}.{os.getpid()}.json")
+    tmp.write_text(json.dumps(index, indent=2))
+    os.replace(tmp, path.with_suffix(".json"))
+    return path
+
+
+def add_background(scene, scene_json, collision_lod: int | None = None, offset=(0.0, 0.0, 0.0), **kwargs):
+    """Add the merged background of scene_json to a Genesis scene as one fixed, collision-only body"""
+    import genesis as gs
+
+    return scene.add_entity(
+        gs.morphs.Mesh(
+            file=str(build_background(scene_json, collision_lod)),
+            pos=tuple(offset),
+            file_meshes_are_zup=True,
+            fixed=True,
+            collision=True,
+            visualization=False,
+            convexify=False,
+            # Genesis would cut the whole apartment down to decimate_face_num faces;
+            # collision_lod simplifies the stage instead
+            decimate=False,
+        ),
+        **kwargs,
+    )
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(description="Build merged static background collision meshes for ReplicaCAD scenes.")
+    parser.add_argument("--collision-lod", type=int, help="Merge the collision_lod.py stage LOD with this face budget.")
+    parser.add_argument("--no-staging", action="store_true", help="Skip the staging scenes.")
+    return parser.parse_args(args)
+
+
+def main(args):
+    for scene_json in replicad.scene_json_paths(not args.no_staging):
+        path = build_background(scene_json, args.collision_lod)
+        index = json.loads(path.with_suffix(".json").read_text())
+        print(f"{scene_json.name}: stage + {index['static_objects']} static objects, {index['faces']} faces")
+    print(f"Backgrounds in {BACKGROUND_CACHE_DIR}")
+
+
+if __name__ == "__main__":
+    main(parse_args())
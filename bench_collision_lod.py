@@ -0,0 +1,126 @@
+"""
+Benchmark scene.step() throughput and contact accuracy of ReplicaCAD stage
+collision LODs (collision_lod.py) against the full render mesh, on the CPU backend.
+
+    python bench_collision_lod.py --scene apt_0.scene_instance.json --faces 50000 10000 2000
+
+Each level runs in a fresh process with only the stage and sphere probes dropped
+from 1 m above free floor cells (navigable.py), the same cells for every level.
+Throughput is steps/s after a warm-up; accuracy is how far the probes come to
+rest from where they rest on the full-resolution stage, plus how many of them
+fall through the floor.
+"""
+import argparse
+import json
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import navigable
+import replicad
+
+def _numpy(x):
+    return x.cpu().numpy() if hasattr(x, "cpu") else np.asarray(x)
+
+
+PROBE_DROP_HEIGHT = 1.0
+"""probes start this far above the floor, below any ReplicaCAD ceiling"""
+
+
+def probe_starts(scene_json, probes, seed=0) -> np.ndarray:
+    """(probes, 3) drop positions above free floor cells, so probes hit the floor and not the roof"""
+    floor = navigable.load_navigable(scene_json)["positions"]
+    rng = np.random.default_rng(seed)
+    starts = floor[rng.choice(len(floor), size=probes, replace=len(floor) < probes)].astype(np.float64)
+    starts[:, 2] += PROBE_DROP_HEIGHT
+    return starts
+
+
+def run_level(scene_json, face_budget, starts, steps, warmup):
+    """Build stage + probes with the given collision LOD (None = render mesh) and step it"""
+    import genesis as gs
+
+    from collision_lod import collision_lod_path
+
+    gs.init(backend=gs.cpu, logging_level="warning")
+    stage_glb = str(replicad.load_scene_manifest(scene_json)["stage_glb"])
+    collision_glb = stage_glb if face_budget is None else str(collision_lod_path(stage_glb, face_budget))
+
+    scene = gs.Scene(
+        sim_options=gs.options.SimOptions(dt=0.01, substeps=1, gravity=(0, 0, -9.81)),
+        show_viewer=False,
+    )
+    scene.add_entity(
+        gs.morphs.Mesh(
+            file=collision_glb, pos=replicad.STAGE_POS, euler=replicad.STAGE_EULER,
+            fixed=True, collision=True, visualization=False, convexify=False,
+        )
+    )
+    spheres = [scene.add_entity(gs.morphs.Sphere(radius=0.05, pos=tuple(start))) for start in starts]
+    scene.build()
+
+    for _ in range(warmup):
+        scene.step()
+    start = time.perf_counter()
+    for _ in range(steps):
+        scene.step()
+    seconds = time.perf_counter() - start
+    rest = np.array([_numpy(sphere.get_pos()) for sphere in spheres])
+    return dict(
+        faces=face_budget,
+        steps_per_second=steps / seconds,
+        rest_positions=rest.tolist(),
+    )
+
+
+def main(args):
+    ctx = multiprocessing.get_context("spawn")
+    scene_json = replicad.SCENE_DIR / args.scene
+    levels = [None] + sorted(args.faces, reverse=True)
+    starts = probe_starts(scene_json, args.probes)
+    runs = []
+    for face_budget in levels:
+        with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as executor:
+            runs.append(
+                executor.submit(run_level, scene_json, face_budget, starts, args.steps, args.warmup).result()
+            )
+
+    reference = np.array(runs[0]["rest_positions"])
+    floor_z = starts[:, 2] - PROBE_DROP_HEIGHT
+    for run in runs:
+        rest = np.array(run.pop("rest_positions"))
+        error = np.linalg.norm(rest - reference, axis=1)
+        run.update(
+            mean_rest_error=float(error.mean()),
+            max_rest_error=float(error.max()),
+            fell_through=int((rest[:, 2] < floor_z - 0.5).sum()),
+        )
+
+    print(f"{args.scene}: {args.probes} probes, {args.steps} steps on the CPU backend")
+    print(f"{'collision mesh':>16s} {'steps/s':>9s} {'mean err':>9s} {'max err':>9s} {'fell':>5s}")
+    for run in runs:
+        name = "render (full)" if run["faces"] is None else f"lod {run['faces']}"
+        print(
+            f"{name:>16s} {run['steps_per_second']:9.1f} {run['mean_rest_error']:9.4f} "
+            f"{run['max_rest_error']:9.4f} {run['fell_through']:5d}"
+        )
+    if args.json is not None:
+        with open(args.json, "w") as f:
+            json.dump(dict(scene=args.scene, probes=args.probes, steps=args.steps, runs=runs), f, indent=2)
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scene", type=str, default="apt_0.scene_instance.json")
+    parser.add_argument("--faces", type=int, nargs="+", default=[50000, 20000, 10000, 5000, 2000])
+    parser.add_argument("--probes", type=int, default=64)
+    parser.add_argument("--steps", type=int, default=300)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--json", type=str, help="Also write the results to this file.")
+    return parser.parse_args(args)
+
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -0,0 +1,208 @@
+"""
+Benchmark download_assets end to end against a local HTTP stand-in.
+
+Synthetic zips of configurable size and member count are bundled and served by
+asset_bundle's mirror server on 127.0.0.1, registered as data sources with their
+real checksums, and downloaded with download_many at each concurrency level:
+
+    python bench_download.py --archives 16 --members 2000 --member-size 8192 \
+        --jobs 1 4 8 --json bench_download.json
+
+The server and every concurrency level run in their own fresh process, so CPU
+time and peak RSS are those of the downloader alone. Hashing and extraction CPU
+time is measured separately on the same archives. Commit the JSON of a run
+before a change and compare it with one after.
+"""
+import argparse
+import json
+import multiprocessing
+import os.path as osp
+import resource
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from bench_extract import make_zip
+
+BENCH_HOST = "bench.invalid"
+"""Host name of the registered urls; every request goes to the mirror instead"""
+
+
+def serve(bundle_path, port, ready):
+    from asset_bundle import make_bundle_server
+
+    server = make_bundle_server(bundle_path, "127.0.0.1", port)
+    ready.put(server.server_address[1])
+    server.serve_forever()
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def cpu_seconds():
+    """CPU time of this process and its reaped children, e.g. extraction workers"""
+    total = 0.0
+    for who in [resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN]:
+        usage = resource.getrusage(who)
+        total += usage.ru_utime + usage.ru_stime
+    return total
+
+
+def run_downloads(sources, output_dir, jobs, download_kwargs):
+    """Download sources (uid -> dict(url, checksum)) in this process and report usage"""
+    import asset_sources as assrc
+    import download_assets as dl
+
+    for uid, source in sources.items():
+        assrc.DATA_SOURCES[uid] = assrc.DataSource(
+            source_type="bench",
+            target_path=uid,
+            output_dir=output_dir,
+            **source,
+        )
+    start, cpu_start = time.perf_counter(), cpu_seconds()
+    failures = dl.download_many(
+        list(sources), jobs=jobs, verbose=False, output_dir=output_dir, **download_kwargs
+    )
+    return dict(
+        seconds=time.perf_counter() - start,
+        cpu_seconds=cpu_seconds() - cpu_start,
+        peak_rss_mb=peak_rss_mb(),
+        failures={uid: repr(err) for uid, err in failures.items()},
+    )
+
+
+def measure_cpu(archives, work_dir):
+    """CPU seconds spent hashing and extracting the archives, single-threaded"""
+    import download_assets as dl
+
+    start = time.thread_time()
+    for filename in archives:
+        dl.sha256sum(filename)
+    hashing = time.thread_time() - start
+
+    out = osp.join(work_dir, "cpu_out")
+    start = time.thread_time()
+    for filename in archives:
+        dl.extract_zip(filename, out, "target")
+        shutil.rmtree(out)
+    extraction = time.thread_time() - start
+    return hashing, extraction
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=osp.dirname(osp.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(args):
+    from asset_bundle import bundle_archives, mirror_url
+    from asset_manifest import file_sha256
+
+    ctx = multiprocessing.get_context("spawn")
+    work_dir = tempfile.mkdtemp(prefix="bench_download_")
+    server = None
+    try:
+        archives = dict()
+        for i in range(args.archives):
+            filename = osp.join(work_dir, f"archive_{i}.zip")
+            make_zip(filename, args.members, args.member_size)
+            archives[f"http://{BENCH_HOST}/bench/archive_{i}.zip"] = filename
+        bundle_path = osp.join(work_dir, "bench.tar")
+        bundle_archives(archives, bundle_path)
+        total_mb = sum(osp.getsize(f) for f in archives.values()) / 2**20
+
+        ready = ctx.Queue()
+        server = ctx.Process(target=serve, args=(bundle_path, args.port, ready), daemon=True)
+        server.start()
+        mirror = f"http://127.0.0.1:{ready.get(timeout=60)}"
+        sources = {
+            f"bench_{i}": dict(url=mirror_url(url, mirror), checksum=file_sha256(filename))
+            for i, (url, filename) in enumerate(archives.items())
+        }
+
+        hashing, extraction = measure_cpu(list(archives.values()), work_dir)
+        results = dict(
+            revision=git_revision(),
+            archives=args.archives,
+            members=args.members,
+            member_size=args.member_size,
+            total_mb=total_mb,
+            download_kwargs=dict(
+                segments=args.segments,
+                extract_workers=args.extract_workers,
+                stream_extract=args.stream_extract,
+                byte_budget=args.byte_budget << 20 if args.byte_budget else None,
+            ),
+            hash_cpu_seconds=hashing,
+            extract_cpu_seconds=extraction,
+            runs=[],
+        )
+
+        for jobs in args.jobs:
+            best = None
+            for _ in range(args.repeat):
+                output_dir = osp.join(work_dir, "out")
+                if osp.exists(output_dir):
+                    shutil.rmtree(output_dir)
+                with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as executor:
+                    run = executor.submit(
+                        run_downloads, sources, output_dir, jobs, results["download_kwargs"]
+                    ).result()
+                if run["failures"]:
+                    raise RuntimeError(f"Benchmark downloads failed: {run['failures']}")
+                if best is None or run["seconds"] < best["seconds"]:
+                    best = run
+            del best["failures"]
+            best.update(jobs=jobs, mb_per_s=total_mb / best["seconds"])
+            results["runs"].append(best)
+
+        print(
+            f"{args.archives} archives x {args.members} members, {total_mb:.1f} MiB total; "
+            f"hashing {hashing:.2f} s CPU, extraction {extraction:.2f} s CPU"
+        )
+        for run in results["runs"]:
+            print(
+                f"  jobs={run['jobs']:<3d} {run['seconds']:8.3f} s  {run['mb_per_s']:8.1f} MiB/s  "
+                f"cpu {run['cpu_seconds']:7.2f} s  peak rss {run['peak_rss_mb']:7.1f} MiB"
+            )
+        if args.json is not None:
+            with open(args.json, "w") as f:
+                json.dump(results, f, indent=2)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.join()
+        shutil.rmtree(work_dir)
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--archives", type=int, default=8)
+    parser.add_argument("--members", type=int, default=1000)
+    parser.add_argument("--member-size", type=int, default=8192)
+    parser.add_argument("--jobs", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--segments", type=int, default=1)
+    parser.add_argument("--extract-workers", type=int, default=1)
+    parser.add_argument("--stream-extract", action="store_true")
+    parser.add_argument("--byte-budget", type=int, help="In MiB, see download_assets --byte-budget.")
+    parser.add_argument("--port", type=int, default=0, help="Port of the stand-in server, 0 for any free one.")
+    parser.add_argument("--repeat", type=int, default=1, help="Report the best of this many runs.")
+    parser.add_argument("--json", type=str, help="Also write the results to this file.")
+    return parser.parse_args(args)
+
+
+if __name__ == "__main__":
+    main(parse_args())
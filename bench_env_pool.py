@@ -0,0 +1,97 @@
+"""
+Benchmark how GenesisEnvPool (Environment/EnvPool.py) scales with the number of
+worker processes on the CPU backend.
+
+    python bench_env_pool.py --workers 1 2 4 8 --envs-per-worker 64 --steps 200
+
+Every worker owns a GenesisGym with a Franka on a plane and `--envs-per-worker`
+parallel envs; random actions are fed through step_async/step_wait. Reported
+are env-steps/s of the whole pool and the speed-up and parallel efficiency
+relative to the smallest worker count.
+"""
+import argparse
+import functools
+import json
+import os
+import subprocess
+import time
+
+import numpy as np
+
+from Environment.EnvPool import GenesisEnvPool
+
+
+def make_franka_env(n_envs, max_episode_steps):
+    import genesis as gs
+
+    from Environment.GenesisEnv import GenesisGym
+
+    gs.init(backend=gs.cpu, logging_level="warning")
+    env = GenesisGym(
+        n_envs,
+        robot=gs.morphs.MJCF(file="xml/franka_emika_panda/panda.xml"),
+        max_episode_steps=max_episode_steps,
+    )
+    env.add_entity(gs.morphs.Plane())
+    env.build_scene()
+    return env
+
+
+def run(workers, envs_per_worker, steps, warmup, max_episode_steps):
+    start = time.perf_counter()
+    pool = GenesisEnvPool(functools.partial(make_franka_env, envs_per_worker, max_episode_steps), workers)
+    build_seconds = time.perf_counter() - start
+    try:
+        rng = np.random.default_rng(0)
+        low, high = pool.action_space.low, pool.action_space.high
+        actions = [rng.uniform(low, high).astype(np.float32) for _ in range(8)]
+        pool.reset(seed=0)
+        for i in range(warmup):
+            pool.step(actions[i % len(actions)])
+        start = time.perf_counter()
+        for i in range(steps):
+            pool.step_async(actions[i % len(actions)])
+            pool.step_wait()
+        seconds = time.perf_counter() - start
+    finally:
+        pool.close()
+    return dict(
+        workers=workers,
+        envs=pool.num_envs,
+        build_seconds=build_seconds,
+        steps_per_second=steps / seconds,
+        env_steps_per_second=steps * pool.num_envs / seconds,
+    )
+
+
+def main(args):
+    runs = [run(k, args.envs_per_worker, args.steps, args.warmup, args.max_episode_steps) for k in args.workers]
+    base = runs[0]
+    print(f"{args.envs_per_worker} envs per worker, {args.steps} steps, {os.cpu_count()} CPUs")
+    print(f"{'workers':>7s} {'envs':>6s} {'build s':>8s} {'steps/s':>8s} {'env-steps/s':>12s} {'speed-up':>9s} {'efficiency':>10s}")
+    for run_ in runs:
+        speedup = run_["env_steps_per_second"] / base["env_steps_per_second"]
+        run_.update(speedup=speedup, efficiency=speedup * base["workers"] / run_["workers"])
+        print(
+            f"{run_['workers']:7d} {run_['envs']:6d} {run_['build_seconds']:8.1f} {run_['steps_per_second']:8.1f} "
+            f"{run_['env_steps_per_second']:12.0f} {speedup:8.2f}x {run_['efficiency']:10.0%}"
+        )
+    if args.json is not None:
+        revision = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True).stdout.strip()
+        with open(args.json, "w") as f:
+            json.dump(dict(envs_per_worker=args.envs_per_worker, steps=args.steps, revision=revision, runs=runs), f, indent=2)
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--envs-per-worker", type=int, default=64)
+    parser.add_argument("--steps", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--max-episode-steps", type=int, default=100)
+    parser.add_argument("--json", type=str, help="Also write the results to this file.")
+    return parser.parse_args(args)
+
+
+if __name__ == "__main__":
+    main(parse_args())
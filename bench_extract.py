@@ -0,0 +1,100 @@
+"""
+Benchmark zip extraction: the original per-member `zip_ref.extract` loop against
+download_assets.extract_zip (sequential and process pool) and stream_extract_zip.
+
+    python bench_extract.py --members 20000 --member-size 4096 --workers 1 4 8
+
+Every path also hashes members for the manifest except the original loop.
+"""
+import argparse
+import json
+import os
+import os.path as osp
+import shutil
+import tempfile
+import time
+import zipfile
+
+import download_assets as dl
+
+
+def make_zip(filename, members, member_size, compression=zipfile.ZIP_DEFLATED):
+    """A ReplicaCAD-like archive: one top-level dir with many small, half-compressible files"""
+    with zipfile.ZipFile(filename, "w", compression=compression) as zip_ref:
+        for i in range(members):
+            data = os.urandom(member_size // 2) + bytes(member_size - member_size // 2)
+            zip_ref.writestr(f"dataset/objects/{i % 100:03d}/mesh_{i}.bin", data)
+
+
+def extract_original(zip_filename, output_dir):
+    with zipfile.ZipFile(zip_filename, "r") as zip_ref:
+        for file in zip_ref.infolist():
+            zip_ref.extract(file, output_dir)
+
+
+def timed(fn, output_dir, repeat=1):
+    """Best wall time of `repeat` runs, each into an empty output_dir"""
+    best = float("inf")
+    for _ in range(repeat):
+        if osp.exists(output_dir):
+            shutil.rmtree(output_dir)
+        os.makedirs(output_dir)
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(args):
+    work_dir = tempfile.mkdtemp(prefix="bench_extract_")
+    zip_filename = osp.join(work_dir, "archive.zip")
+    out = osp.join(work_dir, "out")
+    try:
+        make_zip(zip_filename, args.members, args.member_size)
+        archive_mb = osp.getsize(zip_filename) / 2**20
+        results = dict(
+            members=args.members,
+            member_size=args.member_size,
+            archive_mb=archive_mb,
+            seconds=dict(),
+        )
+
+        results["seconds"]["original"] = timed(
+            lambda: extract_original(zip_filename, out), out, args.repeat
+        )
+        for workers in args.workers:
+            results["seconds"][f"extract_zip[{workers}]"] = timed(
+                lambda: dl.extract_zip(zip_filename, out, "target", workers=workers),
+                out,
+                args.repeat,
+            )
+
+        def stream():
+            with open(zip_filename, "rb") as f:
+                dl.stream_extract_zip(f, out)
+
+        results["seconds"]["stream_extract_zip"] = timed(stream, out, args.repeat)
+
+        print(f"{args.members} members, {archive_mb:.1f} MiB archive")
+        baseline = results["seconds"]["original"]
+        for name, seconds in results["seconds"].items():
+            print(f"{name:>24s}: {seconds:8.3f} s  ({baseline / seconds:5.2f}x)")
+        if args.json is not None:
+            with open(args.json, "w") as f:
+                json.dump(results, f, indent=2)
+    finally:
+        shutil.rmtree(work_dir)
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--members", type=int, default=20000)
+    parser.add_argument("--member-size", type=int, default=4096)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--repeat", type=int, default=3, help="Report the best of this many runs.")
+    parser.add_argument("--json", type=str, help="Also write the timings to this file.")
+    return parser.parse_args(args)
+
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -0,0 +1,81 @@
+"""
+Benchmark what a heterogeneous GenesisReplicaCADScene build costs per env as the
+number of unique scene configs in it grows, on the CPU backend.
+
+    python bench_hetero_scene.py --configs 1 2 4 --envs 8 --steps 200
+
+Each build assigns the first `configs` scene configs round-robin to `--envs`
+envs, in a fresh process, and reports build time, the size of the rigid system
+every env simulates (entities, DOFs, geoms) and env-steps/s after a warm-up.
+"""
+import argparse
+import json
+import multiprocessing
+import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+
+def run_configs(n_configs, n_envs, steps, warmup):
+    import genesis as gs
+
+    from scene.ReplicaCADScene import GenesisReplicaCADScene
+
+    gs.init(backend=gs.cpu, logging_level="warning")
+    world = GenesisReplicaCADScene(num_envs=n_envs, show_viewer=False)
+    start = time.perf_counter()
+    world.build([env % n_configs for env in range(n_envs)])
+    build_seconds = time.perf_counter() - start
+
+    scene = world.scene
+    for _ in range(warmup):
+        scene.step()
+    start = time.perf_counter()
+    for _ in range(steps):
+        scene.step()
+    seconds = time.perf_counter() - start
+    solver = scene.rigid_solver
+    return dict(
+        configs=n_configs,
+        envs=n_envs,
+        build_seconds=build_seconds,
+        entities=len(solver.entities),
+        dofs=solver.n_dofs,
+        geoms=solver.n_geoms,
+        env_steps_per_second=steps * n_envs / seconds,
+    )
+
+
+def main(args):
+    ctx = multiprocessing.get_context("spawn")
+    runs = []
+    for n_configs in args.configs:
+        with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as executor:
+            runs.append(executor.submit(run_configs, n_configs, args.envs, args.steps, args.warmup).result())
+
+    base = runs[0]
+    print(f"{args.envs} envs, {args.steps} steps on the CPU backend")
+    print(f"{'configs':>7s} {'build s':>8s} {'entities':>8s} {'dofs':>6s} {'geoms':>6s} {'env-steps/s':>12s} {'vs 1st':>7s}")
+    for run in runs:
+        print(
+            f"{run['configs']:7d} {run['build_seconds']:8.1f} {run['entities']:8d} {run['dofs']:6d} {run['geoms']:6d} "
+            f"{run['env_steps_per_second']:12.1f} {run['env_steps_per_second'] / base['env_steps_per_second']:6.2f}x"
+        )
+    if args.json is not None:
+        revision = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True).stdout.strip()
+        with open(args.json, "w") as f:
+            json.dump(dict(envs=args.envs, steps=args.steps, revision=revision, runs=runs), f, indent=2)
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--configs", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--envs", type=int, default=8)
+    parser.add_argument("--steps", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--json", type=str, help="Also write the results to this file.")
+    return parser.parse_args(args)
+
+
+if __name__ == "__main__":
+    main(parse_args())
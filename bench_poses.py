@@ -0,0 +1,106 @@
+"""
+Benchmark Habitat → Genesis pose conversion over every ReplicaCAD scene listed in
+scene/metadata/scene_metadata.json: the original per-instance SciPy conversion
+against replicad.hab2gen_pos_batch / hab2gen_quat_batch (one call per scene).
+
+    REPLICACAD_DATA_ROOT=/path/to/replica_cad_dataset python bench_poses.py --repeat 5
+
+The scene JSONs are parsed once up front so only the conversion is timed.
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+from scipy.spatial.transform import Rotation as R
+
+import replicad
+
+
+def per_instance_pose(translation, rotation):
+    """The conversion load_replicacad used to run for every object instance"""
+    x, y, z = translation
+    pos = (x, -z, y + replicad.HEIGHT_OFFSET)
+    w, qx, qy, qz = rotation
+    m_gen = replicad._AX_SWAP @ R.from_quat([qx, qy, qz, w]).as_matrix()
+    xg, yg, zg, wg = R.from_matrix(m_gen).as_quat()
+    return pos, (wg, xg, yg, zg)
+
+
+def convert_per_instance(scenes):
+    for instances in scenes:
+        for inst in instances:
+            per_instance_pose(inst["translation"], inst["rotation"])
+
+
+def convert_batched(scenes):
+    for instances in scenes:
+        replicad.hab2gen_pos_batch([inst["translation"] for inst in instances])
+        replicad.hab2gen_quat_batch([inst["rotation"] for inst in instances])
+
+
+def timed(fn, scenes, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(scenes)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def check(scenes):
+    """Largest deviation between both paths, as position error and 1 - |<q1, q2>|"""
+    pos_err, quat_err = 0.0, 0.0
+    for instances in scenes:
+        pos = replicad.hab2gen_pos_batch([inst["translation"] for inst in instances])
+        quat = replicad.hab2gen_quat_batch([inst["rotation"] for inst in instances])
+        for i, inst in enumerate(instances):
+            p, q = per_instance_pose(inst["translation"], inst["rotation"])
+            pos_err = max(pos_err, float(np.abs(pos[i] - p).max()))
+            quat_err = max(quat_err, 1.0 - abs(float(np.dot(quat[i], q))))
+    return pos_err, quat_err
+
+
+def main(args):
+    scenes = []
+    for scene_json in replicad.scene_json_paths(not args.no_staging):
+        inst = json.loads(scene_json.read_text())
+        scenes.append(
+            inst.get("object_instances", []) + inst.get("articulated_object_instances", [])
+        )
+    num_instances = sum(len(instances) for instances in scenes)
+
+    pos_err, quat_err = check(scenes)
+    results = dict(
+        scenes=len(scenes),
+        instances=num_instances,
+        max_pos_error=pos_err,
+        max_quat_error=quat_err,
+        seconds=dict(
+            per_instance=timed(convert_per_instance, scenes, args.repeat),
+            batched=timed(convert_batched, scenes, args.repeat),
+        ),
+    )
+
+    print(f"{len(scenes)} scenes, {num_instances} instances (max error pos {pos_err:.1e}, quat {quat_err:.1e})")
+    baseline = results["seconds"]["per_instance"]
+    for name, seconds in results["seconds"].items():
+        print(
+            f"{name:>14s}: {seconds * 1e3:9.2f} ms  "
+            f"{seconds / num_instances * 1e6:7.2f} us/instance  ({baseline / seconds:6.1f}x)"
+        )
+    if args.json is not None:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--no-staging", action="store_true", help="Only the 6 apartment scenes.")
+    parser.add_argument("--repeat", type=int, default=5, help="Report the best of this many runs.")
+    parser.add_argument("--json", type=str, help="Also write the timings to this file.")
+    return parser.parse_args(args)
+
+
+if __name__ == "__main__":
+    main(parse_args())
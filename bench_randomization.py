@@ -0,0 +1,89 @@
+"""
+Benchmark DomainRandomizer (Environment/Randomization.py): the time to resample
+and apply the randomization of all envs at reset, as the number of envs grows.
+
+    python bench_randomization.py --envs 1 64 1024 4096 --resets 50
+
+Each env count builds a Franka on a plane plus a randomized cube in a fresh
+process and times randomizer.apply over all envs.
+"""
+import argparse
+import json
+import multiprocessing
+import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+CONFIG = dict(
+    kp=(4500, 4500, 3500, 3500, 2000, 2000, 2000, 100, 100),
+    kv=(450, 450, 350, 350, 200, 200, 200, 10, 10),
+    force_limit=(87, 87, 87, 87, 12, 12, 12, 100, 100),
+    kp_scale=(0.8, 1.2),
+    kv_scale=(0.8, 1.2),
+    force_scale=(0.9, 1.1),
+    friction=(0.5, 1.5),
+    mass_shift=(-0.1, 0.1),
+    object_pos_noise=(0.05, 0.05, 0.0),
+    object_yaw_noise=3.14159,
+)
+
+
+def run_envs(n_envs, resets, backend):
+    import genesis as gs
+    import torch
+
+    from Config import RandomizationConfig
+    from Environment.GenesisEnv import GenesisGym
+
+    gs.init(backend=getattr(gs, backend), logging_level="warning")
+    env = GenesisGym(
+        n_envs,
+        robot=gs.morphs.MJCF(file="xml/franka_emika_panda/panda.xml"),
+        randomization=RandomizationConfig(**CONFIG),
+    )
+    env.add_entity(gs.morphs.Plane())
+    env.add_entity(gs.morphs.Box(size=(0.04, 0.04, 0.04), pos=(0.65, 0.0, 0.02)), randomize_pose=True)
+    env.build_scene()
+
+    def sync():
+        if torch.cuda.is_available() and gs.device.type == "cuda":
+            torch.cuda.synchronize()
+
+    env.randomizer.apply(env.all_envs)
+    sync()
+    start = time.perf_counter()
+    for _ in range(resets):
+        env.randomizer.apply(env.all_envs)
+    sync()
+    seconds = (time.perf_counter() - start) / resets
+    return dict(envs=n_envs, params=env.randomizer.params.shape[1], ms_per_reset=1e3 * seconds)
+
+
+def main(args):
+    ctx = multiprocessing.get_context("spawn")
+    runs = []
+    for n_envs in args.envs:
+        with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as executor:
+            runs.append(executor.submit(run_envs, n_envs, args.resets, args.backend).result())
+
+    print(f"{runs[0]['params']} randomized parameters per env, {args.backend} backend")
+    print(f"{'envs':>6s} {'ms/reset':>9s} {'vs 1st':>7s}")
+    for run in runs:
+        print(f"{run['envs']:6d} {run['ms_per_reset']:9.3f} {run['ms_per_reset'] / runs[0]['ms_per_reset']:6.2f}x")
+    if args.json is not None:
+        revision = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True).stdout.strip()
+        with open(args.json, "w") as f:
+            json.dump(dict(backend=args.backend, resets=args.resets, revision=revision, runs=runs), f, indent=2)
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--envs", type=int, nargs="+", default=[1, 64, 1024, 4096])
+    parser.add_argument("--resets", type=int, default=50)
+    parser.add_argument("--backend", choices=["cpu", "gpu"], default="gpu")
+    parser.add_argument("--json", type=str, help="Also write the results to this file.")
+    return parser.parse_args(args)
+
+
+if __name__ == "__main__":
+    main(parse_args())
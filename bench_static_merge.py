@@ -0,0 +1,87 @@
+"""
+Benchmark load_replicacad with static objects as free bodies (the old behaviour),
+as individually fixed bodies, and merged into the background collision body
+(background.py), on the CPU backend.
+
+    python bench_static_merge.py --scene apt_0.scene_instance.json --steps 300
+
+Each mode builds the scene in a fresh process and reports build time, the size
+of the rigid system (entities, DOFs, collision geoms) and steps/s after a warm-up.
+A throwaway build first fills Genesis' kernel cache, so the first mode's build
+time does not include kernel compilation.
+"""
+import argparse
+import json
+import multiprocessing
+import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import replicad
+
+MODES = ["free", "fixed", "merged"]
+
+
+def run_mode(scene_json, mode, steps, warmup):
+    from test_replicad import load_replicacad
+
+    start = time.perf_counter()
+    scene = load_replicacad(scene_json, backend="cpu", show_viewer=False, static_objects=mode)
+    build_seconds = time.perf_counter() - start
+
+    for _ in range(warmup):
+        scene.step()
+    start = time.perf_counter()
+    for _ in range(steps):
+        scene.step()
+    seconds = time.perf_counter() - start
+    solver = scene.rigid_solver
+    return dict(
+        mode=mode,
+        build_seconds=build_seconds,
+        entities=len(solver.entities),
+        dofs=solver.n_dofs,
+        geoms=solver.n_geoms,
+        steps_per_second=steps / seconds,
+    )
+
+
+def main(args):
+    ctx = multiprocessing.get_context("spawn")
+    scene_json = replicad.SCENE_DIR / args.scene
+    manifest = replicad.load_scene_manifest(scene_json)
+    n_static = int(replicad.static_mask(manifest).sum())
+    if not args.no_compile_warmup:
+        with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as executor:
+            executor.submit(run_mode, scene_json, args.modes[0], 1, 0).result()
+    runs = []
+    for mode in args.modes:
+        with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as executor:
+            runs.append(executor.submit(run_mode, scene_json, mode, args.steps, args.warmup).result())
+
+    print(f"{args.scene}: {len(manifest['obj_template'])} objects ({n_static} static), {args.steps} steps on the CPU backend")
+    print(f"{'static objects':>14s} {'build s':>8s} {'entities':>8s} {'dofs':>6s} {'geoms':>6s} {'steps/s':>9s}")
+    for run in runs:
+        print(
+            f"{run['mode']:>14s} {run['build_seconds']:8.1f} {run['entities']:8d} {run['dofs']:6d} "
+            f"{run['geoms']:6d} {run['steps_per_second']:9.1f}"
+        )
+    if args.json is not None:
+        revision = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True).stdout.strip()
+        with open(args.json, "w") as f:
+            json.dump(dict(scene=args.scene, steps=args.steps, revision=revision, runs=runs), f, indent=2)
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scene", type=str, default="apt_0.scene_instance.json")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    parser.add_argument("--steps", type=int, default=300)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--no-compile-warmup", action="store_true", help="Skip the kernel-cache warm-up build.")
+    parser.add_argument("--json", type=str, help="Also write the results to this file.")
+    return parser.parse_args(args)
+
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -0,0 +1,239 @@
+"""
+coacd_cache.py
+--------------
+Persistent cache of CoACD convex decompositions for ReplicaCAD objects.
+
+Objects without a `collision_asset` used to be handed to Genesis with
+`coacd_options`, which re-runs the decomposition on every build. Here a
+decomposition is keyed by the SHA-256 of the mesh file plus the CoACD options,
+stored once as a compact .npz of hull vertices/faces under
+CACHE_DIR/coacd/<key[:2]>/<key>/, and turned into a URDF whose visual is the
+original render mesh and whose collision geometry is the cached hulls. Loading
+that URDF involves no decomposition at all.
+
+Pre-warm the cache for every template in scene/metadata/scene_metadata.json:
+
+    python coacd_cache.py -j 8
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import pathlib
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from xml.sax.saxutils import quoteattr
+
+import numpy as np
+from tqdm.auto import tqdm
+
+import replicad
+from asset_manifest import file_sha256
+
+COACD_CACHE_DIR = replicad.CACHE_DIR / "coacd"
+CACHE_VERSION = 1
+
+COACD_DEFAULTS = dict(
+    threshold=0.1,
+    max_convex_hull=-1,
+    preprocess_mode="auto",
+    preprocess_resolution=30,
+    resolution=1000,
+    mcts_nodes=20,
+    mcts_iterations=100,
+    mcts_max_depth=3,
+    pca=False,
+    merge=True,
+    decimate=False,
+    max_ch_vertex=256,
+    extrude=False,
+    extrude_margin=0.1,
+    apx_mode="ch",
+    seed=0,
+)
+"""
+gs.options.CoacdOptions() defaults of Genesis 0.3.14. Cache keys always use
+these, whether or not Genesis is importable, so a prewarm without Genesis fills
+the entries load_replicacad looks up; tests/test_coacd_cache.py checks they
+still match the installed Genesis.
+"""
+
+REPLICACAD_COACD_OPTIONS = dict(decimate=True, pca=True)
+"""what load_replicacad decomposes objects without a collision_asset with"""
+
+
+def _options_dict(options) -> dict:
+    if hasattr(options, "model_dump"):
+        return options.model_dump()
+    return dict(options) if isinstance(options, dict) else vars(options)
+
+
+def resolve_options(options=None) -> dict:
+    """Full CoACD options from a dict of overrides or a gs.options.CoacdOptions"""
+    options = {} if options is None else _options_dict(options)
+    defaults = COACD_DEFAULTS
+    unknown = set(options) - set(defaults)
+    if unknown:
+        raise ValueError(f"Unknown CoACD options: {sorted(unknown)}")
+    return {**defaults, **options}
+
+
+def decomposition_key(mesh_path, options=None) -> str:
+    options = resolve_options(options)
+    data = json.dumps(dict(mesh=file_sha256(mesh_path), options=options, version=CACHE_VERSION), sort_keys=True)
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+def entry_dir(key: str) -> pathlib.Path:
+    return COACD_CACHE_DIR / key[:2] / key
+
+
+def run_coacd(mesh_path, options=None) -> list[tuple[np.ndarray, np.ndarray]]:
+    """Decompose a mesh file into convex hulls, [(vertices (V, 3), faces (F, 3)), ...]"""
+    try:
+        import coacd
+    except ImportError as err:
+        raise ImportError("Convex decomposition needs CoACD: pip install coacd") from err
+    import trimesh
+
+    mesh = trimesh.load(mesh_path, force="mesh")
+    coacd.set_log_level("error")
+    result = coacd.run_coacd(coacd.Mesh(mesh.vertices, mesh.faces), **resolve_options(options))
+    return [(np.asarray(v, dtype=np.float32), np.asarray(f, dtype=np.int32)) for v, f in result]
+
+
+def save_hulls(path: pathlib.Path, hulls):
+    """All hulls in one .npz: concatenated vertices/faces plus per-hull offsets"""
+    if not hulls:
+        raise ValueError(f"Refusing to cache an empty decomposition at {path}")
+    vert_counts = [len(v) for v, _ in hulls]
+    face_counts = [len(f) for _, f in hulls]
+    tmp = path.with_name(f".{path.stem}.{os.getpid()}.npz")
+    np.savez_compressed(
+        tmp,
+        vertices=np.concatenate([v for v, _ in hulls]).astype(np.float32),
+        faces=np.concatenate([f for _, f in hulls]).astype(np.int32),
+        vert_offsets=np.cumsum([0] + vert_counts),
+        face_offsets=np.cumsum([0] + face_counts),
+    )
+    os.replace(tmp, path)
+
+
+def load_hulls(path: pathlib.Path) -> list[tuple[np.ndarray, np.ndarray]]:
+    with np.load(path) as f:
+        vertices, faces = f["vertices"], f["faces"]
+        vert_offsets, face_offsets = f["vert_offsets"], f["face_offsets"]
+    return [
+        (vertices[vert_offsets[i]:vert_offsets[i + 1]], faces[face_offsets[i]:face_offsets[i + 1]])
+        for i in range(len(vert_offsets) - 1)
+    ]
+
+
+def get_hulls(mesh_path, options=None) -> tuple[str, list[tuple[np.ndarray, np.ndarray]]]:
+    """(key, hulls) of mesh_path, decomposing it only on a cache miss"""
+    key = decomposition_key(mesh_path, options)
+    path = entry_dir(key) / "hulls.npz"
+    if path.exists():
+        return key, load_hulls(path)
+    hulls = run_coacd(mesh_path, options)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    save_hulls(path, hulls)
+    return key, hulls
+
+
+def collision_urdf(mesh_path, options=None) -> pathlib.Path:
+    """
+    A URDF with mesh_path as its visual and the cached convex hulls as its collision
+    geometry, built from the cache (decomposing on a miss). The hulls are written as
+    GLBs, like the render meshes, so Genesis applies the same axis convention to both.
+    """
+    import trimesh
+
+    mesh_path = pathlib.Path(mesh_path).resolve()
+    key, hulls = get_hulls(mesh_path, options)
+    directory = entry_dir(key)
+    urdf = directory / f"{mesh_path.stem}.urdf"
+    if urdf.exists():
+        return urdf
+
+    staging = pathlib.Path(tempfile.mkdtemp(dir=directory))
+    try:
+        collisions = []
+        for i, (vertices, faces) in enumerate(hulls):
+            trimesh.Trimesh(vertices, faces, process=False).export(staging / f"hull_{i:03d}.glb")
+            collisions.append(
+                f'    <collision><geometry><mesh filename="hull_{i:03d}.glb"/></geometry></collision>'
+            )
+        name = quoteattr(mesh_path.stem)
+        (staging / urdf.name).write_text("\n".join([
+            f"<robot name={name}>",
+            f"  <link name={name}>",
+            f'    <visual><geometry><mesh filename={quoteattr(str(mesh_path))}/></geometry></visual>',
+            *collisions,
+            "  </link>",
+            "</robot>",
+            "",
+        ]))
+        for path in staging.iterdir():
+            os.replace(path, directory / path.name)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+    return urdf
+
+
+def _warm(mesh_path, options):
+    """Worker for prewarm: returns whether the entry had to be computed"""
+    key = decomposition_key(mesh_path, options)
+    hit = (entry_dir(key) / "hulls.npz").exists()
+    collision_urdf(mesh_path, options)
+    return not hit
+
+
+def decomposed_render_assets(scene_jsons) -> list[pathlib.Path]:
+    """Render meshes of all objects without a collision_asset in the given scenes"""
+    assets = set()
+    for scene_json in scene_jsons:
+        manifest = replicad.load_scene_manifest(scene_json)
+        for render, collision in zip(manifest["obj_render_asset"], manifest["obj_collision_asset"]):
+            if not collision:
+                assets.add(pathlib.Path(str(render)))
+    return sorted(assets)
+
+
+def prewarm(mesh_paths, options=None, jobs=os.cpu_count(), verbose=True) -> dict:
+    """Decompose every mesh not yet in the cache with a process pool; returns counts"""
+    options = resolve_options(options)
+    counts = dict(computed=0, cached=0, failed=0)
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = {executor.submit(_warm, str(path), options): path for path in mesh_paths}
+        for future in tqdm(as_completed(futures), total=len(futures), disable=not verbose):
+            try:
+                counts["computed" if future.result() else "cached"] += 1
+            except Exception as err:
+                counts["failed"] += 1
+                print(f"Failed to decompose {futures[future]}: {err!r}")
+    return counts
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(description="Pre-warm the CoACD decomposition cache for ReplicaCAD.")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count())
+    parser.add_argument("--no-staging", action="store_true", help="Skip the staging scenes.")
+    return parser.parse_args(args)
+
+
+def main(args):
+    assets = decomposed_render_assets(replicad.scene_json_paths(not args.no_staging))
+    counts = prewarm(assets, REPLICACAD_COACD_OPTIONS, jobs=args.jobs)
+    print(f"{len(assets)} templates: {counts['computed']} decomposed, {counts['cached']} cached, {counts['failed']} failed")
+    print(f"Cache: {COACD_CACHE_DIR}")
+    if counts["failed"]:
+        exit(1)
+
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -0,0 +1,137 @@
+"""
+collision_lod.py
+----------------
+Simplified collision meshes (LODs) for ReplicaCAD stages.
+
+The stage GLB is loaded at full render resolution as its own collision mesh.
+This builds quadric-decimated copies at several face budgets per stage and caches
+them next to the dataset under CACHE_DIR/collision_lod/<stage>/, together with a
+lods.json that records the source file so stale LODs are rebuilt. load_replicacad
+can then pick a collision LOD independently of the visual mesh.
+
+    python collision_lod.py --faces 50000 20000 5000 2000 -j 4
+    python collision_lod.py --from-repaired     # decimate the mesh_repair.py output instead
+
+Decimation uses trimesh's simplify_quadric_decimation (pip install fast_simplification).
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import pathlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import replicad
+
+LOD_CACHE_DIR = replicad.CACHE_DIR / "collision_lod"
+DEFAULT_FACE_BUDGETS = [50000, 20000, 10000, 5000, 2000]
+
+
+def stage_lod_dir(stage_glb) -> pathlib.Path:
+    return LOD_CACHE_DIR / pathlib.Path(stage_glb).stem
+
+
+def _read_index(stage_glb) -> dict | None:
+    path = stage_lod_dir(stage_glb) / "lods.json"
+    if not path.exists():
+        return None
+    index = json.loads(path.read_text())
+    if index["source"]["path"] != str(stage_glb) or replicad.sources_changed([index["source"]]):
+        return None
+    return index
+
+
+def _write_index(stage_glb, index: dict):
+    path = stage_lod_dir(stage_glb) / "lods.json"
+    tmp = path.with_name(f".lods.{os.getpid()}.json")
+    tmp.write_text(json.dumps(index, indent=2))
+    os.replace(tmp, path)
+
+
+def _source_mesh(stage_glb, from_repaired: bool):
+    import trimesh
+
+    if from_repaired:
+        import mesh_repair
+
+        entry = mesh_repair.repair(stage_glb)
+        return trimesh.load(entry["output"], force="mesh")
+    return trimesh.load(stage_glb, force="mesh")
+
+
+def build_lods(stage_glb, face_budgets=DEFAULT_FACE_BUDGETS, from_repaired=False) -> dict:
+    """
+    Build the missing LODs of one stage and return its index:
+    {"source": record of stage_glb, "full_faces": N, "lods": {"<budget>": {"file", "faces"}}}
+    A budget at or above the source face count just stores the (joined) source mesh.
+    """
+    stage_glb = pathlib.Path(stage_glb)
+    index = _read_index(stage_glb)
+    if index is None or index.get("from_repaired", False) != from_repaired:
+        index = dict(source=replicad.file_record(stage_glb), from_repaired=from_repaired, lods={})
+    missing = [b for b in face_budgets if str(b) not in index["lods"]]
+    if not missing:
+        return index
+
+    mesh = _source_mesh(stage_glb, from_repaired)
+    index["full_faces"] = len(mesh.faces)
+    directory = stage_lod_dir(stage_glb)
+    directory.mkdir(parents=True, exist_ok=True)
+    for budget in missing:
+        lod = mesh if budget >= len(mesh.faces) else mesh.simplify_quadric_decimation(face_count=budget)
+        path = directory / f"{stage_glb.stem}.lod{budget}.glb"
+        tmp = path.with_name(f".{path.stem}.{os.getpid()}.glb")
+        lod.export(tmp, file_type="glb")
+        os.replace(tmp, path)
+        index["lods"][str(budget)] = dict(file=path.name, faces=len(lod.faces))
+    _write_index(stage_glb, index)
+    return index
+
+
+def collision_lod_path(stage_glb, face_budget: int, build=True, from_repaired=False) -> pathlib.Path:
+    """The collision mesh of stage_glb at face_budget, building it if needed (and allowed)"""
+    index = _read_index(stage_glb)
+    if index is None or index.get("from_repaired", False) != from_repaired or str(face_budget) not in index["lods"]:
+        if not build:
+            raise FileNotFoundError(f"No collision LOD {face_budget} for {stage_glb}; run collision_lod.py")
+        index = build_lods(stage_glb, [face_budget], from_repaired)
+    return stage_lod_dir(stage_glb) / index["lods"][str(face_budget)]["file"]
+
+
+def scene_stage_glbs(scene_jsons) -> list[pathlib.Path]:
+    return sorted({pathlib.Path(str(replicad.load_scene_manifest(s)["stage_glb"])) for s in scene_jsons})
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(description="Build collision LODs for ReplicaCAD stages.")
+    parser.add_argument("stages", nargs="*", help="Stage GLBs; defaults to the stages of all scenes in scene_metadata.json.")
+    parser.add_argument("--faces", type=int, nargs="+", default=DEFAULT_FACE_BUDGETS, help="Face budgets to build.")
+    parser.add_argument("--from-repaired", action="store_true", help="Decimate the mesh_repair.py output of each stage.")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count())
+    return parser.parse_args(args)
+
+
+def main(args):
+    stages = [pathlib.Path(s) for s in args.stages] or scene_stage_glbs(replicad.scene_json_paths())
+    failed = 0
+    with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+        futures = {executor.submit(build_lods, stage, args.faces, args.from_repaired): stage for stage in stages}
+        for future in as_completed(futures):
+            stage = futures[future]
+            try:
+                index = future.result()
+            except Exception as err:
+                failed += 1
+                print(f"{stage.name}: FAILED {err!r}")
+                continue
+            faces = ", ".join(f"{b}→{index['lods'][str(b)]['faces']}" for b in args.faces)
+            print(f"{stage.name} ({index.get('full_faces', '?')} faces): {faces}")
+    print(f"LODs in {LOD_CACHE_DIR}")
+    if failed:
+        exit(1)
+
+
+if __name__ == "__main__":
+    main(parse_args())
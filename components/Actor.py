@@ -1,6 +1,47 @@
+from typing import Optional, Sequence
+
+import numpy as np
+
+
+def _numpy(x) -> np.ndarray:
+    return x.cpu().numpy() if hasattr(x, "cpu") else np.asarray(x)
+
 
 class Actor:
-    def __init__(self):
-        pass
-    
-    
\ No newline at end of file
+    """
+    A Genesis rigid entity that belongs to a subset of the parallel envs.
+
+    In a heterogeneous build every env holds the entities of every loaded scene
+    config, each config in its own spatial slot: `env_idx` are the envs that use
+    this entity and `offset` is the origin of its slot. Poses are read and written
+    relative to the slot, so callers see ordinary scene coordinates.
+    """
+
+    def __init__(self, name: str, entity, env_idx: Sequence[int], offset=(0.0, 0.0, 0.0), template: Optional[str] = None):
+        self.name = name
+        self.entity = entity
+        self.env_idx = np.asarray(env_idx, dtype=np.int64)
+        self.offset = np.asarray(offset, dtype=np.float64)
+        self.template = template
+
+    def _envs(self, envs_idx):
+        return self.env_idx if envs_idx is None else np.asarray(envs_idx, dtype=np.int64)
+
+    def get_pos(self, envs_idx=None) -> np.ndarray:
+        """(len(envs_idx), 3) positions in the slot frame, for this actor's envs by default"""
+        return _numpy(self.entity.get_pos(envs_idx=self._envs(envs_idx))) - self.offset
+
+    def get_quat(self, envs_idx=None) -> np.ndarray:
+        return _numpy(self.entity.get_quat(envs_idx=self._envs(envs_idx)))
+
+    def set_pos(self, pos, envs_idx=None):
+        envs_idx = self._envs(envs_idx)
+        pos = np.broadcast_to(np.asarray(pos, dtype=np.float64) + self.offset, (len(envs_idx), 3))
+        self.entity.set_pos(pos, envs_idx=envs_idx)
+
+    def set_quat(self, quat, envs_idx=None):
+        envs_idx = self._envs(envs_idx)
+        self.entity.set_quat(np.broadcast_to(np.asarray(quat, dtype=np.float64), (len(envs_idx), 4)), envs_idx=envs_idx)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.name!r}, envs={self.env_idx.tolist()})"
@@ -1,5 +1,16 @@
+import numpy as np
 
+from components.Actor import Actor, _numpy
 
-class Articulation():
-    def __init__(self):
-        pass
\ No newline at end of file
+
+class Articulation(Actor):
+    """An articulated (URDF) entity; an Actor with joint positions"""
+
+    def get_qpos(self, envs_idx=None) -> np.ndarray:
+        """(len(envs_idx), n_dofs) joint positions"""
+        return _numpy(self.entity.get_dofs_position(envs_idx=self._envs(envs_idx)))
+
+    def set_qpos(self, qpos, envs_idx=None):
+        envs_idx = self._envs(envs_idx)
+        qpos = np.broadcast_to(np.asarray(qpos, dtype=np.float64), (len(envs_idx), self.entity.n_dofs))
+        self.entity.set_dofs_position(qpos, envs_idx=envs_idx)
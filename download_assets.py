@@ -1,17 +1,33 @@
 import argparse
+import dataclasses
 import hashlib
+import heapq
+import json
+import mmap
 import os
 import os.path as osp
 import shutil
+import struct
+import threading
 import urllib.request
 import zipfile
+import zlib
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    as_completed,
+    wait,
+)
 from pathlib import Path
-from urllib.error import URLError
+from urllib.error import HTTPError, URLError
 
 from huggingface_hub import snapshot_download
 from tqdm.auto import tqdm
 
 import asset_sources as assrc
+from asset_manifest import verify_manifest, walk_files, write_manifest
+from asset_store import AssetStore, shared_base_dir
 
 
 def prompt_yes_no(message):
@@ -32,23 +48,543 @@ def prompt_yes_no(message):
             print("Invalid answer...")
 
 
-def sha256sum(filename, chunk_size=4096):
+CHUNK_SIZE = 1 << 20
+"""read size used when streaming downloads and hashing files"""
+
+
+def update_hash_from_file(sha256_hash, filename, chunk_size=CHUNK_SIZE, use_mmap=False):
+    """Feeds the contents of a file into an existing hashlib object.
+
+    Reads go into a single reused buffer, or through mmap when use_mmap is set,
+    so large archives are hashed without per-chunk allocations.
+    """
+    with open(filename, "rb") as f:
+        if use_mmap and os.fstat(f.fileno()).st_size > 0:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                for offset in range(0, len(mm), chunk_size):
+                    sha256_hash.update(mm[offset : offset + chunk_size])
+        else:
+            buf = bytearray(chunk_size)
+            view = memoryview(buf)
+            while True:
+                n = f.readinto(buf)
+                if not n:
+                    break
+                sha256_hash.update(view[:n])
+    return sha256_hash
+
+
+def sha256sum(filename, chunk_size=CHUNK_SIZE, use_mmap=False):
     """Computes the SHA256 checksum of a file.
 
     See also:
         https://www.quickprogrammingtips.com/python/how-to-calculate-sha256-hash-of-a-file-in-python.html
     """
     sha256_hash = hashlib.sha256()
-    with open(filename, "rb") as f:
-        for byte_block in iter(lambda: f.read(chunk_size), b""):
-            sha256_hash.update(byte_block)
+    update_hash_from_file(sha256_hash, filename, chunk_size, use_mmap)
+    return sha256_hash.hexdigest()
+
+
+def probe_url(url):
+    """Issue a HEAD request and return (size in bytes or None, whether ranges are supported)"""
+    request = urllib.request.Request(url, method="HEAD")
+    with urllib.request.urlopen(request) as response:
+        size = response.headers.get("Content-Length")
+        accepts_ranges = response.headers.get("Accept-Ranges", "").lower() == "bytes"
+    return (int(size) if size is not None else None), accepts_ranges
+
+
+SEGMENT_MIN_SIZE = 64 << 20
+"""files are only split into parallel ranges if every segment gets at least this many bytes"""
+
+
+def partial_path(data_source: assrc.DataSource):
+    """Where the in-progress download of a data source is kept so it can be resumed"""
+    url_hash = hashlib.sha1(data_source.url.encode()).hexdigest()[:12]
+    basename = data_source.url.split("/")[-1]
+    return data_source.get_output_dir() / ".partial" / f"{url_hash}-{basename}.part"
+
+
+def fetch_url(
+    url,
+    dst,
+    checksum=None,
+    chunk_size=CHUNK_SIZE,
+    progress_callback=None,
+    pbar=None,
+    resume=False,
+):
+    """Stream url into the file dst, hashing the bytes as they arrive.
+
+    The digest is checked as soon as the last byte is received so the file is never
+    read back. With resume=True an existing dst is continued with an HTTP Range
+    request (only the already present prefix is hashed again) and is kept on disk
+    if the transfer is interrupted. On a checksum mismatch dst is removed and an
+    IOError raised. Returns the hex digest of the downloaded bytes.
+    """
+    sha256_hash = hashlib.sha256()
+    request = urllib.request.Request(url)
+    offset = 0
+    if resume and Path(dst).exists():
+        offset = Path(dst).stat().st_size
+        if offset > 0:
+            request.add_header("Range", f"bytes={offset}-")
+    try:
+        response = urllib.request.urlopen(request)
+    except HTTPError as err:
+        if err.code != 416 or offset == 0:
+            raise
+        # Range not satisfiable: the partial file is already complete (or stale)
+        digest = sha256sum(dst)
+        if checksum is None or checksum == digest:
+            return digest
+        Path(dst).unlink()
+        return fetch_url(url, dst, checksum, chunk_size, progress_callback, pbar)
+
+    try:
+        with response:
+            if offset > 0 and response.status == 206:
+                update_hash_from_file(sha256_hash, dst, chunk_size)
+                mode = "ab"
+            else:
+                offset = 0
+                mode = "wb"
+            size = response.headers.get("Content-Length")
+            size = int(size) if size is not None else None
+            if pbar is not None:
+                pbar.total = offset + size if size is not None else None
+                pbar.update(offset)
+            received = 0
+            with open(dst, mode) as f:
+                buf = bytearray(chunk_size)
+                view = memoryview(buf)
+                while True:
+                    n = response.readinto(buf)
+                    if not n:
+                        break
+                    received += n
+                    if size is not None and received > size:
+                        raise IOError(f"Received more bytes than advertised: {url}")
+                    sha256_hash.update(view[:n])
+                    f.write(view[:n])
+                    if pbar is not None:
+                        pbar.update(n)
+                    if progress_callback is not None:
+                        progress_callback(n)
+            if size is not None and received != size:
+                raise IOError(
+                    f"Download truncated ({offset + received}/{offset + size} bytes): {url}"
+                )
+    except BaseException:
+        if not resume and Path(dst).exists():
+            Path(dst).unlink()
+        raise
+    digest = sha256_hash.hexdigest()
+    if checksum is not None and checksum != digest:
+        Path(dst).unlink()
+        raise IOError(f"Downloaded file's SHA-256 hash does not match record: {url}")
+    return digest
+
+
+def fetch_url_segmented(
+    url,
+    dst,
+    size,
+    segments=4,
+    checksum=None,
+    chunk_size=CHUNK_SIZE,
+    progress_callback=None,
+    pbar=None,
+):
+    """Download url into dst as `segments` parallel byte ranges.
+
+    dst is preallocated and every segment writes at its own offset. Progress per
+    segment is recorded in a `<dst>.json` sidecar after the data is written, so an
+    interrupted download resumes each segment where it stopped. Since the segments
+    arrive out of order the checksum is computed over the finished file.
+    Returns the hex digest of the downloaded file.
+    """
+    state_file = Path(f"{dst}.json")
+    bounds = [
+        (i * size // segments, (i + 1) * size // segments) for i in range(segments)
+    ]
+    done = [0] * segments
+    if state_file.exists() and Path(dst).exists():
+        with open(state_file, "r") as f:
+            state = json.load(f)
+        if state["url"] == url and state["size"] == size and len(state["done"]) == segments:
+            done = state["done"]
+    if not any(done):
+        with open(dst, "wb") as f:
+            f.truncate(size)
+    lock = threading.Lock()
+
+    def save_state():
+        tmp_state_file = Path(f"{state_file}.tmp")
+        with open(tmp_state_file, "w") as f:
+            json.dump(dict(url=url, size=size, done=done), f)
+        os.replace(tmp_state_file, state_file)
+
+    if pbar is not None:
+        pbar.total = size
+        pbar.update(sum(done))
+
+    def fetch_segment(fd, i):
+        start, end = bounds[i]
+        pos = start + done[i]
+        if pos >= end:
+            return
+        request = urllib.request.Request(url, headers={"Range": f"bytes={pos}-{end - 1}"})
+        with urllib.request.urlopen(request) as response:
+            if response.status != 206:
+                raise IOError(f"Server ignored the range request: {url}")
+            buf = bytearray(chunk_size)
+            view = memoryview(buf)
+            while pos < end:
+                n = response.readinto(buf)
+                if not n:
+                    break
+                n = min(n, end - pos)
+                os.pwrite(fd, view[:n], pos)
+                pos += n
+                with lock:
+                    done[i] = pos - start
+                    save_state()
+                    if pbar is not None:
+                        pbar.update(n)
+                if progress_callback is not None:
+                    progress_callback(n)
+        if pos != end:
+            raise IOError(f"Segment {i} truncated ({pos - start}/{end - start} bytes): {url}")
+
+    fd = os.open(dst, os.O_RDWR)
+    try:
+        with ThreadPoolExecutor(max_workers=segments) as executor:
+            for future in [executor.submit(fetch_segment, fd, i) for i in range(segments)]:
+                future.result()
+    finally:
+        os.close(fd)
+
+    digest = sha256sum(dst)
+    state_file.unlink()
+    if checksum is not None and checksum != digest:
+        Path(dst).unlink()
+        raise IOError(f"Downloaded file's SHA-256 hash does not match record: {url}")
+    return digest
+
+
+def extract_member(
+    zip_ref: zipfile.ZipFile, info: zipfile.ZipInfo, output_dir, chunk_size=CHUNK_SIZE
+):
+    """Extract one zip member below output_dir, hashing it on the way.
+
+    Returns the SHA-256 of the member's contents, or None for directories.
+    """
+    name = osp.normpath(info.filename)
+    if osp.isabs(name) or name.split(os.sep)[0] == "..":
+        raise IOError(f"Refusing to extract {info.filename} outside of {output_dir}")
+    path = osp.join(output_dir, name)
+    if info.is_dir():
+        os.makedirs(path, exist_ok=True)
+        return None
+    parent = osp.dirname(path)
+    if not osp.isdir(parent):
+        os.makedirs(parent, exist_ok=True)
+    sha256_hash = hashlib.sha256()
+    with zip_ref.open(info) as src, open(path, "wb") as dst:
+        while True:
+            chunk = src.read(chunk_size)
+            if not chunk:
+                break
+            sha256_hash.update(chunk)
+            dst.write(chunk)
     return sha256_hash.hexdigest()
 
 
+def _extract_members(zip_filename, names, output_dir):
+    """Worker for extract_zip: extract the named members and return their hashes"""
+    hashes = dict()
+    with zipfile.ZipFile(zip_filename, "r") as zip_ref:
+        for name in names:
+            digest = extract_member(zip_ref, zip_ref.getinfo(name), output_dir)
+            if digest is not None:
+                hashes[name] = digest
+    return hashes
+
+
+def split_members(members, num_batches):
+    """Greedily split zip members into batches of about the same uncompressed size"""
+    heap = [(0, i) for i in range(num_batches)]
+    batches = [[] for _ in range(num_batches)]
+    for info in sorted(members, key=lambda info: info.file_size, reverse=True):
+        load, i = heapq.heappop(heap)
+        batches[i].append(info.filename)
+        heapq.heappush(heap, (load + info.file_size, i))
+    return [batch for batch in batches if batch]
+
+
+def place_extracted(src_dir, names, hashes, output_dir, target_name):
+    """Move freshly extracted archive contents from src_dir into output_dir.
+
+    As before, if every member lives under a single top-level directory that
+    directory becomes output_dir/target_name; otherwise the members are placed
+    in output_dir as they are. Returns the hashes re-keyed relative to the target
+    together with the manifest root.
+    """
+    base_dir = shared_base_dir(names)
+    if base_dir is not None:
+        if str(src_dir) != str(output_dir) or base_dir != target_name:
+            os.replace(osp.join(src_dir, base_dir), osp.join(output_dir, target_name))
+        hashes = {name[len(base_dir) + 1 :]: v for name, v in hashes.items()}
+        return hashes, "."
+    if str(src_dir) != str(output_dir):
+        for top in set(name.split("/")[0] for name in names):
+            merge_into(osp.join(src_dir, top), osp.join(output_dir, top))
+    return hashes, ".."
+
+
+def merge_into(src, dst):
+    """os.replace src onto dst, merging into dst if both are directories"""
+    if osp.isdir(src) and osp.isdir(dst) and os.listdir(dst):
+        for name in os.listdir(src):
+            merge_into(osp.join(src, name), osp.join(dst, name))
+        os.rmdir(src)
+    else:
+        os.replace(src, dst)
+
+
+def extract_zip(zip_filename, output_dir, target_name, workers=1, verbose=False):
+    """Extract a downloaded zip into output_dir, hashing every member.
+
+    With workers > 1 the members are split into batches of similar size that are
+    extracted by a pool of processes, each with its own handle on the zip.
+    Members are extracted into a staging dir of their own first, so concurrent
+    downloads into the same output_dir cannot collide on shared top-level names.
+    Returns (hashes, root) ready for write_manifest.
+    """
+    staging = Path(output_dir) / f".{target_name}.extracting"
+    if staging.exists():
+        shutil.rmtree(staging)
+    staging.mkdir(parents=True)
+    try:
+        hashes, names = _extract_zip(zip_filename, staging, workers, verbose)
+        return place_extracted(staging, names, hashes, output_dir, target_name)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+def _extract_zip(zip_filename, output_dir, workers, verbose):
+    with zipfile.ZipFile(zip_filename, "r") as zip_ref:
+        members = zip_ref.infolist()
+        names = [info.filename for info in members]
+        if workers <= 1:
+            hashes = dict()
+            for info in tqdm(members, disable=not verbose):
+                digest = extract_member(zip_ref, info, output_dir)
+                if digest is not None:
+                    hashes[info.filename] = digest
+            return hashes, names
+
+    for info in members:
+        if info.is_dir():
+            (Path(output_dir) / osp.normpath(info.filename)).mkdir(
+                parents=True, exist_ok=True
+            )
+    files = [info for info in members if not info.is_dir()]
+    hashes = dict()
+    with ProcessPoolExecutor(max_workers=workers) as executor, tqdm(
+        total=len(files), disable=not verbose
+    ) as pbar:
+        futures = [
+            executor.submit(_extract_members, zip_filename, batch, output_dir)
+            for batch in split_members(files, workers * 4)
+        ]
+        for future in as_completed(futures):
+            batch_hashes = future.result()
+            hashes.update(batch_hashes)
+            pbar.update(len(batch_hashes))
+    return hashes, names
+
+
+class StreamingNotSupportedError(IOError):
+    """The archive uses a layout that can only be extracted through its central directory"""
+
+
+ZIP_LOCAL_HEADER = struct.Struct("<4sHHHHHIIIHH")
+ZIP_LOCAL_HEADER_SIGNATURE = b"PK\x03\x04"
+ZIP_DATA_DESCRIPTOR_SIGNATURE = b"PK\x07\x08"
+DESCRIPTOR_FEED_SIZE = 64 << 10
+"""input fed per step to a deflated member whose compressed size is only known after it"""
+
+
+class HashingReader:
+    """Reads exact byte counts from a stream, hashing every byte that is consumed"""
+
+    def __init__(self, fileobj, chunk_size=CHUNK_SIZE, progress_callback=None):
+        self.fileobj = fileobj
+        self.chunk_size = chunk_size
+        self.progress_callback = progress_callback
+        self.sha256_hash = hashlib.sha256()
+        self.buffer = b""
+        self.pos = 0
+
+    def _read_chunk(self):
+        chunk = self.fileobj.read(self.chunk_size)
+        if chunk:
+            self.sha256_hash.update(chunk)
+            if self.progress_callback is not None:
+                self.progress_callback(len(chunk))
+        return chunk
+
+    def _fill(self, n):
+        """Make sure at least n unread bytes are buffered, unless the stream ends"""
+        if len(self.buffer) - self.pos >= n:
+            return
+        parts = [self.buffer[self.pos :]]
+        available = len(parts[0])
+        while available < n:
+            chunk = self._read_chunk()
+            if not chunk:
+                break
+            parts.append(chunk)
+            available += len(chunk)
+        self.buffer = b"".join(parts)
+        self.pos = 0
+
+    def peek(self, n):
+        self._fill(n)
+        return self.buffer[self.pos : self.pos + n]
+
+    def read(self, n):
+        self._fill(n)
+        if len(self.buffer) - self.pos < n:
+            raise IOError("Archive stream ended unexpectedly")
+        self.pos += n
+        return self.buffer[self.pos - n : self.pos]
+
+    def read_some(self, n):
+        """Return up to n buffered bytes without copying more than that"""
+        self._fill(1)
+        data = memoryview(self.buffer)[self.pos : self.pos + n]
+        self.pos += len(data)
+        return data
+
+    def unread(self, n):
+        """Give back the last n bytes returned by read_some"""
+        self.pos -= n
+
+    def drain(self):
+        """Consume the rest of the stream and return the digest of all of it"""
+        self.buffer, self.pos = b"", 0
+        while self._read_chunk():
+            pass
+        return self.sha256_hash.hexdigest()
+
+
+def stream_extract_zip(
+    fileobj, output_dir, checksum=None, chunk_size=CHUNK_SIZE, progress_callback=None
+):
+    """Extract a zip while it is being read from fileobj, e.g. an HTTP response.
+
+    Members are located through their local headers, so no temporary copy of the
+    archive is needed. Stored members need their size in the local header and only
+    stored/deflated, unencrypted members are supported; anything else raises
+    StreamingNotSupportedError. The whole stream is hashed and checked against
+    checksum once the central directory has been read.
+    Returns (member names, member hashes).
+    """
+    reader = HashingReader(fileobj, chunk_size, progress_callback)
+    names, hashes = [], dict()
+    while reader.peek(4) == ZIP_LOCAL_HEADER_SIGNATURE:
+        (_, _, flags, method, _, _, crc, comp_size, size, name_len, extra_len) = (
+            ZIP_LOCAL_HEADER.unpack(reader.read(ZIP_LOCAL_HEADER.size))
+        )
+        name = reader.read(name_len).decode("utf-8" if flags & 0x800 else "cp437")
+        extra = reader.read(extra_len)
+        zip64 = False
+        while len(extra) >= 4:
+            header_id, data_len = struct.unpack("<HH", extra[:4])
+            if header_id == 0x0001:
+                zip64 = True
+                fields = extra[4 : 4 + data_len]
+                if size == 0xFFFFFFFF:
+                    size, fields = struct.unpack("<Q", fields[:8])[0], fields[8:]
+                if comp_size == 0xFFFFFFFF:
+                    comp_size = struct.unpack("<Q", fields[:8])[0]
+            extra = extra[4 + data_len :]
+        if flags & 0x1:
+            raise StreamingNotSupportedError(f"{name} is encrypted")
+        if method not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+            raise StreamingNotSupportedError(f"{name} uses compression method {method}")
+        if method == zipfile.ZIP_STORED and flags & 0x8:
+            raise StreamingNotSupportedError(f"{name} is stored without a known size")
+
+        norm_name = osp.normpath(name)
+        if osp.isabs(norm_name) or norm_name.split(os.sep)[0] == "..":
+            raise IOError(f"Refusing to extract {name} outside of {output_dir}")
+        path = osp.join(output_dir, norm_name)
+        names.append(name)
+        if name.endswith("/"):
+            os.makedirs(path, exist_ok=True)
+        else:
+            if not osp.isdir(osp.dirname(path)):
+                os.makedirs(osp.dirname(path), exist_ok=True)
+            sha256_hash = hashlib.sha256()
+            crc_actual = 0
+            with open(path, "wb") as dst:
+                if method == zipfile.ZIP_STORED:
+                    remaining = comp_size
+                    while remaining > 0:
+                        data = reader.read_some(min(chunk_size, remaining))
+                        if not data:
+                            raise IOError("Archive stream ended unexpectedly")
+                        remaining -= len(data)
+                        sha256_hash.update(data)
+                        crc_actual = zlib.crc32(data, crc_actual)
+                        dst.write(data)
+                else:
+                    # feed exactly the compressed size if it is known so the
+                    # decompressor never has to hand back unused input
+                    remaining = comp_size if not flags & 0x8 else None
+                    decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+                    while not decompressor.eof:
+                        n = DESCRIPTOR_FEED_SIZE if remaining is None else remaining
+                        data = reader.read_some(min(chunk_size, n))
+                        if not data:
+                            raise IOError("Archive stream ended unexpectedly")
+                        if remaining is not None:
+                            remaining -= len(data)
+                        data = decompressor.decompress(data)
+                        sha256_hash.update(data)
+                        crc_actual = zlib.crc32(data, crc_actual)
+                        dst.write(data)
+                    reader.unread(len(decompressor.unused_data))
+            hashes[name] = sha256_hash.hexdigest()
+        if flags & 0x8:
+            if reader.peek(4) == ZIP_DATA_DESCRIPTOR_SIGNATURE:
+                reader.read(4)
+            crc = struct.unpack("<I", reader.read(4))[0]
+            reader.read(16 if zip64 else 8)
+        if not name.endswith("/") and crc != crc_actual:
+            raise IOError(f"CRC mismatch for {name}")
+
+    digest = reader.drain()
+    if checksum is not None and checksum != digest:
+        raise IOError("Downloaded file's SHA-256 hash does not match record")
+    return names, hashes
+
+
+def get_output_path(data_source: assrc.DataSource):
+    target_path = data_source.target_path
+    if target_path is None:
+        target_path = data_source.url.split("/")[-1]
+    return data_source.get_output_dir() / target_path
+
+
 def download_from_hf_datasets(
     data_source: assrc.DataSource,
 ):
-    output_dir = Path(data_source.output_dir)
+    output_dir = data_source.get_output_dir()
     output_path = output_dir / data_source.target_path
     snapshot_download(
         repo_id=data_source.hf_repo_id,
@@ -57,25 +593,38 @@ def download_from_hf_datasets(
         local_dir_use_symlinks=False,
         resume_download=True,
     )
+    # hub files are not hashed, so the manifest only supports size/mtime checks
+    write_manifest(output_path, {name: None for name in walk_files(output_path)})
 
 
 def download(
     data_source: assrc.DataSource,
     verbose=True,
     non_interactive=True,
+    progress_callback=None,
+    segments=1,
+    store: AssetStore = None,
+    extract_workers=1,
+    stream_extract=False,
 ):
-    """download a given data source"""
-    output_dir = Path(data_source.output_dir)
+    """download a given data source
+
+    progress_callback, if given, is called with the number of newly received bytes.
+    With segments > 1 large files are fetched as that many parallel byte ranges.
+    With a store, sources already in it are checked out without any network access
+    and new downloads are added to it before being checked out.
+    extract_workers > 1 extracts zips with a process pool. stream_extract extracts
+    zips straight from the HTTP response without writing the archive to disk,
+    falling back to a regular download if the archive layout does not allow it.
+    """
+    output_dir = data_source.get_output_dir()
     # Create output directory
     if not output_dir.exists():
         if non_interactive or prompt_yes_no(f"{output_dir} does not exist. Create?"):
             output_dir.mkdir(parents=True)
         else:
             return
-    target_path = data_source.target_path
-    if target_path is None:
-        target_path = data_source.url.split("/")[-1]
-    output_path = output_dir / target_path
+    output_path = get_output_path(data_source)
     output_dir = osp.dirname(output_path)
 
     # Clean up existing files
@@ -101,60 +650,81 @@ def download(
         download_from_hf_datasets(data_source)
         return
 
-    # Download files to temporary location
-    try:
-        if verbose:
-            print(f"Downloading {data_source.url}")
-            pbar = tqdm(unit="iB", unit_scale=True, unit_divisor=1024)
+    if store is not None:
+        tree = store.lookup(data_source)
+        if tree is not None:
+            if verbose:
+                print(f"Checking out {data_source.url} from {store.root}")
+            return store.checkout(tree, data_source, output_path)
 
-        def show_progress(blocknum, bs, size):
+    if stream_extract and store is None and data_source.url.endswith(".zip"):
+        try:
+            return download_stream_extract(
+                data_source, output_path, verbose, progress_callback
+            )
+        except StreamingNotSupportedError as err:
             if verbose:
-                if blocknum == 0:
-                    pbar.total = size
-                pbar.update(bs)
+                print(f"Cannot stream-extract {data_source.url} ({err}), downloading it first")
 
-        tmp_filename, _ = urllib.request.urlretrieve(
-            data_source.url, reporthook=show_progress
-        )
+    # Download into a persistent partial file so an interrupted transfer can be
+    # resumed, verifying the checksum while streaming
+    tmp_filename = partial_path(data_source)
+    tmp_filename.parent.mkdir(parents=True, exist_ok=True)
+    pbar = None
+    try:
         if verbose:
-            pbar.close()
+            print(f"Downloading {data_source.url}")
+            pbar = tqdm(unit="iB", unit_scale=True, unit_divisor=1024)
+        size, accepts_ranges = None, False
+        if segments > 1:
+            size, accepts_ranges = probe_url(data_source.url)
+        if accepts_ranges and size is not None and size >= segments * SEGMENT_MIN_SIZE:
+            digest = fetch_url_segmented(
+                data_source.url,
+                tmp_filename,
+                size,
+                segments=segments,
+                checksum=data_source.checksum,
+                progress_callback=progress_callback,
+                pbar=pbar,
+            )
+        else:
+            digest = fetch_url(
+                data_source.url,
+                tmp_filename,
+                checksum=data_source.checksum,
+                progress_callback=progress_callback,
+                pbar=pbar,
+                resume=True,
+            )
     except URLError as err:
         print(f"Failed to download {data_source.url}")
         raise err
-    # Verify checksum
-    if data_source.checksum is not None and data_source.checksum != sha256sum(
-        tmp_filename
-    ):
-        raise IOError(
-            f"Downloaded file's SHA-256 hash does not match record: {data_source.url}"
-        )
+    finally:
+        if pbar is not None:
+            pbar.close()
+    if store is not None:
+        tree = store.ingest(data_source, tmp_filename, archive_sha256=digest)
+        if tmp_filename.exists():
+            tmp_filename.unlink()
+        return store.checkout(tree, data_source, output_path)
+
     base_filename = data_source.filename
     if base_filename is None:
         base_filename = data_source.url.split("/")[-1]
-    # Extract or move to output path
+    # Extract or move to output path, recording what was written in a manifest
     if data_source.url.endswith(".zip"):
-        with zipfile.ZipFile(tmp_filename, "r") as zip_ref:
-            if verbose:
-                for file in tqdm(zip_ref.infolist()):
-                    zip_ref.extract(file, output_dir)
-            else:
-                zip_ref.extractall(output_dir)
-            shared_base_dir = None
-            for file in zip_ref.filelist:
-                base_dir = file.filename.split("/")[0]
-                if shared_base_dir is None:
-                    shared_base_dir = base_dir
-                elif shared_base_dir != base_dir:
-                    shared_base_dir = None
-            if shared_base_dir is not None and shared_base_dir != osp.basename(
-                data_source.target_path
-            ):
-                os.rename(
-                    osp.join(output_dir, shared_base_dir),
-                    osp.join(output_dir, osp.basename(data_source.target_path)),
-                )
+        hashes, root = extract_zip(
+            tmp_filename,
+            output_dir,
+            osp.basename(data_source.target_path),
+            workers=extract_workers,
+            verbose=verbose,
+        )
+        write_manifest(output_path, hashes, root=root)
     else:
         shutil.move(tmp_filename, output_path / base_filename)
+        write_manifest(output_path, {base_filename: digest})
 
     # Explicitly delete the temporary file
     if Path(tmp_filename).exists():
@@ -163,6 +733,221 @@ def download(
     return output_path
 
 
+def download_stream_extract(
+    data_source: assrc.DataSource, output_path: Path, verbose=True, progress_callback=None
+):
+    """Fetch a zip data source and extract it on the fly, see stream_extract_zip"""
+    output_dir = osp.dirname(output_path)
+    staging = Path(output_dir) / f".{osp.basename(output_path)}.streaming"
+    if staging.exists():
+        shutil.rmtree(staging)
+    staging.mkdir(parents=True)
+    pbar = None
+    try:
+        if verbose:
+            print(f"Downloading and extracting {data_source.url}")
+            pbar = tqdm(unit="iB", unit_scale=True, unit_divisor=1024)
+
+        def on_bytes(n):
+            if pbar is not None:
+                pbar.update(n)
+            if progress_callback is not None:
+                progress_callback(n)
+
+        with urllib.request.urlopen(data_source.url) as response:
+            if pbar is not None and response.headers.get("Content-Length"):
+                pbar.total = int(response.headers["Content-Length"])
+            names, hashes = stream_extract_zip(
+                response,
+                staging,
+                checksum=data_source.checksum,
+                progress_callback=on_bytes,
+            )
+        hashes, root = place_extracted(
+            staging, names, hashes, output_dir, osp.basename(data_source.target_path)
+        )
+        write_manifest(output_path, hashes, root=root)
+    finally:
+        if pbar is not None:
+            pbar.close()
+        shutil.rmtree(staging, ignore_errors=True)
+    return output_path
+
+
+def probe_sizes(uids, jobs=16, store: AssetStore = None, output_dir=None):
+    """HEAD the archives of several data sources concurrently.
+
+    Returns uid -> download size in bytes, 0 for sources the store already holds
+    and None where the size is unknown (snapshots, servers without Content-Length
+    or failing probes; the download itself reports those errors).
+    """
+
+    def probe(uid):
+        data_source = assrc.DATA_SOURCES[uid]
+        if data_source.url is None:
+            return None
+        if store is not None:
+            if output_dir is not None:
+                data_source = dataclasses.replace(data_source, output_dir=Path(output_dir))
+            if store.lookup(data_source) is not None:
+                return 0
+        try:
+            return probe_url(data_source.url)[0]
+        except (HTTPError, URLError, OSError):
+            return None
+
+    with ThreadPoolExecutor(max_workers=max(1, min(jobs, len(uids)))) as executor:
+        return dict(zip(uids, executor.map(probe, uids)))
+
+
+def download_many(
+    uids, jobs=4, verbose=True, output_dir=None, byte_budget=None, **kwargs
+):
+    """Download several data sources concurrently with at most `jobs` transfers in flight.
+
+    The archive sizes are probed up front and transfers are started largest
+    first, so the tail of the run is not one huge file on a single connection.
+    With a byte_budget at most that many bytes of archives are in flight at once
+    (apart from a single larger one): big archives start early and the smaller
+    ones fill the remaining slots. Sources of unknown size start first and count
+    as the whole budget, so they only run alone.
+
+    Per-asset output is suppressed in favour of a single aggregated progress bar
+    whose total, and therefore ETA, covers all probed bytes.
+    A failing asset does not stop the others; the errors are returned as a dict
+    mapping uid -> exception. Other keyword arguments are passed on to download().
+    """
+    sizes = probe_sizes(
+        uids, jobs=max(jobs, 16), store=kwargs.get("store"), output_dir=output_dir
+    )
+    # largest first, unknown sizes before everything else
+    pending = sorted(
+        uids, key=lambda uid: float("inf") if sizes[uid] is None else sizes[uid], reverse=True
+    )
+    failures = {}
+    received = {uid: 0 for uid in uids}
+    lock = threading.Lock()
+    pbar = tqdm(
+        total=sum(size for size in sizes.values() if size is not None),
+        unit="iB",
+        unit_scale=True,
+        unit_divisor=1024,
+        desc=f"0/{len(uids)} assets",
+        disable=not verbose,
+    )
+
+    def fetch(uid):
+        data_source = assrc.DATA_SOURCES[uid]
+        if output_dir is not None:
+            data_source = dataclasses.replace(data_source, output_dir=Path(output_dir))
+
+        def on_bytes(n):
+            with lock:
+                received[uid] += n
+                pbar.update(n)
+
+        return download(
+            data_source,
+            verbose=False,
+            non_interactive=True,
+            progress_callback=on_bytes,
+            **kwargs,
+        )
+
+    def budget_bytes(uid):
+        # an unknown size could be anything, so it takes up the whole budget
+        if sizes[uid] is None:
+            return byte_budget or 0
+        return sizes[uid]
+
+    def next_uid(in_flight_bytes, num_in_flight):
+        for i, uid in enumerate(pending):
+            size = budget_bytes(uid)
+            if (
+                byte_budget is None
+                or num_in_flight == 0
+                or in_flight_bytes + size <= byte_budget
+            ):
+                return pending.pop(i)
+        return None
+
+    in_flight = {}
+    in_flight_bytes = 0
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        while pending or in_flight:
+            while len(in_flight) < jobs and pending:
+                uid = next_uid(in_flight_bytes, len(in_flight))
+                if uid is None:
+                    break
+                in_flight[executor.submit(fetch, uid)] = uid
+                in_flight_bytes += budget_bytes(uid)
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                uid = in_flight.pop(future)
+                in_flight_bytes -= budget_bytes(uid)
+                try:
+                    future.result()
+                except Exception as err:
+                    failures[uid] = err
+                with lock:
+                    # keep the total honest for resumed, failed or mis-probed
+                    # transfers so the ETA stays accurate
+                    pbar.total += received[uid] - (sizes[uid] or 0)
+                    num_done = len(uids) - len(pending) - len(in_flight)
+                    pbar.set_description(
+                        f"{num_done}/{len(uids)} assets, {len(failures)} failed"
+                    )
+    pbar.close()
+    return failures
+
+
+def hash_archives(filenames, use_mmap=True):
+    """Print the SHA-256 of already downloaded archives and check them against the
+    recorded checksum of the data source with the same file name, if any.
+
+    Returns False if any archive does not match its record.
+    """
+    known = dict()
+    for uid, data_source in assrc.DATA_SOURCES.items():
+        if data_source.url is not None and data_source.checksum is not None:
+            known[data_source.url.split("/")[-1]] = (uid, data_source.checksum)
+    ok = True
+    for filename in filenames:
+        digest = sha256sum(filename, use_mmap=use_mmap)
+        status = ""
+        if osp.basename(filename) in known:
+            uid, checksum = known[osp.basename(filename)]
+            status = f"  {uid}: OK" if digest == checksum else f"  {uid}: MISMATCH"
+            ok = ok and digest == checksum
+        print(f"{digest}  {filename}{status}")
+    return ok
+
+
+def verify_data_sources(uids, deep=False, jobs=1, output_dir=None):
+    """Check the extraction manifests of the given data sources.
+
+    Returns a dict mapping each uid that is missing or corrupt to its problems.
+    """
+
+    def check(uid):
+        data_source = assrc.DATA_SOURCES[uid]
+        if output_dir is not None:
+            data_source = dataclasses.replace(data_source, output_dir=Path(output_dir))
+        return uid, verify_manifest(get_output_path(data_source), deep=deep)
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        results = executor.map(check, uids)
+    return {uid: problems for uid, problems in results if problems}
+
+
+def print_failure_report(failures):
+    print("=" * 80)
+    print(f"{len(failures)} asset(s) failed to download:")
+    for uid, err in sorted(failures.items()):
+        print(f"  {uid}: {type(err).__name__}: {err}")
+    print("=" * 80)
+
+
 def parse_args(args=None):
     parser = argparse.ArgumentParser()
     parser.add_argument(
@@ -185,17 +970,97 @@ def parse_args(args=None):
     parser.add_argument(
         "-o", "--output-dir", type=str, help="Directory to save assets."
     )
+    parser.add_argument(
+        "--hash-archive",
+        type=str,
+        nargs="+",
+        help="Print the SHA-256 of already downloaded archive files and check them against the known data sources.",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of assets to download in parallel. Values above 1 imply --non-interactive.",
+    )
+    parser.add_argument(
+        "--segments",
+        type=int,
+        default=1,
+        help="Split large files into this many parallel HTTP range requests.",
+    )
+    parser.add_argument(
+        "--byte-budget",
+        type=int,
+        help="With --jobs, keep at most this many MiB of archives downloading at once so small assets fill the gaps next to large ones.",
+    )
+    parser.add_argument(
+        "--extract-workers",
+        type=int,
+        default=1,
+        help="Number of processes used to extract each zip archive.",
+    )
+    parser.add_argument(
+        "--stream-extract",
+        action="store_true",
+        help="Extract zips while they download instead of saving the archive first, when the archive layout allows it.",
+    )
+    parser.add_argument(
+        "--verify",
+        action="store_true",
+        help="Check downloaded assets against their manifests instead of downloading them.",
+    )
+    parser.add_argument(
+        "--repair",
+        action="store_true",
+        help="Verify downloaded assets and re-download only the missing or corrupt ones.",
+    )
+    parser.add_argument(
+        "--deep",
+        action="store_true",
+        help="With --verify/--repair, hash every file instead of trusting unchanged sizes and mtimes.",
+    )
+    parser.add_argument(
+        "--pack-bundle",
+        type=str,
+        help="Instead of extracting, pack the archives of the given asset (group) into this offline bundle file.",
+    )
+    parser.add_argument(
+        "--serve-bundle",
+        type=str,
+        help="Serve an offline bundle over HTTP as a mirror for --mirror.",
+    )
+    parser.add_argument("--host", type=str, default="0.0.0.0", help="Address for --serve-bundle.")
+    parser.add_argument("--port", type=int, default=8000, help="Port for --serve-bundle.")
+    parser.add_argument(
+        "--mirror",
+        type=str,
+        default=os.getenv("ASSET_MIRROR"),
+        help="Download archives from this --serve-bundle mirror (e.g. http://host:8000) instead of their original URLs. Defaults to $ASSET_MIRROR.",
+    )
+    parser.add_argument(
+        "--store",
+        type=str,
+        default=os.getenv("ASSET_STORE_PATH"),
+        help="Content-addressed asset store shared between output dirs and users. Assets in it are hardlinked into the output dir instead of downloaded. Defaults to $ASSET_STORE_PATH.",
+    )
     return parser.parse_args(args)
 
 
 def main(args):
     verbose = not args.quiet
 
+    if args.serve_bundle:
+        from asset_bundle import serve_bundle
+
+        serve_bundle(args.serve_bundle, host=args.host, port=args.port)
+        return
+    if args.hash_archive:
+        if not hash_archives(args.hash_archive):
+            exit(1)
+        return
     if args.list:
-        downloadable_ids = []
-        for k, v in assrc.DATA_SOURCES.items():
-            if v.source_type == args.list:
-                downloadable_ids.append(k)
+        downloadable_ids = assrc.data_source_ids_of_type(args.list)
         print(f"For category {args.list} the following asset UIDs are available")
         print(downloadable_ids)
         exit()
@@ -217,18 +1082,79 @@ def main(args):
     else:
         raise KeyError("{} not found.".format(args.uid))
 
+    if args.verify or args.repair:
+        broken = verify_data_sources(
+            uids, deep=args.deep, jobs=args.jobs, output_dir=args.output_dir
+        )
+        if verbose or broken:
+            print(f"{len(uids) - len(broken)}/{len(uids)} assets verified.")
+            for uid, problems in sorted(broken.items()):
+                more = f" (+{len(problems) - 1} more)" if len(problems) > 1 else ""
+                print(f"  {uid}: {problems[0]}{more}")
+        if args.verify:
+            if broken:
+                exit(1)
+            return
+        uids = sorted(broken)
+        if not uids:
+            return
+        show_progress = len(uids) > 1
+
+    if args.pack_bundle:
+        from asset_bundle import pack_bundle
+
+        failures = pack_bundle(uids, args.pack_bundle, jobs=args.jobs, verbose=verbose)
+        if failures:
+            print_failure_report(failures)
+            exit(1)
+        return
+    if args.mirror:
+        from asset_bundle import mirror_url
+
+        for uid in uids:
+            data_source = assrc.DATA_SOURCES[uid]
+            if data_source.url is not None:
+                assrc.DATA_SOURCES[uid] = dataclasses.replace(
+                    data_source, url=mirror_url(data_source.url, args.mirror)
+                )
+
+    download_kwargs = dict(
+        segments=args.segments,
+        store=AssetStore(args.store) if args.store else None,
+        extract_workers=args.extract_workers,
+        stream_extract=args.stream_extract,
+    )
+    if args.jobs > 1 and len(uids) > 1:
+        failures = download_many(
+            uids,
+            jobs=args.jobs,
+            verbose=verbose,
+            output_dir=args.output_dir,
+            byte_budget=args.byte_budget << 20 if args.byte_budget else None,
+            **download_kwargs,
+        )
+        if verbose:
+            print(f"Downloaded {len(uids) - len(failures)}/{len(uids)} assets for {args.uid}.")
+        if failures:
+            print_failure_report(failures)
+            exit(1)
+        return
+
     for i, uid in enumerate(uids):
         if show_progress and verbose:
             print("Downloading assets for {}: {}/{}".format(args.uid, i + 1, len(uids)))
 
-        kwargs = dict()
-        kwargs["verbose"] = verbose
-        kwargs["non_interactive"] = args.non_interactive
+        data_source = assrc.DATA_SOURCES[uid]
         if args.output_dir is not None:
-            kwargs["output_dir"] = args.output_dir
-        output_path = download(assrc.DATA_SOURCES[uid], **kwargs)
-        import time
-        time.sleep(1)
+            data_source = dataclasses.replace(
+                data_source, output_dir=Path(args.output_dir)
+            )
+        output_path = download(
+            data_source,
+            verbose=verbose,
+            non_interactive=args.non_interactive,
+            **download_kwargs,
+        )
 
         if output_path is not None and verbose:
             print("=" * 80)
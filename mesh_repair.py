@@ -0,0 +1,239 @@
+"""
+mesh_repair.py
+--------------
+Batch version of the mesh_test_replicaCAD.py Blender repair for all ReplicaCAD
+stages and objects:
+
+    1) apply transforms  2) recalculate normals  3) merge doubles / delete loose
+    4) solidify floors and walls  5) join into one mesh
+
+Every input is repaired once per (input SHA-256, parameters, backend) into
+CACHE_DIR/repaired/, so re-runs skip unchanged inputs. The "trimesh" backend
+needs no Blender; the "blender" backend runs mesh_test_replicaCAD.py in
+`blender -b` per file.
+
+    python mesh_repair.py -j 8 --report repair_report.json
+    python mesh_repair.py --backend blender --blender /opt/blender/blender stages/apt_0_stage.glb
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import pathlib
+import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from tqdm.auto import tqdm
+
+import replicad
+from asset_manifest import file_sha256
+
+REPAIR_CACHE_DIR = replicad.CACHE_DIR / "repaired"
+CACHE_VERSION = 1
+BLENDER_SCRIPT = pathlib.Path(__file__).parent / "mesh_test_replicaCAD.py"
+
+REPAIR_DEFAULTS = dict(
+    merge_distance=1e-5,
+    solidify_thickness=0.03,
+    solidify_keywords=["floor", "wall"],
+)
+"""the values hard-coded in mesh_test_replicaCAD.py"""
+
+
+def resolve_params(params=None) -> dict:
+    params = {**REPAIR_DEFAULTS, **(params or {})}
+    unknown = set(params) - set(REPAIR_DEFAULTS)
+    if unknown:
+        raise ValueError(f"Unknown repair parameters: {sorted(unknown)}")
+    return params
+
+
+def repair_key(in_path, params=None, backend="trimesh") -> str:
+    data = json.dumps(
+        dict(mesh=file_sha256(in_path), params=resolve_params(params), backend=backend, version=CACHE_VERSION),
+        sort_keys=True,
+    )
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+def repaired_path(key: str) -> pathlib.Path:
+    return REPAIR_CACHE_DIR / key[:2] / f"{key}.glb"
+
+
+def default_inputs() -> list[pathlib.Path]:
+    """Every stage and object mesh of the dataset"""
+    return sorted((replicad.DATA_ROOT / "stages").glob("*.glb")) + sorted((replicad.DATA_ROOT / "objects").glob("*.glb"))
+
+
+###############################################################################
+# trimesh backend -------------------------------------------------------------
+###############################################################################
+def solidify(mesh, thickness: float):
+    """Blender's Solidify modifier (offset -1): an inner copy along the vertex normals, rim faces on open edges"""
+    import trimesh
+
+    n = len(mesh.vertices)
+    vertices = np.vstack([mesh.vertices, mesh.vertices - mesh.vertex_normals * thickness])
+    faces = [mesh.faces, mesh.faces[:, ::-1] + n]
+    # directed edges that appear in one face only are the open boundary
+    boundary = mesh.edges[trimesh.grouping.group_rows(mesh.edges_sorted, require_count=1)]
+    if len(boundary):
+        a, b = boundary[:, 0], boundary[:, 1]
+        faces += [np.stack([b, a, a + n], axis=1), np.stack([b, a + n, b + n], axis=1)]
+    return trimesh.Trimesh(vertices, np.vstack(faces), process=False)
+
+
+def repair_trimesh(in_path, out_path, params=None) -> dict:
+    """The Blender steps with trimesh; returns vertex/face counts before and after"""
+    import trimesh
+
+    params = resolve_params(params)
+    scene = trimesh.load(in_path, force="scene")
+    digits = max(0, int(round(-math.log10(params["merge_distance"]))))
+    before = dict(vertices=0, faces=0)
+    parts = []
+    for node in scene.graph.nodes_geometry:
+        transform, geom_name = scene.graph[node]
+        geom = scene.geometry[geom_name]
+        if not isinstance(geom, trimesh.Trimesh):
+            continue
+        before["vertices"] += len(geom.vertices)
+        before["faces"] += len(geom.faces)
+        # 1) apply transforms
+        mesh = geom.copy()
+        mesh.apply_transform(transform)
+        # 3) merge doubles, drop degenerate/duplicate faces and loose vertices
+        mesh.merge_vertices(merge_tex=True, merge_norm=True, digits_vertex=digits)
+        mesh.update_faces(mesh.nondegenerate_faces())
+        mesh.update_faces(mesh.unique_faces())
+        mesh.remove_unreferenced_vertices()
+        if len(mesh.faces) == 0:
+            continue
+        # 2) consistent, outward normals
+        trimesh.repair.fix_normals(mesh)
+        # 4) solidify floors and walls
+        name = f"{node} {geom_name}".lower()
+        if params["solidify_thickness"] > 0 and any(k in name for k in params["solidify_keywords"]):
+            mesh = solidify(mesh, params["solidify_thickness"])
+        parts.append(mesh)
+    if not parts:
+        raise ValueError(f"{in_path} contains no triangle meshes")
+    # 5) join into one mesh
+    joined = trimesh.util.concatenate(parts)
+    joined.export(out_path, file_type="glb")
+    return dict(before=before, after=dict(vertices=len(joined.vertices), faces=len(joined.faces)))
+
+
+###############################################################################
+# Blender backend -------------------------------------------------------------
+###############################################################################
+def mesh_counts(path) -> dict:
+    import trimesh
+
+    scene = trimesh.load(path, force="scene")
+    meshes = [g for g in scene.geometry.values() if isinstance(g, trimesh.Trimesh)]
+    return dict(vertices=sum(len(m.vertices) for m in meshes), faces=sum(len(m.faces) for m in meshes))
+
+
+def repair_blender(in_path, out_path, params=None, blender="blender") -> dict:
+    params = resolve_params(params)
+    subprocess.run(
+        [
+            blender, "-b", "--python", str(BLENDER_SCRIPT), "--",
+            str(in_path), str(out_path),
+            str(params["merge_distance"]), str(params["solidify_thickness"]),
+            ",".join(params["solidify_keywords"]),
+        ],
+        check=True,
+        capture_output=True,
+    )
+    return dict(before=mesh_counts(in_path), after=mesh_counts(out_path))
+
+
+###############################################################################
+# 일괄 처리 ---------------------------------------------------------------------
+###############################################################################
+def repair(in_path, params=None, backend="trimesh", blender="blender") -> dict:
+    """Repair one mesh through the cache; returns its report entry"""
+    start = time.perf_counter()
+    key = repair_key(in_path, params, backend)
+    out_path = repaired_path(key)
+    stats_path = out_path.with_suffix(".json")
+    entry = dict(input=str(in_path), output=str(out_path), key=key, cached=out_path.exists() and stats_path.exists())
+    if entry["cached"]:
+        entry.update(json.loads(stats_path.read_text()))
+    else:
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = out_path.with_name(f".{key}.{os.getpid()}.glb")
+        if backend == "trimesh":
+            stats = repair_trimesh(in_path, tmp, params)
+        elif backend == "blender":
+            stats = repair_blender(in_path, tmp, params, blender)
+        else:
+            raise ValueError(f"Unknown backend {backend!r}")
+        os.replace(tmp, out_path)
+        stats_path.write_text(json.dumps(stats))
+        entry.update(stats)
+    entry["seconds"] = time.perf_counter() - start
+    return entry
+
+
+def repair_many(in_paths, params=None, backend="trimesh", blender="blender", jobs=os.cpu_count(), verbose=True) -> list[dict]:
+    """Repair all inputs with a process pool; failures are reported with an "error" entry"""
+    report = []
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = {executor.submit(repair, str(p), params, backend, blender): p for p in in_paths}
+        for future in tqdm(as_completed(futures), total=len(futures), disable=not verbose):
+            try:
+                report.append(future.result())
+            except Exception as err:
+                report.append(dict(input=str(futures[future]), error=repr(err)))
+    return sorted(report, key=lambda entry: entry["input"])
+
+
+def print_report(report):
+    done = [e for e in report if "error" not in e]
+    print(f"{'mesh':<40s} {'verts before':>12s} {'after':>9s} {'faces before':>12s} {'after':>9s}")
+    for e in done:
+        print(
+            f"{pathlib.Path(e['input']).name:<40s} {e['before']['vertices']:12d} {e['after']['vertices']:9d} "
+            f"{e['before']['faces']:12d} {e['after']['faces']:9d}{'  (cached)' if e['cached'] else ''}"
+        )
+    for e in report:
+        if "error" in e:
+            print(f"{pathlib.Path(e['input']).name:<40s} FAILED: {e['error']}")
+    print(f"{len(done)}/{len(report)} repaired, {sum(e['cached'] for e in done)} from cache")
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(description="Repair ReplicaCAD stage and object meshes in batch.")
+    parser.add_argument("inputs", nargs="*", help="Mesh files, relative to the dataset root or absolute; defaults to all stages and objects.")
+    parser.add_argument("--backend", choices=["trimesh", "blender"], default="trimesh")
+    parser.add_argument("--blender", type=str, default="blender", help="Blender executable for --backend blender.")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count())
+    parser.add_argument("--merge-distance", type=float, default=REPAIR_DEFAULTS["merge_distance"])
+    parser.add_argument("--solidify-thickness", type=float, default=REPAIR_DEFAULTS["solidify_thickness"])
+    parser.add_argument("--report", type=str, help="Also write the report to this JSON file.")
+    return parser.parse_args(args)
+
+
+def main(args):
+    inputs = [replicad.DATA_ROOT / p for p in args.inputs] or default_inputs()
+    params = dict(merge_distance=args.merge_distance, solidify_thickness=args.solidify_thickness)
+    report = repair_many(inputs, params, args.backend, args.blender, jobs=args.jobs)
+    print_report(report)
+    if args.report is not None:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+    if any("error" in e for e in report):
+        exit(1)
+
+
+if __name__ == "__main__":
+    main(parse_args())
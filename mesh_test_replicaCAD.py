@@ -1,18 +1,12 @@
-import trimesh
-import pathlib
-import json
 import bpy, sys
 
-DATA_ROOT   = pathlib.Path("/datasets/scene_datasets/replica_cad_dataset/")                    # HF repo root
-SCENE_DIR   = DATA_ROOT / "configs" / "scenes"
-
-demo_scene = SCENE_DIR / "apt_0.scene_instance.json"
-inst = json.loads(demo_scene.read_text())
-stage_name = inst["stage_instance"]["template_name"]   # 'stages/apt_0_stage'
-stage_glb  = DATA_ROOT / f"{stage_name}.glb"
-
-in_path = sys.argv[-2]; 
-out_path = sys.argv[-1]
+# blender -b --python mesh_test_replicaCAD.py -- in.glb out.glb [merge_distance thickness keywords]
+# (mesh_repair.py 가 일괄 실행; 인자 없이 마지막 두 개만 주면 기본값)
+args = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else sys.argv[-2:]
+in_path, out_path = args[0], args[1]
+merge_distance = float(args[2]) if len(args) > 2 else 1e-5
+thickness = float(args[3]) if len(args) > 3 else 0.03
+keywords = args[4].split(",") if len(args) > 4 else ["floor", "wall"]
 
 bpy.ops.import_scene.gltf(filepath=in_path)
 
@@ -31,14 +25,14 @@ for obj in bpy.context.scene.objects:
 
     # 3) Remove doubles / degenerate
     bpy.ops.object.editmode_toggle()
-    bpy.ops.mesh.merge_by_distance(distance=1e-5)
+    bpy.ops.mesh.merge_by_distance(distance=merge_distance)
     bpy.ops.mesh.delete_loose()
     bpy.ops.object.editmode_toggle()
 
     # 4) (Stage 등) Solidify for thickness
-    if "floor" in obj.name.lower() or "wall" in obj.name.lower():
+    if thickness > 0 and any(k in obj.name.lower() for k in keywords):
         mod = obj.modifiers.new("Solidify","SOLIDIFY")
-        mod.thickness = 0.03
+        mod.thickness = thickness
         bpy.ops.object.modifier_apply(modifier=mod.name)
 
 # (옵션) Join into one collision mesh
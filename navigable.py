@@ -0,0 +1,291 @@
+"""
+navigable.py
+------------
+Precomputed navigable start positions for ReplicaCAD scenes.
+
+The stage and its static furniture (STATIC objects and articulated objects at
+their rest pose) are sampled into a 2D grid in the Genesis frame, giving per
+cell the floor height and whether something occupies the band a robot of the
+given height would sweep. Free floor cells are eroded by the robot footprint
+radius and their centers (x, y, floor z) are cached per scene under
+CACHE_DIR/navigable/<scene>.<params>.npz, so spawning is a lookup instead of
+rejection sampling in the simulator.
+
+    python navigable.py --radius 0.3 --height 1.2 -j 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import pathlib
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+import replicad
+
+NAV_CACHE_DIR = replicad.CACHE_DIR / "navigable"
+CACHE_VERSION = 3
+
+NAV_DEFAULTS = dict(
+    cell_size=0.05,
+    robot_radius=0.3,
+    robot_height=1.2,
+    step_height=0.05,
+    floor_thickness=0.2,
+    samples_per_cell=4.0,
+    largest_component=True,
+)
+"""grid resolution and robot footprint, in meters"""
+
+
+SLAB_TOLERANCE = 1e-3
+"""slack on floor_thickness, so a slab exactly that thick still counts by its top face despite rounding"""
+
+
+def resolve_params(params=None) -> dict:
+    params = {**NAV_DEFAULTS, **(params or {})}
+    unknown = set(params) - set(NAV_DEFAULTS)
+    if unknown:
+        raise ValueError(f"Unknown navigable-grid parameters: {sorted(unknown)}")
+    return params
+
+
+def navigable_path(scene_json, params=None) -> pathlib.Path:
+    name = pathlib.Path(scene_json).name.replace(".scene_instance.json", "")
+    digest = hashlib.sha256(json.dumps(resolve_params(params), sort_keys=True).encode()).hexdigest()[:12]
+    return NAV_CACHE_DIR / f"{name}.{digest}.npz"
+
+
+###############################################################################
+# 정적 geometry (Genesis 좌표계) ------------------------------------------------
+###############################################################################
+def _origin(element) -> np.ndarray:
+    from scipy.spatial.transform import Rotation as R
+
+    origin = element.find("origin") if element is not None else None
+    if origin is None:
+        return np.eye(4)
+    xyz = [float(v) for v in origin.get("xyz", "0 0 0").split()]
+    rpy = [float(v) for v in origin.get("rpy", "0 0 0").split()]
+    return replicad.pose_matrix(xyz, R.from_euler("xyz", rpy).as_matrix())
+
+
+def urdf_rest_meshes(urdf) -> list[tuple[pathlib.Path, np.ndarray]]:
+    """(mesh file, 4x4 transform in the URDF root frame) of every visual at the zero joint configuration"""
+    urdf = pathlib.Path(urdf)
+    robot = ET.parse(urdf).getroot()
+    parent_of = {j.find("child").get("link"): j for j in robot.findall("joint")}
+    link_poses: dict[str, np.ndarray] = {}
+
+    def link_pose(name):
+        if name not in link_poses:
+            joint = parent_of.get(name)
+            link_poses[name] = np.eye(4) if joint is None else link_pose(joint.find("parent").get("link")) @ _origin(joint)
+        return link_poses[name]
+
+    meshes = []
+    for link in robot.findall("link"):
+        for visual in link.findall("visual"):
+            mesh = visual.find("geometry/mesh")
+            if mesh is None:
+                continue
+            S = np.diag([*[float(v) for v in mesh.get("scale", "1 1 1").split()], 1.0])
+            file = pathlib.Path(mesh.get("filename").replace("package://", ""))
+            meshes.append((file if file.is_absolute() else urdf.parent / file, link_pose(link.get("name")) @ _origin(visual) @ S))
+    return meshes
+
+
+def static_meshes(manifest) -> list[tuple[pathlib.Path, np.ndarray]]:
+    """(mesh file, 4x4 world transform) of the stage, STATIC objects and articulated objects"""
+    stage_glb = pathlib.Path(str(manifest["stage_glb"]))
+    meshes = [(stage_glb, replicad.mesh_matrix(stage_glb, replicad.STAGE_POS, replicad._AX_SWAP))]
+    lift = np.array([0.0, 0.0, replicad.REST_Z_SHIFT])
+    for i in np.flatnonzero(replicad.static_mask(manifest)):
+        file = pathlib.Path(str(manifest["obj_render_asset"][i]))
+        T = replicad.mesh_matrix(file, manifest["obj_pos"][i] + lift, replicad.quat_matrix(manifest["obj_quat"][i]))
+        meshes.append((file, T))
+    for i in range(len(manifest["art_template"])):
+        urdf = pathlib.Path(str(manifest["art_urdf"][i]))
+        if not urdf.exists():
+            continue
+        T = replicad.pose_matrix(manifest["art_pos"][i] + lift, replicad.quat_matrix(manifest["art_quat"][i]))
+        T[:3, :3] *= float(manifest["art_scale"][i])
+        meshes += [(file, T @ local) for file, local in urdf_rest_meshes(urdf)]
+    return meshes
+
+
+def _surface_samples(meshes, density: float, seed=0) -> tuple[np.ndarray, np.ndarray]:
+    """Points (N, 3) uniformly on all mesh surfaces and whether each lies on a horizontal face"""
+    import trimesh
+
+    rng = np.random.default_rng(seed)
+    loaded: dict[pathlib.Path, trimesh.Trimesh] = {}
+    points, horizontal = [], []
+    for file, T in meshes:
+        if file not in loaded:
+            loaded[file] = trimesh.load(file, force="mesh")
+        mesh = loaded[file]
+        if len(mesh.faces) == 0:
+            continue
+        triangles = trimesh.transform_points(mesh.triangles.reshape(-1, 3), T).reshape(-1, 3, 3)
+        cross = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+        area = np.linalg.norm(cross, axis=1) / 2
+        count = int(np.ceil(area.sum() * density))
+        face = rng.choice(len(area), size=count, p=area / area.sum())
+        u, v = rng.random((2, count))
+        flip = u + v > 1
+        u[flip], v[flip] = 1 - u[flip], 1 - v[flip]
+        tri = triangles[face]
+        points.append(tri[:, 0] + u[:, None] * (tri[:, 1] - tri[:, 0]) + v[:, None] * (tri[:, 2] - tri[:, 0]))
+        normal_z = np.abs(cross[face, 2]) / np.maximum(2 * area[face], 1e-12)
+        horizontal.append(normal_z > np.cos(np.radians(30)))
+    return np.concatenate(points), np.concatenate(horizontal)
+
+
+###############################################################################
+# 격자화 ------------------------------------------------------------------------
+###############################################################################
+def rasterize(points, horizontal, params=None) -> dict[str, np.ndarray]:
+    """
+    Height grid (floor z per cell, NaN where no horizontal surface was seen) and
+    navigable mask for the sampled surfaces.
+    """
+    from scipy import ndimage
+
+    params = resolve_params(params)
+    if not horizontal.any():
+        raise RuntimeError(
+            f"No navigable cells: none of the {len(points)} surface samples is horizontal; "
+            f"check the static meshes or relax navigable_params (samples_per_cell, cell_size, ...)"
+        )
+    cell = params["cell_size"]
+    origin = points[:, :2].min(axis=0)
+    ij = np.floor((points[:, :2] - origin) / cell).astype(np.int64)
+    shape = tuple(ij.max(axis=0) + 1)
+    flat = np.ravel_multi_index(ij.T, shape)
+
+    # floor height: the top of the lowest horizontal slab, so closed floor boxes count by their upper face
+    lowest = np.full(np.prod(shape), np.inf)
+    np.minimum.at(lowest, flat[horizontal], points[horizontal, 2])
+    slab = horizontal & (points[:, 2] <= lowest[flat] + params["floor_thickness"] + SLAB_TOLERANCE)
+    height = np.full(np.prod(shape), -np.inf)
+    np.maximum.at(height, flat[slab], points[slab, 2])
+    height[np.isinf(height)] = np.nan
+    # the ground is the most common floor height (the largest horizontal area)
+    valid = height[~np.isnan(height)]
+    hist, edges = np.histogram(valid, bins=max(1, int(np.ptp(valid) / 0.02) + 1))
+    ground = 0.5 * (edges[hist.argmax()] + edges[hist.argmax() + 1])
+    walkable = np.abs(np.nan_to_num(height, nan=np.inf) - ground) <= params["step_height"]
+
+    # anything between the step height and the robot height above the floor blocks the cell
+    rel = points[:, 2] - np.where(walkable[flat], height[flat], ground)
+    blocking = (rel > params["step_height"]) & (rel <= params["robot_height"])
+    occupied = np.bincount(flat[blocking], minlength=len(height)) > 0
+
+    # floor cells whose top face the sampling happened to miss: close 1-cell holes in the
+    # floor, obstacles are kept out by `occupied` anyway
+    holes = ndimage.binary_closing(walkable.reshape(shape), structure=np.ones((3, 3)), border_value=1).ravel() & ~walkable
+    height[holes] = ground
+    free = ((walkable | holes) & ~occupied).reshape(shape)
+    r = int(np.ceil(params["robot_radius"] / cell))
+    disk = np.add.outer(np.arange(-r, r + 1) ** 2, np.arange(-r, r + 1) ** 2) <= r * r
+    free = ndimage.binary_erosion(free, structure=disk, border_value=0)
+    if params["largest_component"] and free.any():
+        labels, _ = ndimage.label(free)
+        free = labels == np.bincount(labels[labels > 0]).argmax()
+    return dict(
+        origin=origin,
+        height=height.reshape(shape).astype(np.float32),
+        occupied=occupied.reshape(shape),
+        free=free,
+        ground=np.array(ground),
+    )
+
+
+def compute_navigable(scene_json, params=None) -> dict[str, np.ndarray]:
+    """The navigable grid of one scene and the (N, 3) float32 centers of its free cells"""
+    params = resolve_params(params)
+    manifest = replicad.load_scene_manifest(scene_json)
+    meshes = static_meshes(manifest)
+    points, horizontal = _surface_samples(meshes, params["samples_per_cell"] / params["cell_size"] ** 2)
+    try:
+        grid = rasterize(points, horizontal, params)
+    except RuntimeError as err:
+        raise RuntimeError(f"{pathlib.Path(scene_json).name}: {err}") from err
+
+    i, j = np.nonzero(grid["free"])
+    xy = grid["origin"] + (np.stack([i, j], axis=1) + 0.5) * params["cell_size"]
+    positions = np.column_stack([xy, grid["height"][i, j]]).astype(np.float32)
+    sources = json.loads(str(manifest["sources"])) + [
+        replicad.file_record(file) for file in sorted({file for file, _ in meshes})
+    ]
+    return dict(
+        version=np.array(CACHE_VERSION),
+        params=np.array(json.dumps(params, sort_keys=True)),
+        positions=positions,
+        sources=np.array(json.dumps(sources)),
+        **grid,
+    )
+
+
+def load_navigable(scene_json, params=None, recompute=True) -> dict[str, np.ndarray]:
+    """The cached navigable grid of scene_json, recomputing it if missing or stale"""
+    path = navigable_path(scene_json, params)
+    if path.exists():
+        with np.load(path, allow_pickle=False) as f:
+            nav = {key: f[key] for key in f.files}
+        if int(nav["version"]) == CACHE_VERSION and not replicad.sources_changed(json.loads(str(nav["sources"]))):
+            return nav
+    if not recompute:
+        raise FileNotFoundError(f"No up-to-date navigable grid for {scene_json} at {path}; run navigable.py")
+    nav = compute_navigable(scene_json, params)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.stem}.{os.getpid()}.npz")
+    np.savez_compressed(tmp, **nav)
+    os.replace(tmp, path)
+    return nav
+
+
+def _summary(scene_json, params):
+    nav = load_navigable(scene_json, params)
+    return len(nav["positions"]), float(nav["free"].mean())
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(description="Precompute navigable start positions for ReplicaCAD scenes.")
+    parser.add_argument("--cell-size", type=float, default=NAV_DEFAULTS["cell_size"])
+    parser.add_argument("--radius", type=float, default=NAV_DEFAULTS["robot_radius"], help="Robot footprint radius.")
+    parser.add_argument("--height", type=float, default=NAV_DEFAULTS["robot_height"], help="Robot height.")
+    parser.add_argument("--step-height", type=float, default=NAV_DEFAULTS["step_height"])
+    parser.add_argument("--no-staging", action="store_true", help="Skip the staging scenes.")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count())
+    return parser.parse_args(args)
+
+
+def main(args):
+    params = dict(cell_size=args.cell_size, robot_radius=args.radius, robot_height=args.height, step_height=args.step_height)
+    scenes = replicad.scene_json_paths(not args.no_staging)
+    failed = 0
+    with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+        futures = {executor.submit(_summary, scene, params): scene for scene in scenes}
+        for future in as_completed(futures):
+            scene = futures[future]
+            try:
+                count, fraction = future.result()
+            except Exception as err:
+                failed += 1
+                print(f"{scene.name}: FAILED {err!r}")
+                continue
+            print(f"{scene.name}: {count} free cells ({fraction:.1%} of the grid)")
+    print(f"Grids in {NAV_CACHE_DIR}")
+    if failed:
+        exit(1)
+
+
+if __name__ == "__main__":
+    main(parse_args())
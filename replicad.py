@@ -0,0 +1,320 @@
+"""
+replicad.py
+-----------
+Genesis-independent ReplicaCAD helpers shared by the loaders:
+dataset paths, Habitat → Genesis pose conversion, object configs and compiled
+scene manifests.
+
+A compiled manifest is an uncompressed .npz of flat arrays (struct-of-arrays)
+holding everything the loaders need from a scene_instance.json and the object
+configs it references, already resolved and converted to the Genesis frame.
+It is rebuilt automatically when any of those source files changes:
+
+    python replicad.py            # compile all scenes of scene/metadata/scene_metadata.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import pathlib
+
+import numpy as np
+
+###############################################################################
+# 0. 경로 설정 ---------------------------------------------------------------
+###############################################################################
+DATA_ROOT   = pathlib.Path(os.getenv("REPLICACAD_DATA_ROOT", "/dataset/scene_datasets/replica_cad_dataset/"))
+SCENE_DIR   = DATA_ROOT / "configs" / "scenes"
+OBJECT_DIR  = DATA_ROOT / "configs" / "objects"
+CACHE_DIR   = pathlib.Path(os.getenv("REPLICACAD_CACHE_DIR", DATA_ROOT.parent / "replica_cad_cache"))
+"""compiled manifests and other derived data, next to the dataset by default"""
+SCENE_METADATA = pathlib.Path(__file__).parent / "scene" / "metadata" / "scene_metadata.json"
+
+HEIGHT_OFFSET = 0.3
+"""the loaders lift everything by this much so objects do not start inside the floor"""
+STAGE_POS   = (0.0, 0.0, 0.1)
+STAGE_EULER = (90.0, 0.0, 0.0)
+"""the pose the loaders give the stage mesh (Genesis pos, euler in degrees)"""
+REST_Z_SHIFT = STAGE_POS[2] - HEIGHT_OFFSET
+"""added to a loader position, gives where a fixed instance actually rests on the stage"""
+STATIC_MOTION_TYPES = ("STATIC", "KINEMATIC")
+
+###############################################################################
+# 1. 좌표계 · 회전 변환 -------------------------------------------------------
+# Habitat:  (x right,  y up,   z forward -)
+# Genesis:  (x right,  z up,   y forward  +)
+###############################################################################
+_AX_SWAP = np.array([[1,  0,  0],
+                     [0,  0, -1],
+                     [0,  1,  0]])
+_Q_SWAP = np.array([np.sqrt(0.5), np.sqrt(0.5), 0.0, 0.0])   # _AX_SWAP = x축 +90° 회전 (w, x, y, z)
+
+def _is_dicts(values) -> bool:
+    return not isinstance(values, np.ndarray) and len(values) > 0 and isinstance(values[0], dict)
+
+def _rows(values, keys: str) -> np.ndarray:
+    """N개의 dict ({"x":..}, keys 순서로) 또는 시퀀스 / (N, len(keys)) 배열 → float64 (N, len(keys))"""
+    if isinstance(values, np.ndarray):
+        return values.astype(np.float64, copy=False).reshape(-1, len(keys))
+    values = list(values)
+    if _is_dicts(values):
+        return np.array([[v[k] for k in keys] for v in values], dtype=np.float64)
+    return np.array(values, dtype=np.float64).reshape(-1, len(keys))
+
+def quat_mul_batch(p: np.ndarray, q: np.ndarray) -> np.ndarray:
+    """(w, x, y, z) 쿼터니언 곱 p ⊗ q, (N, 4) 또는 (4,) 끼리 broadcast"""
+    pw, px, py, pz = np.moveaxis(p, -1, 0)
+    qw, qx, qy, qz = np.moveaxis(q, -1, 0)
+    return np.stack([
+        pw*qw - px*qx - py*qy - pz*qz,
+        pw*qx + px*qw + py*qz - pz*qy,
+        pw*qy - px*qz + py*qw + pz*qx,
+        pw*qz + px*qy - py*qx + pz*qw,
+    ], axis=-1)
+
+def hab2gen_pos_batch(translations, height_offset: float = HEIGHT_OFFSET) -> np.ndarray:
+    """
+    (N, 3) Habitat 위치 → Genesis 위치, (x, y, z) → (x, -z, y + height_offset).
+    translations: [x, y, z] 리스트들, {"x", "y", "z"} dict 들, 또는 (N, 3) 배열
+    """
+    p = _rows(translations, "xyz")
+    out = np.empty_like(p)
+    out[:, 0] = p[:, 0]
+    out[:, 1] = -p[:, 2]
+    out[:, 2] = p[:, 1] + height_offset
+    return out
+
+def hab2gen_quat_batch(rotations, order: str = "wxyz", conjugate: bool = False) -> np.ndarray:
+    """
+    (N, 4) Habitat 쿼터니언 → Genesis (w, x, y, z), w >= 0 으로 정규화.
+
+    * rotations: {"w", "x", "y", "z"} dict 들, 또는 `order` 순서의 리스트/(N, 4) 배열
+      ("wxyz": ReplicaCAD JSON, "xyzw": SciPy)
+    * conjugate=False: R_gen = S @ R_hab  (load_replicacad; 메시는 Habitat 축 그대로)
+      conjugate=True : R_gen = S @ R_hab @ S.T  (순수 좌표계 변환, replicad2genesis.py)
+    """
+    if order not in ("wxyz", "xyzw"):
+        raise ValueError(f"Unknown quaternion order {order!r}, expected 'wxyz' or 'xyzw'")
+    if not isinstance(rotations, np.ndarray):
+        rotations = list(rotations)
+    q = _rows(rotations, "wxyz")
+    if order == "xyzw" and not _is_dicts(rotations):
+        q = q[:, [3, 0, 1, 2]]
+    q = quat_mul_batch(_Q_SWAP, q)
+    if conjugate:
+        q = quat_mul_batch(q, _Q_SWAP * [1, -1, -1, -1])
+    q /= np.linalg.norm(q, axis=1, keepdims=True)
+    q[q[:, 0] < 0] *= -1
+    return q
+
+def quat_matrix(q) -> np.ndarray:
+    """(w, x, y, z) 쿼터니언 → 3x3 회전 행렬"""
+    w, x, y, z = q
+    return np.array([
+        [1 - 2 * (y * y + z * z), 2 * (x * y - w * z), 2 * (x * z + w * y)],
+        [2 * (x * y + w * z), 1 - 2 * (x * x + z * z), 2 * (y * z - w * x)],
+        [2 * (x * z - w * y), 2 * (y * z + w * x), 1 - 2 * (x * x + y * y)],
+    ])
+
+def pose_matrix(pos, rot) -> np.ndarray:
+    """4x4 homogeneous transform from a position and a 3x3 rotation"""
+    T = np.eye(4)
+    T[:3, :3] = rot
+    T[:3, 3] = pos
+    return T
+
+GLTF_SUFFIXES = (".glb", ".gltf")
+
+def mesh_matrix(file, pos, rot) -> np.ndarray:
+    """
+    4x4 transform from the vertices of `file` as trimesh loads them to where
+    gs.morphs.Mesh(file=file) with that pose puts them. glTF is Y-up, and Genesis
+    turns it Z-up (x-axis +90°, _AX_SWAP) before the morph pose; other formats load as is.
+    """
+    T = pose_matrix(pos, rot)
+    if pathlib.Path(file).suffix.lower() in GLTF_SUFFIXES:
+        T[:3, :3] = T[:3, :3] @ _AX_SWAP
+    return T
+
+def hab2gen_pos(pos_xyz: list[float]) -> tuple[float, float, float]:
+    """(x, y, z)_Hab → (x, y', z')_Gen, 한 개짜리 hab2gen_pos_batch"""
+    return tuple(hab2gen_pos_batch([pos_xyz])[0].tolist())
+
+def hab2gen_quat(q) -> tuple[float, float, float, float]:
+    """
+    HF ReplicaCAD 쿼터니언은 [w, x, y, z] 순 (문서 기준).
+    Genesis `quat` 역시 (w, x, y, z). 한 개짜리 hab2gen_quat_batch
+    """
+    return tuple(hab2gen_quat_batch([q])[0].tolist())
+
+###############################################################################
+# 2. Object config 로드 -------------------------------------------------------
+###############################################################################
+_cfg_cache: dict[str, dict] = {}
+
+def obj_cfg_path(template_name: str) -> pathlib.Path:
+    return OBJECT_DIR / (pathlib.Path(template_name).name + ".object_config.json")
+
+def load_obj_cfg(template_name: str) -> dict:
+    """template_name 예: 'objects/frl_apartment_basket' (확장자 없이)"""
+    if template_name not in _cfg_cache:
+        _cfg_cache[template_name] = json.loads(obj_cfg_path(template_name).read_text())
+    return _cfg_cache[template_name]
+
+def stage_glb_path(stage_template: str) -> pathlib.Path:
+    """stage_template 예: 'stages/apt_0_stage'"""
+    return DATA_ROOT / f"{stage_template}.glb"
+
+def urdf_path(template_name: str) -> pathlib.Path:
+    return DATA_ROOT / "urdf" / template_name / f"{template_name}.urdf"
+
+def scene_json_paths(include_staging_scenes=True) -> list[pathlib.Path]:
+    """The scene_instance.json of every scene listed in scene/metadata/scene_metadata.json"""
+    metadata = json.loads(SCENE_METADATA.read_text())
+    names = metadata["scenes"] + (metadata["staging_scenes"] if include_staging_scenes else [])
+    return [SCENE_DIR / name for name in names]
+
+###############################################################################
+# 3. Compiled scene manifest --------------------------------------------------
+###############################################################################
+MANIFEST_VERSION = 2
+
+def file_record(path: pathlib.Path) -> dict:
+    st = os.stat(path)
+    with open(path, "rb") as f:
+        digest = hashlib.file_digest(f, "sha256").hexdigest()
+    return dict(path=str(path), size=st.st_size, mtime_ns=st.st_mtime_ns, sha256=digest)
+
+def sources_changed(records: list[dict]) -> bool:
+    """Whether any source file differs from its record; unchanged size+mtime is trusted"""
+    for record in records:
+        try:
+            st = os.stat(record["path"])
+        except FileNotFoundError:
+            return True
+        if st.st_size != record["size"]:
+            return True
+        if st.st_mtime_ns == record["mtime_ns"]:
+            continue
+        if file_record(pathlib.Path(record["path"]))["sha256"] != record["sha256"]:
+            return True
+    return False
+
+def scene_manifest_path(scene_json: pathlib.Path) -> pathlib.Path:
+    name = pathlib.Path(scene_json).name.replace(".scene_instance.json", "")
+    return CACHE_DIR / "manifests" / f"{name}.npz"
+
+def compile_scene(scene_json: pathlib.Path) -> dict[str, np.ndarray]:
+    """
+    Resolve a scene_instance.json into flat arrays:
+
+    * stage_template / stage_glb: the stage template and its mesh
+    * obj_*: one row per object instance with its template, resolved render and
+      collision assets (empty string if none), Genesis pos (N, 3) and quat (N, 4,
+      w x y z), motion type, mass and friction (NaN if the config has none)
+    * art_*: one row per articulated object with its template, URDF, pos, quat
+      and uniform scale
+    * sources: JSON records (path, size, mtime, SHA-256) of every file read
+    """
+    scene_json = pathlib.Path(scene_json)
+    inst = json.loads(scene_json.read_text())
+    sources = [file_record(scene_json)]
+
+    objs = inst.get("object_instances", [])
+    templates = [obj["template_name"] for obj in objs]
+    cfgs_read = set()
+    cfgs = []
+    for tname in templates:
+        if tname not in cfgs_read:
+            sources.append(file_record(obj_cfg_path(tname)))
+            cfgs_read.add(tname)
+        cfgs.append(load_obj_cfg(tname))
+
+    arts = inst.get("articulated_object_instances", [])
+    stage_template = inst["stage_instance"]["template_name"]
+    return dict(
+        version=np.array(MANIFEST_VERSION),
+        stage_template=np.array(stage_template),
+        stage_glb=np.array(str(stage_glb_path(stage_template))),
+        obj_template=np.array(templates, dtype=str),
+        obj_render_asset=np.array([str(OBJECT_DIR / cfg["render_asset"]) for cfg in cfgs], dtype=str),
+        obj_collision_asset=np.array(
+            [str(OBJECT_DIR / cfg["collision_asset"]) if "collision_asset" in cfg else "" for cfg in cfgs],
+            dtype=str,
+        ),
+        obj_pos=hab2gen_pos_batch([obj["translation"] for obj in objs]),
+        obj_quat=hab2gen_quat_batch([obj["rotation"] for obj in objs]),
+        obj_motion_type=np.array([obj.get("motion_type", "DYNAMIC") for obj in objs], dtype=str),
+        obj_mass=np.array([cfg.get("mass", np.nan) for cfg in cfgs], dtype=np.float64),
+        obj_friction=np.array(
+            [cfg.get("friction_coefficient", cfg.get("friction", np.nan)) for cfg in cfgs], dtype=np.float64
+        ),
+        art_template=np.array([a["template_name"] for a in arts], dtype=str),
+        art_urdf=np.array([str(urdf_path(a["template_name"])) for a in arts], dtype=str),
+        art_pos=hab2gen_pos_batch([a["translation"] for a in arts]),
+        art_quat=hab2gen_quat_batch([a["rotation"] for a in arts]),
+        art_scale=np.array([a.get("uniform_scale", 1.0) for a in arts], dtype=np.float64),
+        sources=np.array(json.dumps(sources)),
+    )
+
+def save_scene_manifest(scene_json: pathlib.Path, manifest: dict[str, np.ndarray]) -> pathlib.Path:
+    path = scene_manifest_path(scene_json)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.stem}.{os.getpid()}.npz")
+    np.savez(tmp, **manifest)     # 무압축: 배열별로 바로 읽힌다
+    os.replace(tmp, path)
+    return path
+
+def load_scene_manifest(scene_json: pathlib.Path, recompile: bool = True) -> dict[str, np.ndarray]:
+    """
+    The compiled manifest of scene_json, (re)compiling it if it is missing, from
+    another manifest version or stale with respect to its source files.
+    With recompile=False a stale manifest raises FileNotFoundError instead.
+    """
+    path = scene_manifest_path(scene_json)
+    if path.exists():
+        with np.load(path, allow_pickle=False) as f:
+            manifest = {key: f[key] for key in f.files}
+        if int(manifest["version"]) == MANIFEST_VERSION and not sources_changed(json.loads(str(manifest["sources"]))):
+            return manifest
+    if not recompile:
+        raise FileNotFoundError(f"No up-to-date compiled manifest for {scene_json} at {path}")
+    manifest = compile_scene(scene_json)
+    save_scene_manifest(scene_json, manifest)
+    return manifest
+
+def static_mask(manifest: dict[str, np.ndarray]) -> np.ndarray:
+    """Which object instances never move (STATIC / KINEMATIC motion type) and belong to the background"""
+    return np.isin(manifest["obj_motion_type"], STATIC_MOTION_TYPES)
+
+def group_instances(templates: np.ndarray) -> dict[str, np.ndarray]:
+    """template -> indices of its instances, in order of first appearance"""
+    unique, first, inverse = np.unique(templates, return_index=True, return_inverse=True)
+    order = np.argsort(first)
+    return {str(unique[k]): np.flatnonzero(inverse == k) for k in order}
+
+###############################################################################
+# 4. 일괄 컴파일 --------------------------------------------------------------
+###############################################################################
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(description="Compile ReplicaCAD scene manifests.")
+    parser.add_argument("scenes", nargs="*", help="scene_instance.json files; defaults to all scenes in scene_metadata.json")
+    parser.add_argument("--no-staging", action="store_true", help="Skip the staging scenes.")
+    parser.add_argument("--force", action="store_true", help="Recompile even if the manifest is up to date.")
+    return parser.parse_args(args)
+
+def main(args):
+    scenes = [pathlib.Path(s) for s in args.scenes] or scene_json_paths(not args.no_staging)
+    for scene_json in scenes:
+        if args.force:
+            path = save_scene_manifest(scene_json, compile_scene(scene_json))
+        else:
+            load_scene_manifest(scene_json)
+            path = scene_manifest_path(scene_json)
+        print(f"{scene_json.name} → {path}")
+
+if __name__ == "__main__":
+    main(parse_args())
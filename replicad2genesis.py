@@ -1,34 +1,30 @@
 import json, pathlib, numpy as np, genesis as gs
-from scipy.spatial.transform import Rotation as R
+from replicad import hab2gen_pos_batch, hab2gen_quat_batch
 
 DATA_ROOT = pathlib.Path('/datasets/scene_datasets/replica_cad_dataset/')
 SCENE_CFG  = DATA_ROOT / 'replicaCAD.scene_dataset_config.json'
 GEN_ASSET  = pathlib.Path('gen_assets')  # optional texture copy
 
 def hab2gen_pos(p):
-    return (p['x'], -p['z'], p['y'])
+    return hab2gen_pos_batch(p, height_offset=0.0)
 
 def hab2gen_quat(q):
-    r = R.from_quat([q['x'], q['y'], q['z'], q['w']])
-    M = r.as_matrix()
-    # swap rows/cols : (x,y,z)_hab → (x,z,y)_gen & flip hab_z
-    S = np.array([[1,0,0],
-                  [0,0,-1],
-                  [0,1,0]])
-    M_gen = S @ M @ S.T
-    return R.from_matrix(M_gen).as_quat()  # x,y,z,w
+    # swap rows/cols : (x,y,z)_hab → (x,z,y)_gen & flip hab_z, S @ M @ S.T
+    return hab2gen_quat_batch(q, conjugate=True)  # w,x,y,z
 
 def load_scene(scene_json):
     inst = json.load(open(scene_json))
     print(DATA_ROOT / inst['stage_instance']['template_name'])
     stg_glb = (DATA_ROOT / "stages" / inst['stage_instance']['template_name']).as_posix() + '.glb'
     obj_insts = inst['object_instances']
+    obj_pos  = hab2gen_pos([obj['translation'] for obj in obj_insts])
+    obj_quat = hab2gen_quat([obj['rotation'] for obj in obj_insts])
 
     gs.init(backend=gs.gpu)
     scene = gs.Scene(show_viewer=True)
     scene.add_entity(gs.morphs.Mesh(file=str(stg_glb)))
 
-    for obj in obj_insts:
+    for i, obj in enumerate(obj_insts):
         cfg = (DATA_ROOT / "configs/objects" / obj['template_name']).as_posix() + '.object_config.json'
         meta = json.load(open(cfg))
         mesh = DATA_ROOT / "configs/objects" / meta['render_asset']      # .glb
@@ -36,12 +32,12 @@ def load_scene(scene_json):
 
         if urdf:        # articulated 가구
             ent = scene.add_entity(gs.morphs.URDF(file=str(DATA_ROOT / urdf),
-                                                  pos=hab2gen_pos(obj['translation']),
-                                                  quat=hab2gen_quat(obj['rotation'])))
+                                                  pos=tuple(obj_pos[i]),
+                                                  quat=tuple(obj_quat[i])))
         else:           # rigid object
             ent = scene.add_entity(gs.morphs.Mesh(file=str(mesh),
-                                                  pos=hab2gen_pos(obj['translation']),
-                                                  quat=hab2gen_quat(obj['rotation']),
+                                                  pos=tuple(obj_pos[i]),
+                                                  quat=tuple(obj_quat[i]),
                                                   mass=meta['mass'],
                                                   friction=meta['friction']))
     scene.build()
@@ -1,94 +1,297 @@
 from typing import List, Union, Dict
 import genesis as gs
-from Environment import GenesisEnv
 import os
 import json
 import numpy as np
 
+import navigable
+import replicad
+from background import add_background
+from coacd_cache import REPLICACAD_COACD_OPTIONS, collision_urdf
+from shared_geometry import shared_geometry
 from components import *
-from constant import *
 
 DATASET_CONFIG_DIR = os.path.join(os.path.dirname(__file__), "metadata")
 
+SCENE_SPACING = 50.0
+"""distance between the slots of different scene configs; larger than any ReplicaCAD apartment"""
+
 class GenesisReplicaCADScene():
-    
+
     build_configs: List[str] = None
-    
-    def __init__(self, num_envs=1, show_viewer=True, include_staging_scenes=True):
-        with open(os.path.join(DATASET_CONFIG_DIR, "scene_configs.json")) as f:
+
+    def __init__(self, num_envs=1, show_viewer=True, include_staging_scenes=True, scene_spacing=SCENE_SPACING,
+                 navigable_params=None, rigid_options=None, static_objects="fixed"):
+        with open(os.path.join(DATASET_CONFIG_DIR, "scene_metadata.json")) as f:
             build_config_json = json.load(f)
             self.build_configs = build_config_json["scenes"]
             if include_staging_scenes:
                 self.build_configs += build_config_json["staging_scenes"]
-        
+
         self._navigable_positions = [None] * len(self.build_configs)
+        self.navigable_params = navigable_params    # robot footprint etc., see navigable.NAV_DEFAULTS
         self.build_config_idxs: List[int] = None
-        
+        self.num_envs = num_envs
+        self.scene_spacing = scene_spacing
+        # 'fixed': every static object is its own fixed body; 'merged': static objects and
+        # the stage collide as one background body (background.py), objects are visual only
+        assert static_objects in ("fixed", "merged")
+        self.static_objects = static_objects
+
+        # Genesis fixes the number of parallel envs at scene.build(n_envs=...)
         self.scene = gs.Scene(
-            num_envs=num_envs,
+            rigid_options=rigid_options,
             show_viewer=show_viewer
         )
-        
-        
+
+
     def build(self, build_config_idxs: Union[int, List[int]]):
         """
         Inputs:
-            - build_config_idxs: Scene Indices(or Index) to build with Genesis Simulation
+            - build_config_idxs: Scene Indices(or Index) to build with Genesis Simulation,
+              one per env
+
+        Genesis batches identical entity sets across envs, so a heterogeneous build
+        loads every unique scene config once, in its own slot at
+        `config_offsets[bci]`, and each env uses the slot of its config. The
+        registries map entity names to Actor/Articulation objects whose `env_idx`
+        are the envs that use them.
+
+        This is not per-env instantiation: every env simulates the entities of every
+        slot, so an env step costs about as much as stepping all unique configs
+        (bench_hetero_scene.py). A build with more than one unique config warns;
+        for heterogeneous layouts build one config per worker instead and combine
+        them with Environment.EnvPool.GenesisEnvPool([env_fn, ...]).
         """
-        if isinstance(build_config_idxs, int):
-            build_config_idxs = [build_config_idxs] * self.scene.n_envs
-        assert all([isinstance(bci, int) for bci in build_config_idxs])
-        assert len(build_config_idxs) == self.scene.n_envs
-        
+        if isinstance(build_config_idxs, (int, np.integer)):
+            build_config_idxs = [build_config_idxs] * self.num_envs
+        build_config_idxs = [int(bci) for bci in build_config_idxs]
+        assert len(build_config_idxs) == self.num_envs
+
+        unique_configs = np.unique(build_config_idxs)
+        if len(unique_configs) > 1:
+            gs.logger.warning(
+                f"Building {len(unique_configs)} scene configs into one scene: every env steps the entities of "
+                f"all of them. For heterogeneous layouts, give each GenesisEnvPool worker its own config."
+            )
+
         self.__dict__.pop("ray_traced_lighting", None)
         self.build_config_idxs = build_config_idxs
         self.scene_objects: Dict[str, Actor] = dict()
         self.movable_objects: Dict[str, Actor] = dict()
         self.articulations: Dict[str, Articulation] = dict()
-        
+        self.config_env_idxs: Dict[int, np.ndarray] = dict()
+        self.config_offsets: Dict[int, np.ndarray] = dict()
+
         # keep track of background objects separately as we need to disable mobile robot collisions
         # note that we will create a merged actor using these objects to represent the bg
-        bgs = [None] * self.env.num_envs
-        for bci in np.unique(build_config_idxs):
-            """
-            Given a list of sampled build_config_idxs, build/load the scene objects
-
-            TODO (arth): return builder option to set static/dynamic in env
-                -  for now leave as-is since has smaller change in performance
-            """
-
-            env_idx = [i for i, v in enumerate(build_config_idxs) if v == bci]
-            unique_id = "scs-" + str(env_idx).replace(" ", "")
-            build_config_path = self.build_configs[bci]
-        
-            # We read the json config file describing the scene setup for the selected ReplicaCAD scene
-            with open(
-                os.path.join(
-                    REPLICACAD_ASSET_DIR,
-                    "scene_datasets/replica_cad_dataset/configs/scenes",
-                    build_config_path,
-                ),
-                "rb",
-            ) as f:
-                build_config_json = json.load(f)
-        
-            # The complex part of porting over scene datasets is that each scene dataset often has it's own format and there is no
-            # one size fits all solution to read that format and use it. The best way to port a scene dataset over is to look
-            # at the configuration files, get a sense of the pattern and find how they reference .glb model files and potentially
-            # decomposed convex meshes for physical simulation
-
-            # ReplicaCAD stores the background model here
-            background_template_name = os.path.basename(
-                build_config_json["stage_instance"]["template_name"]
+        bgs = [None] * self.num_envs
+        # templates repeat across apartments too, so share parsed geometry over the whole build
+        with shared_geometry() as geometry_stats:
+            for slot, bci in enumerate(unique_configs):
+                """
+                Given a list of sampled build_config_idxs, build/load the scene objects.
+                Static objects (replicad.static_mask) are fixed bodies, or with
+                static_objects='merged' part of one background collision body with the
+                stage and only kept as visuals; dynamic ones are free bodies.
+                """
+                bci = int(bci)
+                env_idx = np.array([i for i, v in enumerate(build_config_idxs) if v == bci])
+                unique_id = "scs-" + str(env_idx.tolist()).replace(" ", "")
+                offset = np.array([slot * self.scene_spacing, 0.0, 0.0])
+                self.config_env_idxs[bci] = env_idx
+                self.config_offsets[bci] = offset
+
+                # compiled manifest of the scene json: template → file resolution and
+                # Habitat → Genesis poses already done (replicad.py)
+                manifest = replicad.load_scene_manifest(replicad.SCENE_DIR / self.build_configs[bci])
+
+                # ReplicaCAD stores the background model here; with static_objects='merged'
+                # it is only drawn and the background body (stage + static objects) collides
+                merged = self.static_objects == "merged"
+                stage_pos = tuple(np.add(replicad.STAGE_POS, offset))
+                stage = Actor(
+                    f"{unique_id}_stage",
+                    self.scene.add_entity(
+                        gs.morphs.Mesh(
+                            file=str(manifest["stage_glb"]), pos=stage_pos, euler=replicad.STAGE_EULER,
+                            fixed=True, collision=not merged, visualization=True, convexify=False,
+                        )
+                    ),
+                    env_idx, offset, template=str(manifest["stage_template"]),
+                )
+                self.scene_objects[stage.name] = stage
+                bg = stage
+                if merged:
+                    bg = Actor(
+                        f"{unique_id}_background",
+                        add_background(self.scene, replicad.SCENE_DIR / self.build_configs[bci], offset=offset),
+                        env_idx, offset, template=str(manifest["stage_template"]),
+                    )
+                    self.scene_objects[bg.name] = bg
+                for i in env_idx:
+                    bgs[i] = bg
+
+                self._load_objects(manifest, unique_id, env_idx, offset)
+                self._load_articulations(manifest, unique_id, env_idx, offset)
+
+            self.scene.build(n_envs=self.num_envs)
+        gs.logger.info(f"Shared geometry: {geometry_stats}")
+        self.bgs = bgs
+        self._spawn_table = None
+        # what restore() resets to: episodes start from here instead of a rebuild
+        self.initial_state = self.snapshot()
+
+    def _load_objects(self, manifest, unique_id, env_idx, offset):
+        static = replicad.static_mask(manifest)
+        rest = np.array([0.0, 0.0, replicad.REST_Z_SHIFT])
+        for template, instances in replicad.group_instances(manifest["obj_template"]).items():
+            i0 = instances[0]
+            render_glb = str(manifest["obj_render_asset"][i0])
+            if self.static_objects == "merged" and static[instances].all():
+                file, morph_type, kwargs = None, None, dict()
+            elif manifest["obj_collision_asset"][i0]:
+                file, morph_type = render_glb, gs.morphs.Mesh
+                kwargs = dict(convexify=False)
+            else:
+                # convex decomposition from coacd_cache instead of Genesis' per-build CoACD
+                file, morph_type = str(collision_urdf(render_glb, REPLICACAD_COACD_OPTIONS)), gs.morphs.URDF
+                kwargs = dict()
+            for k, i in enumerate(instances):
+                if static[i] and self.static_objects == "merged":
+                    # collides as part of the merged background
+                    morph = gs.morphs.Mesh(
+                        file=render_glb,
+                        pos=tuple(manifest["obj_pos"][i] + rest + offset), quat=tuple(manifest["obj_quat"][i]),
+                        fixed=True, visualization=True, collision=False,
+                    )
+                elif static[i]:
+                    # fixed bodies do not settle, so they go straight to the rest height
+                    morph = morph_type(
+                        file=file,
+                        pos=tuple(manifest["obj_pos"][i] + rest + offset), quat=tuple(manifest["obj_quat"][i]),
+                        fixed=True, visualization=True, collision=True, **kwargs,
+                    )
+                else:
+                    morph = morph_type(
+                        file=file,
+                        pos=tuple(manifest["obj_pos"][i] + offset), quat=tuple(manifest["obj_quat"][i]),
+                        fixed=False, visualization=True, collision=True, **kwargs,
+                    )
+                actor = Actor(
+                    f"{unique_id}_{os.path.basename(template)}-{k}", self.scene.add_entity(morph),
+                    env_idx, offset, template=template,
+                )
+                self.scene_objects[actor.name] = actor
+                if not static[i]:
+                    self.movable_objects[actor.name] = actor
+
+    def _load_articulations(self, manifest, unique_id, env_idx, offset):
+        # fixed bases do not settle, so they go straight to the rest height like static objects
+        rest = np.array([0.0, 0.0, replicad.REST_Z_SHIFT])
+        for template, instances in replicad.group_instances(manifest["art_template"]).items():
+            urdf = str(manifest["art_urdf"][instances[0]])
+            for k, i in enumerate(instances):
+                articulation = Articulation(
+                    f"{unique_id}_{template}-{k}",
+                    self.scene.add_entity(
+                        gs.morphs.URDF(
+                            file=urdf,
+                            pos=tuple(manifest["art_pos"][i] + rest + offset), quat=tuple(manifest["art_quat"][i]),
+                            scale=float(manifest["art_scale"][i]),
+                            fixed=True, collision=True, visualization=True, convexify=False,
+                        )
+                    ),
+                    env_idx, offset, template=template,
+                )
+                self.articulations[articulation.name] = articulation
+
+    def env_objects(self, env: int) -> Dict[str, Actor]:
+        """The scene objects env uses"""
+        return {name: actor for name, actor in self.scene_objects.items() if env in actor.env_idx}
+
+    ###########################################################################
+    # navigable start positions
+    ###########################################################################
+    def navigable_positions(self, bci: int) -> np.ndarray:
+        """(N, 3) free floor positions of build config bci from the navigable.py cache, loaded once"""
+        if self._navigable_positions[bci] is None:
+            nav = navigable.load_navigable(replicad.SCENE_DIR / self.build_configs[bci], self.navigable_params)
+            self._navigable_positions[bci] = nav["positions"]
+        return self._navigable_positions[bci]
+
+    def sample_start_positions(self, n: int, envs_idx=None, generator: np.random.Generator = None) -> np.ndarray:
+        """
+        (len(envs_idx), n, 3) valid start positions in each env's slot frame, drawn
+        uniformly from the free cells of the env's scene config in one vectorized draw.
+        """
+        if self._spawn_table is None:
+            # every used config's positions back to back, and where each env's block starts
+            configs = list(self.config_env_idxs)
+            blocks = [self.navigable_positions(bci) for bci in configs]
+            starts = dict(zip(configs, np.cumsum([0] + [len(b) for b in blocks[:-1]])))
+            self._spawn_table = (
+                np.concatenate(blocks),
+                np.array([starts[bci] for bci in self.build_config_idxs]),
+                np.array([len(self.navigable_positions(bci)) for bci in self.build_config_idxs]),
             )
-            bg_path = str(
-                REPLICACAD_ASSET_DIR
-                / f"scene_datasets/replica_cad_dataset/stages/{background_template_name}.glb"
+        positions, start, count = self._spawn_table
+        envs_idx = np.arange(self.num_envs) if envs_idx is None else np.asarray(envs_idx)
+        empty = envs_idx[count[envs_idx] == 0]
+        if len(empty):
+            scenes = sorted({self.build_configs[self.build_config_idxs[env]] for env in empty})
+            raise RuntimeError(
+                f"No navigable cells in {', '.join(scenes)} (envs {empty.tolist()}); "
+                f"check the navigable grid or relax navigable_params (robot_radius, step_height, ...)"
             )
-            
-        
-        pass
-    
-    
-    
-    
\ No newline at end of file
+        if generator is None:
+            generator = np.random.default_rng()
+        u = generator.random((len(envs_idx), n))
+        return positions[start[envs_idx, None] + (u * count[envs_idx, None]).astype(np.int64)]
+
+    ###########################################################################
+    # snapshot / restore
+    ###########################################################################
+    def alloc_snapshot(self) -> Dict[str, "torch.Tensor"]:
+        """Empty buffers for the full rigid state of all envs: qpos (n_envs, n_qs), qvel (n_envs, n_dofs)"""
+        import torch
+
+        solver = self.scene.rigid_solver
+        return dict(
+            qpos=torch.empty((self.num_envs, solver.n_qs), dtype=gs.tc_float, device=gs.device),
+            qvel=torch.empty((self.num_envs, solver.n_dofs), dtype=gs.tc_float, device=gs.device),
+        )
+
+    def snapshot(self, out: Dict[str, "torch.Tensor"] = None) -> Dict[str, "torch.Tensor"]:
+        """
+        Copy the rigid state of every env (free-joint object poses, articulation
+        joints and their velocities) into `out`, allocated on first use.
+        """
+        if out is None:
+            out = self.alloc_snapshot()
+        solver = self.scene.rigid_solver
+        out["qpos"].copy_(solver.get_qpos())
+        out["qvel"].copy_(solver.get_dofs_velocity())
+        return out
+
+    def restore(self, snapshot: Dict[str, "torch.Tensor"] = None, envs_idx=None):
+        """
+        Put envs back into `snapshot` (the post-build state by default) without
+        rebuilding. envs_idx is a list of env indices or a boolean mask over envs;
+        None restores all of them. One batched call per state field.
+        """
+        import torch
+
+        if snapshot is None:
+            snapshot = self.initial_state
+        if envs_idx is None:
+            envs_idx = torch.arange(self.num_envs, device=gs.device)
+        else:
+            envs_idx = torch.as_tensor(envs_idx, device=gs.device)
+            if envs_idx.dtype == torch.bool:
+                envs_idx = envs_idx.nonzero().flatten()
+            if len(envs_idx) == 0:
+                return
+        solver = self.scene.rigid_solver
+        solver.set_qpos(snapshot["qpos"][envs_idx], envs_idx=envs_idx)
+        solver.set_dofs_velocity(snapshot["qvel"][envs_idx], envs_idx=envs_idx)
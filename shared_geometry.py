@@ -0,0 +1,202 @@
+"""
+shared_geometry.py
+------------------
+Parse every mesh file once per scene build and share the result between all
+entities that use it.
+
+ReplicaCAD scenes place the same template (same GLB / URDF) many times, and
+Genesis parses and preprocesses the file again for every scene.add_entity().
+Inside `shared_geometry()`:
+
+* gs.Mesh.from_morph_surface (what gs.morphs.Mesh entities load through) is
+  memoized on the file and the values of every morph and surface option that
+  changes the resulting geometry.
+* trimesh.load (what URDF links load their meshes through) is memoized on the
+  path and arguments.
+
+Every call gets its own mesh objects: the parsed vertex/face arrays are shared,
+but frozen (read-only), and everything Genesis may change after loading (the
+trimesh data store, cache, visual, metadata, other arrays) is per instance. An
+apply_transform / merge_vertices on one instance rebinds that instance's arrays
+and never reaches the others; an in-place write into a shared array raises
+instead of corrupting them.
+
+Both are restored on exit, so nothing outside the block is affected. Genesis
+versions without from_morph_surface simply skip that level.
+
+    with shared_geometry() as stats:
+        ... scene.add_entity(...) ...
+        scene.build()
+    print(stats)
+"""
+
+from __future__ import annotations
+
+import contextlib
+import hashlib
+import os
+
+import numpy as np
+
+MESH_GEOMETRY_FIELDS = (
+    "file", "scale", "convexify", "decimate", "decimate_face_num", "decimate_aggressiveness",
+    "decompose_nonconvex", "decompose_error_threshold", "coacd_options", "group_by_material",
+    "merge_submeshes_for_collision", "parse_glb_with_trimesh", "parse_glb_with_zup",
+    "file_meshes_are_zup", "order", "collision", "visualization",
+)
+"""gs.morphs.Mesh options the parsed geometry depends on; pos/quat/fixed are per instance"""
+
+
+def _file_stamp(path):
+    try:
+        st = os.stat(path)
+        return (str(path), st.st_size, st.st_mtime_ns)
+    except (OSError, TypeError):
+        return (repr(path),)
+
+
+def _freeze(value):
+    """A hashable stand-in for an option value, built from its fields (never from ids or reprs)"""
+    if value is None or isinstance(value, (bool, int, float, str, bytes)):
+        return value
+    if isinstance(value, os.PathLike):
+        return os.fspath(value)
+    if isinstance(value, np.ndarray):
+        data = np.ascontiguousarray(value)
+        return ("ndarray", data.shape, data.dtype.str, hashlib.sha1(data.tobytes()).hexdigest())
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, dict):
+        return tuple(sorted((str(k), _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if hasattr(value, "model_dump"):
+        fields = value.model_dump()
+    elif hasattr(value, "__dict__"):
+        fields = {k: v for k, v in vars(value).items() if not k.startswith("_")}
+    else:
+        raise TypeError(f"Cannot key shared geometry on a {type(value).__name__}")
+    return (type(value).__name__, _freeze(fields))
+
+
+def geometry_key(morph, surface) -> tuple:
+    fields = tuple((name, _freeze(getattr(morph, name, None))) for name in MESH_GEOMETRY_FIELDS)
+    return (type(morph).__name__, _file_stamp(getattr(morph, "file", None)), fields, _freeze(surface))
+
+
+def _freeze_arrays(mesh):
+    """Make the parsed data of a cached trimesh read-only, so instances can share it"""
+    for array in mesh._data.data.values():
+        array.flags.writeable = False
+
+
+def _trimesh_instance(mesh):
+    """A new Trimesh on the same (frozen) vertex/face arrays, with its own state"""
+    import trimesh
+
+    return trimesh.Trimesh(
+        vertices=mesh.vertices,
+        faces=mesh.faces,
+        visual=mesh.visual.copy(),
+        metadata=dict(mesh.metadata),
+        vertex_attributes={k: np.copy(v) for k, v in mesh.vertex_attributes.items()},
+        face_attributes={k: np.copy(v) for k, v in mesh.face_attributes.items()},
+        initial_cache=dict(mesh._cache.cache),
+        process=False,
+    )
+
+
+def _instance(value):
+    """Per-instance copy of a parsed object that shares its frozen trimesh arrays"""
+    import trimesh
+
+    if isinstance(value, trimesh.Trimesh):
+        return _trimesh_instance(value)
+    if isinstance(value, trimesh.Scene):
+        return value.copy()
+    if isinstance(value, list):
+        return [_instance(v) for v in value]
+    if isinstance(value, dict):
+        return dict(value)
+    if isinstance(value, np.ndarray):
+        return value.copy()
+    if hasattr(value, "__dict__") and any(isinstance(v, trimesh.Trimesh) for v in vars(value).values()):
+        # gs.Mesh: not copy.copy, trimesh (and possibly gs.Mesh) define __copy__ as a deep copy
+        shared = object.__new__(type(value))
+        shared.__dict__.update({k: _instance(v) for k, v in vars(value).items()})
+        return shared
+    return value
+
+
+def _cacheable(value):
+    """Freeze the trimesh arrays inside a freshly parsed object and return it"""
+    import trimesh
+
+    if isinstance(value, trimesh.Trimesh):
+        _freeze_arrays(value)
+    elif isinstance(value, list):
+        for v in value:
+            _cacheable(v)
+    elif hasattr(value, "__dict__") and not isinstance(value, trimesh.Scene):
+        for v in vars(value).values():
+            if isinstance(v, trimesh.Trimesh):
+                _freeze_arrays(v)
+    return value
+
+
+@contextlib.contextmanager
+def shared_geometry():
+    """Memoize mesh parsing for the duration of the block; yields hit/miss counters"""
+    import trimesh
+
+    stats = dict(mesh_hits=0, mesh_misses=0, file_hits=0, file_misses=0)
+    meshes, files = {}, {}
+    restore = []
+
+    original_load = trimesh.load
+
+    def load(file_obj, *args, **kwargs):
+        if not isinstance(file_obj, (str, os.PathLike)):
+            return original_load(file_obj, *args, **kwargs)
+        try:
+            key = (_file_stamp(file_obj), _freeze(args), _freeze(kwargs))
+        except TypeError:
+            return original_load(file_obj, *args, **kwargs)
+        if key in files:
+            stats["file_hits"] += 1
+        else:
+            stats["file_misses"] += 1
+            files[key] = _cacheable(original_load(file_obj, *args, **kwargs))
+        return _instance(files[key])
+
+    trimesh.load = load
+    restore.append(lambda: setattr(trimesh, "load", original_load))
+
+    try:
+        import genesis as gs
+    except ImportError:
+        gs = None
+    if gs is not None and hasattr(getattr(gs, "Mesh", None), "from_morph_surface"):
+        original_from_morph_surface = gs.Mesh.__dict__["from_morph_surface"]
+        parse = original_from_morph_surface.__get__(None, gs.Mesh)
+
+        def from_morph_surface(cls, morph, surface=None):
+            try:
+                key = geometry_key(morph, surface)
+            except TypeError:
+                return parse(morph, surface)
+            if key in meshes:
+                stats["mesh_hits"] += 1
+            else:
+                stats["mesh_misses"] += 1
+                meshes[key] = _cacheable(parse(morph, surface))
+            return _instance(meshes[key])
+
+        gs.Mesh.from_morph_surface = classmethod(from_morph_surface)
+        restore.append(lambda: setattr(gs.Mesh, "from_morph_surface", original_from_morph_surface))
+
+    try:
+        yield stats
+    finally:
+        for undo in reversed(restore):
+            undo()
@@ -12,41 +12,13 @@ from scipy.spatial.transform import Rotation as R
 import os
 import trimesh
 
-###############################################################################
-# 0. 경로 설정 ---------------------------------------------------------------
-###############################################################################
-DATA_ROOT   = pathlib.Path("/dataset/scene_datasets/replica_cad_dataset/")                    # HF repo root
-SCENE_DIR   = DATA_ROOT / "configs" / "scenes"
-OBJECT_DIR  = DATA_ROOT / "configs" / "objects"
-
-###############################################################################
-# 1. 좌표계 · 회전 변환 -------------------------------------------------------
-# Habitat:  (x right,  y up,   z forward -)
-# Genesis:  (x right,  z up,   y forward  +)
-###############################################################################
-_AX_SWAP = np.array([[1,  0,  0],
-                     [0,  0, -1],
-                     [0,  1,  0]])
-
-def hab2gen_pos(pos_xyz: list[float]) -> tuple[float, float, float]:
-    """(x, y, z)_Hab → (x, y', z')_Gen"""
-    x, y, z = pos_xyz
-    return  (x, -z, y + 0.3) # (x, -z, y)
-
-def hab2gen_quat(q) -> tuple[float, float, float, float]:
-    """
-    HF ReplicaCAD 쿼터니언은 [w, x, y, z] 순 (문서 기준).
-    Genesis `quat` 역시 (w, x, y, z)이므로,
-    먼저 SciPy → 행렬 → 축 변환 → 다시 쿼터니언으로 돌려준다.
-    """
-    if isinstance(q, dict):      # {"w":..., "x":..., ...} 형태
-        w, x, y, z = q["w"], q["x"], q["y"], q["z"]
-    else:                        # [w, x, y, z] 리스트/튜플
-        w, x, y, z = q
-    r_hab = R.from_quat([x, y, z, w])          # SciPy는 [x,y,z,w]
-    m_gen = _AX_SWAP @ r_hab.as_matrix() # @ _AX_SWAP.T
-    xg, yg, zg, wg = R.from_matrix(m_gen).as_quat()
-    return (wg, xg, yg, zg)                    # Genesis convention
+from replicad import (DATA_ROOT, SCENE_DIR, OBJECT_DIR, _AX_SWAP, REST_Z_SHIFT,
+                      group_instances, hab2gen_pos, hab2gen_quat, load_obj_cfg, load_scene_manifest,
+                      static_mask)
+from background import add_background
+from coacd_cache import REPLICACAD_COACD_OPTIONS, collision_urdf
+from collision_lod import collision_lod_path
+from shared_geometry import shared_geometry
 
 def quat_to_rot(q: list):
     np_q = np.array(q)
@@ -67,29 +39,25 @@ def merge_glbs(render_glb_path, collision_glb_path, output_glb_path):
     scene.export(output_glb_path)
     print(f"병합 완료: {output_glb_path}")
 
-###############################################################################
-# 2. Object config 로드 -------------------------------------------------------
-###############################################################################
-_cfg_cache: dict[str, dict] = {}
-
-def load_obj_cfg(template_name: str) -> dict:
-    """template_name 예: 'objects/frl_apartment_basket' (확장자 없이)"""
-    if template_name not in _cfg_cache:
-        fname = OBJECT_DIR / (pathlib.Path(template_name).name + ".object_config.json")
-        _cfg_cache[template_name] = json.loads(fname.read_text())
-    return _cfg_cache[template_name]
-
 ###############################################################################
 # 3. Scene 생성 --------------------------------------------------------------
 ###############################################################################
 def load_replicacad(scene_json: pathlib.Path,
                     backend: str = "gpu",
-                    show_viewer: bool = True) -> gs.Scene:
+                    show_viewer: bool = True,
+                    collision_lod: int | None = None,
+                    static_objects: str = "fixed") -> gs.Scene:
     """
     * `backend`: 'gpu' | 'vulkan' | 'cpu'
+    * `collision_lod`: None 이면 stage 렌더 메시를 그대로 충돌에 사용,
+      face 수를 주면 collision_lod.py 의 단순화 메시로 충돌 (시각 메시는 그대로)
+    * `static_objects`: STATIC/KINEMATIC 물체 처리 (replicad.static_mask)
+        - 'merged': stage 와 함께 background.py 의 충돌 메시 하나로 합치고 물체는 시각 전용
+        - 'fixed' : 물체마다 고정체
+        - 'free'  : 예전처럼 자유 물체 (벤치마크 비교용)
     * return: 완성된 genesis.Scene
     """
-    inst = json.loads(scene_json.read_text())
+    manifest = load_scene_manifest(scene_json)   # 컴파일된 manifest: JSON 파싱 · 경로 해석 생략
 
     gs.init(backend=getattr(gs, backend))       # gs.init(...) -> 필수 초기화:contentReference[oaicite:0]{index=0}
     camera_pos = hab2gen_pos((0.0, 5.0, 0.0))  # ⭐︎ 추가
@@ -112,129 +80,140 @@ def load_replicacad(scene_json: pathlib.Path,
         ),
         show_viewer=show_viewer
     )   # gs.Scene(...) → 엔티티 컨테이너:contentReference[oaicite:1]{index=1}    
-    # ────────── Stage (고정) ──────────
-    stage_name = inst["stage_instance"]["template_name"]   # 'stages/apt_0_stage'
-    stage_glb  = DATA_ROOT / f"{stage_name}.glb"
+    # 같은 파일은 한 번만 파싱: 반복 템플릿의 인스턴스는 파싱된 geometry 를 공유
+    with shared_geometry() as geometry_stats:
+        # ────────── Stage (고정) ──────────
+        stage_glb  = str(manifest["stage_glb"])              # DATA_ROOT / 'stages/apt_0_stage.glb'
     
-    scene.add_entity(
-        morph=gs.morphs.Mesh(
-            file=str(stage_glb),
-            pos=[0.0, 0.0, 0.1],            # ← 변환 후 좌표
-            euler=[90.0, 0.0, 0.0],         # ← 변환 후 쿼터니언
-            fixed=True, 
-            collision=True,
-            visualization=True,
-            convexify=False,
-            # decimate_face_num = 10000
-        ),
-            visualize_contact=True
-        # vis_mode="collision"
-    )
+        scene.add_entity(
+            morph=gs.morphs.Mesh(
+                file=stage_glb,
+                pos=[0.0, 0.0, 0.1],            # ← 변환 후 좌표
+                euler=[90.0, 0.0, 0.0],         # ← 변환 후 쿼터니언
+                fixed=True, 
+                collision=collision_lod is None and static_objects != "merged",
+                visualization=True,
+                convexify=False,
+                # decimate_face_num = 10000
+            ),
+                visualize_contact=True
+            # vis_mode="collision"
+        )
+        if static_objects == "merged":
+            # stage + 정적 물체를 합친 충돌 전용 body 하나 (월드 좌표계, 단위 자세)
+            add_background(scene, scene_json, collision_lod, visualize_contact=True)
+        elif collision_lod is not None:
+            # 같은 자세의 충돌 전용 stage: 단순화된 LOD 메시
+            scene.add_entity(
+                morph=gs.morphs.Mesh(
+                    file=str(collision_lod_path(stage_glb, collision_lod)),
+                    pos=[0.0, 0.0, 0.1],
+                    euler=[90.0, 0.0, 0.0],
+                    fixed=True,
+                    collision=True,
+                    visualization=False,
+                    convexify=False,
+                ),
+                visualize_contact=True
+            )
     
-    # box = scene.add_entity(
-    #     gs.morphs.Box(
-    #         pos=(0.0, 0.0, 6.5),
-    #         size=(30.0, 30.0, 0.1),
-    #         fixed=False
-    #     ),
-    #     material=gs.materials.Rigid(rho=0.1, friction=0.8),
-    #     visualize_contact=True,
-    # )
+        # box = scene.add_entity(
+        #     gs.morphs.Box(
+        #         pos=(0.0, 0.0, 6.5),
+        #         size=(30.0, 30.0, 0.1),
+        #         fixed=False
+        #     ),
+        #     material=gs.materials.Rigid(rho=0.1, friction=0.8),
+        #     visualize_contact=True,
+        # )
     
-    # floor = scene.add_entity(
-    #     gs.morphs.Box(
-    #         size=(30, 30, 0.1),
-    #         pos=(0.0, 0.0, -0.1), 
-    #         euler=(0.0, 0.0, 90.0),
-    #         fixed=True, collision=True, visualization=False
-    #     )
-    # )
-    scene.add_entity(gs.morphs.URDF(file="urdf/plane/plane.urdf", fixed=True),
-                     visualize_contact=False
-    )  # 바닥: URDF로 추가, 고정체
+        # floor = scene.add_entity(
+        #     gs.morphs.Box(
+        #         size=(30, 30, 0.1),
+        #         pos=(0.0, 0.0, -0.1), 
+        #         euler=(0.0, 0.0, 90.0),
+        #         fixed=True, collision=True, visualization=False
+        #     )
+        # )
+        scene.add_entity(gs.morphs.URDF(file="urdf/plane/plane.urdf", fixed=True),
+                         visualize_contact=False
+        )  # 바닥: URDF로 추가, 고정체
     
-    # ────────── Objects ──────────
-    idx = 0
-    count_non_collision = 0
-    for obj in inst["object_instances"]:
-        tname = obj["template_name"]                      # 'objects/xxx'
-        if "frl_apartment_bike_0" in tname:
-            continue
-        
-        cfg   = load_obj_cfg(tname)
-        
-        vis_glb = DATA_ROOT / "configs/objects" / cfg["render_asset"]         # 시각 메시
-        merged_glb = DATA_ROOT / (tname + "_merged.glb")
-        pos     = hab2gen_pos(obj["translation"])
-        quat    = hab2gen_quat(obj["rotation"])
-        fixed = obj["motion_type"] == "STATIC" or cfg.get("mass", 1.0) > 5       # 무게 0이면 고정체
-                                                # 일반 rigid CAD
-        if "collision_asset" in cfg:
-            collision_file = OBJECT_DIR / cfg["collision_asset"]
-            # merge_glbs(vis_glb, collision_file, merged_glb)
-            scene.add_entity(
-                gs.morphs.Mesh(
-                    file=str(vis_glb),
-                    pos=pos, quat=quat, fixed=False,
+        # ────────── Objects ──────────
+        # 템플릿별로 묶어서: 파일 해석(collision URDF 등)은 템플릿당 한 번,
+        # 메시 파싱은 shared_geometry 안에서 템플릿당 한 번 하고 인스턴스끼리 공유
+        # 정적 물체는 떨어질 일이 없으니 HEIGHT_OFFSET 없이 실제 놓인 높이에
+        static = static_mask(manifest)
+        rest = np.array([0.0, 0.0, REST_Z_SHIFT])
+        count_non_collision = 0
+        for tname, instances in group_instances(manifest["obj_template"]).items():  # 'objects/xxx'
+            if "frl_apartment_bike_0" in tname:
+                continue
+
+            i0 = instances[0]
+            vis_glb = str(manifest["obj_render_asset"][i0])     # 시각 메시
+            if static_objects == "merged" and static[instances].all():
+                make_morph = None                               # 충돌은 background 에 있다
+            elif manifest["obj_collision_asset"][i0]:
+                make_morph = lambda pos, quat, fixed: gs.morphs.Mesh(
+                    file=vis_glb,
+                    pos=pos, quat=quat, fixed=fixed,
                     visualization=True, collision=True,
                     convexify=False
                 )
-            )
-        else: 
-            count_non_collision += 1
-            scene.add_entity(
-                gs.morphs.Mesh(
-                    file=str(vis_glb),
-                    pos=pos, quat=quat, 
-                    fixed=False,
-                    visualization=True, 
+            else:
+                count_non_collision += len(instances)
+                # CoACD 분해는 coacd_cache 에서: 캐시 hit 이면 분해 없이 URDF(시각=원본, 충돌=hull) 로드
+                coacd_urdf = str(collision_urdf(vis_glb, REPLICACAD_COACD_OPTIONS))
+                make_morph = lambda pos, quat, fixed: gs.morphs.URDF(
+                    file=coacd_urdf,
+                    pos=pos, quat=quat,
+                    fixed=fixed,
+                    visualization=True,
                     collision=True,
-                    coacd_options=gs.options.CoacdOptions(
-                        decimate=True,
-                        pca=True
+                )
+            for i in instances:
+                pos, quat = manifest["obj_pos"][i], tuple(manifest["obj_quat"][i])
+                if not static[i] or static_objects == "free":
+                    scene.add_entity(make_morph(tuple(pos), quat, False))
+                elif static_objects == "fixed":
+                    scene.add_entity(make_morph(tuple(pos + rest), quat, True))
+                else:
+                    scene.add_entity(
+                        gs.morphs.Mesh(
+                            file=vis_glb,
+                            pos=tuple(pos + rest), quat=quat, fixed=True,
+                            visualization=True, collision=False,
+                        )
                     )
-                ),
-            )
-  
-        idx += 1
-        # if idx == 1:  # 첫 5개만 로드
-        #     break
-  
-    
-    for aobj in inst["articulated_object_instances"]:
-        template_name = aobj["template_name"]
-        if "door" in template_name:
-            continue
-        pos = hab2gen_pos(aobj["translation"])
-        quat = hab2gen_quat(aobj["rotation"])
-        urdf_path = os.path.join(
-            DATA_ROOT,
-            f"urdf/{template_name}/{template_name}.urdf",
-        )
-        scale = 1.0
-        if "uniform_scale" in aobj:
-            scale = aobj["uniform_scale"]
-        scene.add_entity(
-            gs.morphs.URDF(
-                file=urdf_path,
-                pos=pos, quat=quat,
-                fixed=False,
-                collision=True,
-                visualization=True,
-                scale=scale,
-                convexify=False
-            )
-        )
+
+        for template_name, instances in group_instances(manifest["art_template"]).items():
+            if "door" in template_name:
+                continue
+            urdf_path = str(manifest["art_urdf"][instances[0]])    # DATA_ROOT/urdf/<t>/<t>.urdf
+            for i in instances:
+                scene.add_entity(
+                    gs.morphs.URDF(
+                        file=urdf_path,
+                        pos=tuple(manifest["art_pos"][i]), quat=tuple(manifest["art_quat"][i]),
+                        fixed=False,
+                        collision=True,
+                        visualization=True,
+                        scale=float(manifest["art_scale"][i]),
+                        convexify=False
+                    )
+                )
     
-    # locobot = scene.add_entity(
-    #     gs.morphs.URDF(
-    #         file="urdf/go2/urdf/go2.urdf", 
-    #         pos=[0.0, 0.0, 0.0],
-    #         euler=[0.0, 0.0, 0.0]
-    #     ),
-    # )
-    # print("Number of Non-Collisionable Dynamic Objects:", count_non_collision)
-    scene.build()                                         # ★필수: 시뮬 초기화
+        # locobot = scene.add_entity(
+        #     gs.morphs.URDF(
+        #         file="urdf/go2/urdf/go2.urdf", 
+        #         pos=[0.0, 0.0, 0.0],
+        #         euler=[0.0, 0.0, 0.0]
+        #     ),
+        # )
+        # print("Number of Non-Collisionable Dynamic Objects:", count_non_collision)
+        scene.build()                                         # ★필수: 시뮬 초기화
+    gs.logger.info(f"Shared geometry: {geometry_stats}")
     return scene
 
 ###############################################################################
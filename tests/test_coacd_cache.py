@@ -0,0 +1,19 @@
+import sys
+
+import pytest
+
+from coacd_cache import COACD_DEFAULTS, decomposition_key, resolve_options
+
+
+def test_defaults_match_genesis():
+    gs = pytest.importorskip("genesis")
+    assert COACD_DEFAULTS == gs.options.CoacdOptions().model_dump()
+
+
+def test_key_does_not_depend_on_genesis(tmp_path, monkeypatch):
+    mesh = tmp_path / "mesh.obj"
+    mesh.write_text("v 0 0 0\nv 1 0 0\nv 0 1 0\nf 1 2 3\n")
+    key = decomposition_key(mesh, dict(decimate=True))
+    monkeypatch.setitem(sys.modules, "genesis", None)
+    assert decomposition_key(mesh, dict(decimate=True)) == key
+    assert resolve_options(dict(pca=True)) == {**COACD_DEFAULTS, "pca": True}
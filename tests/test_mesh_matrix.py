@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+import trimesh
+
+import replicad
+
+
+@pytest.mark.parametrize("suffix", [".glb", ".obj"])
+def test_mesh_matrix_matches_genesis(tmp_path, suffix):
+    gs = pytest.importorskip("genesis")
+    mesh = trimesh.creation.box(extents=(0.2, 0.4, 0.8))
+    mesh.apply_translation((1.0, 2.0, 3.0))
+    file = tmp_path / f"box{suffix}"
+    mesh.export(file)
+    pos, quat = (0.5, -1.0, 0.1), (np.cos(0.3), 0.0, 0.0, np.sin(0.3))
+
+    if not gs._initialized:
+        gs.init(backend=gs.cpu, logging_level="warning")
+    scene = gs.Scene(show_viewer=False)
+    entity = scene.add_entity(gs.morphs.Mesh(file=str(file), pos=pos, quat=quat, fixed=True, convexify=False))
+    scene.build()
+
+    placed = entity.geoms[0].get_verts().cpu().numpy().reshape(-1, 3)
+    expected = trimesh.transform_points(trimesh.load(file, force="mesh").vertices,
+                                        replicad.mesh_matrix(file, pos, replicad.quat_matrix(quat)))
+    np.testing.assert_allclose(np.sort(placed, axis=0), np.sort(expected, axis=0), atol=1e-4)
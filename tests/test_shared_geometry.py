@@ -0,0 +1,104 @@
+import sys
+import types
+
+import numpy as np
+import pytest
+import trimesh
+
+from shared_geometry import shared_geometry
+
+SHIFT = trimesh.transformations.translation_matrix((1.0, 2.0, 3.0))
+
+
+@pytest.fixture
+def mesh_file(tmp_path):
+    path = tmp_path / "box.obj"
+    trimesh.creation.box(extents=(1.0, 2.0, 3.0)).export(path)
+    return path
+
+
+def assert_shared_not_coupled(a: trimesh.Trimesh, b: trimesh.Trimesh):
+    assert a is not b
+    assert np.shares_memory(a.vertices, b.vertices)
+    assert np.shares_memory(a.faces, b.faces)
+    assert a.visual is not b.visual
+    assert a.metadata is not b.metadata
+
+    with pytest.raises(ValueError):
+        a.vertices[0, 0] = 10.0
+    before = np.array(b.vertices)
+    a.apply_transform(SHIFT)
+    a.merge_vertices()
+    a.metadata["touched"] = True
+    np.testing.assert_array_equal(b.vertices, before)
+    np.testing.assert_allclose(a.vertices.min(axis=0), before.min(axis=0) + (1.0, 2.0, 3.0))
+    assert "touched" not in b.metadata
+
+
+def test_trimesh_load_is_shared(mesh_file):
+    with shared_geometry() as stats:
+        a = trimesh.load(mesh_file, force="mesh")
+        b = trimesh.load(mesh_file, force="mesh")
+    assert stats["file_misses"] == 1 and stats["file_hits"] == 1
+    assert_shared_not_coupled(a, b)
+
+
+@pytest.fixture
+def stand_in_genesis(monkeypatch):
+    """gs.Mesh with the from_morph_surface entry point shared_geometry wraps"""
+
+    class Mesh:
+        parses = 0
+
+        def __init__(self, mesh, surface):
+            self._mesh = mesh
+            self._surface = surface
+            self._metadata = {}
+
+        @classmethod
+        def from_morph_surface(cls, morph, surface=None):
+            cls.parses += 1
+            return [cls(trimesh.load(morph.file, force="mesh"), surface)]
+
+    class Options:
+        def __init__(self, **fields):
+            self.__dict__.update(fields)
+
+    gs = types.SimpleNamespace(Mesh=Mesh, Options=Options)
+    monkeypatch.setitem(sys.modules, "genesis", gs)
+    return gs
+
+
+def test_from_morph_surface_is_shared(stand_in_genesis, mesh_file):
+    gs = stand_in_genesis
+
+    def morph():
+        return gs.Options(file=str(mesh_file), scale=1.0, convexify=False)
+
+    with shared_geometry() as stats:
+        # equal option values in distinct objects are the same geometry
+        (a,) = gs.Mesh.from_morph_surface(morph(), gs.Options(roughness=0.5))
+        (b,) = gs.Mesh.from_morph_surface(morph(), gs.Options(roughness=0.5))
+        gs.Mesh.from_morph_surface(morph(), gs.Options(roughness=0.9))
+    assert gs.Mesh.parses == 2
+    assert stats["mesh_hits"] == 1 and stats["mesh_misses"] == 2
+    assert a._metadata is not b._metadata
+    assert_shared_not_coupled(a._mesh, b._mesh)
+
+    # the original parser is back outside the block
+    gs.Mesh.from_morph_surface(morph(), gs.Options(roughness=0.5))
+    assert gs.Mesh.parses == 3
+
+
+def test_genesis_meshes_are_shared(mesh_file):
+    gs = pytest.importorskip("genesis")
+    if not gs._initialized:
+        gs.init(backend=gs.cpu, logging_level="warning")
+
+    with shared_geometry() as stats:
+        a = gs.Mesh.from_morph_surface(gs.morphs.Mesh(file=str(mesh_file)), gs.surfaces.Default())
+        b = gs.Mesh.from_morph_surface(gs.morphs.Mesh(file=str(mesh_file)), gs.surfaces.Default())
+    assert stats["mesh_hits"] == 1
+    a = a[0] if isinstance(a, list) else a
+    b = b[0] if isinstance(b, list) else b
+    assert_shared_not_coupled(a.trimesh, b.trimesh)